@@ -0,0 +1,106 @@
+"""
+This module compares two directory trees file by file, e.g. the FlatDirectory produced by the
+two-stage extract + flatten pipeline against the one produced by fused extraction.
+
+    python Tools/process/Flat/compare.py GameFiles/quickbms_out GameFiles/quickbms_out_fused
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_sha256(file_path: str) -> str:
+    sha256_hash = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            sha256_hash.update(block)
+    return sha256_hash.hexdigest()
+
+
+def list_tree(root: str) -> tuple:
+    """
+    Lists a tree as sets of relative directory and file paths, using '/' as separator.
+    """
+    directories = set()
+    files = set()
+    for current, dir_names, file_names in os.walk(root):
+        relative = os.path.relpath(current, root)
+        prefix = "" if relative == "." else relative.replace(os.sep, "/") + "/"
+        directories.update(prefix + name for name in dir_names)
+        files.update(prefix + name for name in file_names)
+    return directories, files
+
+
+def compare_trees(left: str, right: str, check_contents: bool = True) -> dict:
+    """
+    Compares two directory trees.
+
+    Args:
+        left (str): The reference tree.
+        right (str): The tree to check against it.
+        check_contents (bool): Compare file contents by SHA256, not only sizes.
+
+    Returns:
+        dict: Sorted lists of relative paths: "missing" (only in left), "extra" (only in right),
+        "missing_dirs", "extra_dirs" and "different" (same path, different size or contents).
+    """
+    left_dirs, left_files = list_tree(left)
+    right_dirs, right_files = list_tree(right)
+
+    different = []
+    for path in sorted(left_files & right_files):
+        left_path = os.path.join(left, path)
+        right_path = os.path.join(right, path)
+        if os.path.getsize(left_path) != os.path.getsize(right_path):
+            different.append(path)
+        elif check_contents and file_sha256(left_path) != file_sha256(right_path):
+            different.append(path)
+
+    return {
+        "missing": sorted(left_files - right_files),
+        "extra": sorted(right_files - left_files),
+        "missing_dirs": sorted(left_dirs - right_dirs),
+        "extra_dirs": sorted(right_dirs - left_dirs),
+        "different": different,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two extracted/flattened directory trees")
+    parser.add_argument("left", help="Reference tree, e.g. the two-stage FlatDirectory")
+    parser.add_argument("right", help="Tree to compare, e.g. the fused FlatDirectory")
+    parser.add_argument("--size-only", action="store_true", help="Compare file sizes only, not contents")
+    args = parser.parse_args(argv)
+
+    for root in (args.left, args.right):
+        if not os.path.isdir(root):
+            print(f"Error: '{root}' is not a directory.", file=sys.stderr)
+            return 2
+
+    result = compare_trees(args.left, args.right, check_contents=not args.size_only)
+    labels = (
+        ("missing", "Only in left"),
+        ("extra", "Only in right"),
+        ("missing_dirs", "Directory only in left"),
+        ("extra_dirs", "Directory only in right"),
+        ("different", "Different"),
+    )
+    mismatches = 0
+    for key, label in labels:
+        for path in result[key]:
+            print(f"{label}: {path}")
+        mismatches += len(result[key])
+
+    if mismatches:
+        print(f"Trees differ: {mismatches} mismatch(es).")
+        return 1
+    print("Trees are identical.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,16 +4,35 @@
 
 import sys
 import os
+import errno
 import shutil
 import hashlib
+import functools
 import re
 import time
-import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 try:
-    from ....printer import print, print_error, print_verbose, print_debug, colours
+    from re import _parser as sre_parse, _constants as sre_constants
 except ImportError:
-    from printer import print, print_error, print_verbose, print_debug, colours
+    import sre_parse, sre_constants
+try:
+    from ....printer import print, print_error, print_verbose, print_debug, progress, colours
+except ImportError:
+    from printer import print, print_error, print_verbose, print_debug, progress, colours
+try:
+    from ....instrument import TRACER
+except ImportError:
+    from instrument import TRACER
+try:
+    from ....scan import SCANS
+except ImportError:
+    from scan import SCANS
+try:
+    from ....conf import ExtractConfig
+except ImportError:
+    from conf import ExtractConfig
 
 
 # -- Begin Global Variables --
@@ -24,6 +43,23 @@ global root_dir, destination_dir, VERBOSE, DEBUG, SANITIZATION_RULES
 VERBOSE = "VERBOSE" in os.environ and os.environ["VERBOSE"].lower() == "true"
 DEBUG = "DEBUG" in os.environ and os.environ["DEBUG"].lower() == "true"
 
+# --- Transfer Modes and Copy Verification ---
+# Set per project (Settings.flat_mode / flat_verify) and passed to execute_plan, see conf.LINK_MODES
+# and conf.VERIFY_MODES. Transfer modes: "copy": hashed copy, "hardlink": link to the source file,
+# "reflink": copy-on-write clone (FICLONE, e.g. btrfs/XFS), "move": rename the source file into place,
+# "dedup": link to a blob in the content-addressed store, one blob per SHA256 (see DedupStore).
+# Link modes fall back to copying when the filesystem or device does not allow them.
+# Verification: "none": trust the copy, "size": compare the destination size, "full": re-hash the destination.
+
+# ioctl request to clone a file on Linux, _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+# Errors meaning "this link mode is not possible here", as opposed to real failures
+LINK_FALLBACK_ERRNOS = {errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EINVAL, errno.ENOTTY, errno.EOPNOTSUPP, errno.ENOTSUP, errno.ENOSYS}
+
+# Buffer size for copying and hashing, each thread reuses its own buffer
+COPY_BUFFER_SIZE = 1024 * 1024
+_copy_buffers = threading.local()
+
 
 # --- Sanitization Rules ---
 SANITIZATION_RULES = [
@@ -79,6 +115,15 @@ SANITIZATION_RULES = [
 ]
 
 # --- Hash Calculation ---
+def _get_copy_buffer() -> bytearray:
+    """
+    Returns the calling thread's reusable copy buffer.
+    """
+    buffer = getattr(_copy_buffers, "buffer", None)
+    if buffer is None:
+        buffer = _copy_buffers.buffer = bytearray(COPY_BUFFER_SIZE)
+    return buffer
+
 def get_file_sha256(file_path: str) -> str:
     """
     Calculate the SHA256 hash of a file.
@@ -88,60 +133,401 @@ def get_file_sha256(file_path: str) -> str:
 
     Returns:
         str: The SHA256 hash of the file as a hexadecimal string.
+
+    Raises:
+        OSError: If the file cannot be read. It is called from transfer worker threads,
+        which collect failures for the end-of-run summary instead of exiting.
     """
     try:
         if not os.path.isfile(file_path):
             raise FileNotFoundError(f"File not found at '{file_path}'.")
         sha256_hash = hashlib.sha256()
-        with open(file_path, "rb") as f:
-            # Read and update hash string value in blocks of 4K
-            for byte_block in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(byte_block)
+        buffer = _get_copy_buffer()
+        view = memoryview(buffer)
+        with open(file_path, "rb", buffering=0) as f:
+            # Read into the reused buffer and update the hash in 1 MiB blocks
+            while True:
+                read = f.readinto(buffer)
+                if not read:
+                    break
+                sha256_hash.update(view[:read])
         return sha256_hash.hexdigest()
-    except Exception as ex:
-        print_error(f"Error calculating SHA256 hash for file '{file_path}': {ex}")
-        sys.exit(1)
+    except OSError as ex:
+        raise OSError(f"Error calculating SHA256 hash for file '{file_path}': {ex}") from ex
 
-def sanitize_name(input_name: str) -> str:
+def copy_file_sha256(source_path: str, destination_path: str, verify: str = "full") -> str:
     """
-    Sanitize the given input name based on predefined sanitization rules.
+    Copy a file while calculating the SHA256 hash of the copied data, then verify the destination.
+
+    The source is read once into a reused buffer, each block is hashed and written.
+    Metadata is preserved like shutil.copy2.
 
     Args:
-        input_name (str): The name to be sanitized.
+        source_path (str): The file to copy.
+        destination_path (str): The path to copy it to.
+        verify (str): "none", "size" to compare the destination size, or "full" to re-hash the destination.
 
     Returns:
-        str: The sanitized name after applying the rules.
+        str: The SHA256 hash of the source file as a hexadecimal string.
+
+    Raises:
+        OSError: If the copy fails or the destination does not match the source.
+    """
+    sha256_hash = hashlib.sha256()
+    buffer = _get_copy_buffer()
+    view = memoryview(buffer)
+    copied = 0
+    with open(source_path, "rb", buffering=0) as src, open(destination_path, "wb", buffering=0) as dst:
+        while True:
+            read = src.readinto(buffer)
+            if not read:
+                break
+            block = view[:read]
+            sha256_hash.update(block)
+            while block:
+                written = dst.write(block)
+                block = block[written:]
+            copied += read
+    shutil.copystat(source_path, destination_path)
+    source_hash = sha256_hash.hexdigest()
+
+    if verify == "size":
+        destination_size = os.path.getsize(destination_path)
+        if destination_size != copied:
+            raise OSError(f"Size mismatch for '{destination_path}': copied {copied} bytes, found {destination_size}.")
+    elif verify == "full":
+        verify_start = time.perf_counter()
+        destination_hash = get_file_sha256(destination_path)
+        TRACER.accumulate("flatten.verify", seconds=time.perf_counter() - verify_start, bytes=copied, files=1)
+        if destination_hash != source_hash:
+            raise OSError(f"Hash mismatch for '{destination_path}'. Source SHA256: {source_hash}, Destination SHA256: {destination_hash}")
+    return source_hash
+
+def reflink_file(source_path: str, destination_path: str) -> None:
     """
-    print_verbose(f"Sanitizing name: '{input_name}'")
-    output_name = input_name
-    for rule in SANITIZATION_RULES:
-        before = output_name
+    Clone a file with the FICLONE ioctl, sharing its data blocks copy-on-write.
+
+    Raises:
+        OSError: If the platform or filesystem does not support cloning.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError(errno.ENOSYS, "Reflinks are not supported on this platform")
+    with open(source_path, "rb") as src, open(destination_path, "wb") as dst:
         try:
-            if rule["is_regex"]:
-                output_name = re.sub(rule["pattern"], rule["replacement"], output_name)
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.remove(destination_path)
+            raise
+    shutil.copystat(source_path, destination_path)
+
+class DedupStore:
+    """
+    A content-addressed blob store: every distinct file content is stored once, as
+    <root>/<first two hex digits>/<sha256>, and outputs are hardlinks to their blob.
+
+    A source is hashed first (get_file_sha256) and only copied into the store when its
+    digest is new, so duplicates cost a read but no write. Thread safe.
+
+    Args:
+        root (str): The store directory, on the same filesystem as the destination for hardlinks.
+        verify (str): The verification mode used when a new blob is written.
+    """
+
+    def __init__(self, root: str, verify: str = "full"):
+        self.root = root
+        self.verify = verify
+        self.files = 0
+        self.logical_bytes = 0
+        self.written_bytes = 0
+        self.digests = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def add(self, source_path: str) -> str:
+        """
+        Stores a file's content if it is not stored yet and returns its blob path.
+        """
+        size = os.path.getsize(source_path)
+        digest = get_file_sha256(source_path)
+        blob_path = self.blob_path(digest)
+        written = 0
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            # Each writer copies to its own temporary name, the rename makes the blob appear atomically
+            temp_path = f"{blob_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                if copy_file_sha256(source_path, temp_path, self.verify) != digest:
+                    raise OSError(f"'{source_path}' changed while it was being stored.")
+                os.replace(temp_path, blob_path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            written = size
+        with self._lock:
+            self.files += 1
+            self.logical_bytes += size
+            self.written_bytes += written
+            self.digests[digest] = size
+        return blob_path
+
+    def materialize(self, source_path: str, destination_path: str) -> str:
+        """
+        Places a source file at destination_path as a hardlink to its blob.
+
+        Returns:
+            str: "dedup", or "copy" if the blob could not be linked (e.g. another device or too many links).
+        """
+        blob_path = self.add(source_path)
+        if os.path.lexists(destination_path):
+            if os.path.samefile(blob_path, destination_path):
+                return "dedup"
+            os.remove(destination_path)
+        try:
+            os.link(blob_path, destination_path)
+            return "dedup"
+        except OSError as ex:
+            if ex.errno not in LINK_FALLBACK_ERRNOS:
+                raise
+            print_verbose(f"Cannot link '{blob_path}' ({ex}), copying instead.")
+        copy_file_sha256(blob_path, destination_path, self.verify)
+        return "copy"
+
+    def prune(self) -> tuple:
+        """
+        Removes blobs no output links to any more (link count 1, the store's own).
+
+        Returns:
+            tuple[int, int]: The number of blobs removed and their total size.
+        """
+        removed = 0
+        freed = 0
+        for directory, _, file_names in os.walk(self.root):
+            for name in file_names:
+                blob_path = os.path.join(directory, name)
+                stat = os.stat(blob_path)
+                if stat.st_nlink <= 1:
+                    os.remove(blob_path)
+                    removed += 1
+                    freed += stat.st_size
+        return removed, freed
+
+    def report(self) -> dict:
+        unique_bytes = sum(self.digests.values())
+        return {
+            "files": self.files,
+            "unique_files": len(self.digests),
+            "logical_bytes": self.logical_bytes,
+            "unique_bytes": unique_bytes,
+            "written_bytes": self.written_bytes,
+            "saved_bytes": self.logical_bytes - unique_bytes,
+        }
+
+def transfer_file(source_path: str, destination_path: str, mode: str = "copy", verify: str = "full", store: DedupStore = None) -> str:
+    """
+    Place a source file at its flattened destination using the given transfer mode.
+
+    Hardlinks, reflinks and moves leave the data untouched, so they are not verified.
+    When the mode is not possible (e.g. across devices, or a filesystem without
+    reflinks) the file is copied instead, and for "move" the source is then removed.
+
+    Args:
+        source_path (str): The file to transfer.
+        destination_path (str): The path to place it at, replaced if it already exists.
+        mode (str): One of conf.LINK_MODES.
+        verify (str): The verification mode used when the file is copied.
+        store (DedupStore): The blob store, required for "dedup".
+
+    Returns:
+        str: The mode that was actually used, "copy" if a link mode fell back.
+    """
+    if mode == "dedup":
+        return store.materialize(source_path, destination_path)
+
+    # An existing destination may be a hardlink to its source or to a dedup blob from an earlier
+    # run in another mode, so it is replaced, never written through
+    if os.path.lexists(destination_path):
+        if mode == "hardlink" and os.path.samefile(source_path, destination_path):
+            return mode
+        os.remove(destination_path)
+
+    try:
+        if mode == "hardlink":
+            os.link(source_path, destination_path)
+            return mode
+        if mode == "reflink":
+            reflink_file(source_path, destination_path)
+            return mode
+        if mode == "move":
+            os.rename(source_path, destination_path)
+            return mode
+    except OSError as ex:
+        if ex.errno not in LINK_FALLBACK_ERRNOS:
+            raise
+        print_verbose(f"Cannot {mode} '{source_path}' ({ex}), copying instead.")
+
+    copy_file_sha256(source_path, destination_path, verify)
+    if mode == "move":
+        os.remove(source_path)
+    return "copy"
+
+# --- Sanitization Engine ---
+def required_literal(pattern: str) -> str:
+    """
+    Find the longest literal substring any match of a regex pattern must contain.
+
+    Only top-level literal runs are considered, so the result is conservative: an empty
+    string means no prefilter is possible and the rule always has to be tried.
+
+    Args:
+        pattern (str): The regex pattern.
+
+    Returns:
+        str: The required literal, or an empty string.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:
+        return ""
+    state = getattr(parsed, "state", None) or getattr(parsed, "pattern", None)
+    if state is not None and state.flags & (re.IGNORECASE | re.VERBOSE):
+        return ""
+
+    best = ""
+    run = []
+    for op, av in list(parsed) + [(None, None)]:
+        if op == sre_constants.LITERAL:
+            run.append(chr(av))
+            continue
+        if len(run) > len(best):
+            best = "".join(run)
+        run = []
+    return best
+
+class SanitizerEngine:
+    """
+    Applies a sanitization rule table to directory names.
+
+    Rules are compiled once. Each rule carries the literal its pattern requires, and is
+    skipped without running the regex when the current name does not contain it.
+    Results are cached in an LRU keyed by the input name.
+
+    Args:
+        rules (list[dict]): Rules with "pattern", "replacement" and "is_regex" keys, applied in order.
+        cache_size (int): The maximum number of cached names.
+    """
+
+    def __init__(self, rules: list, cache_size: int = 65536):
+        self.rules = []
+        for rule in rules:
+            pattern = rule["pattern"]
+            replacement = rule["replacement"]
+            if rule.get("is_regex", True):
+                try:
+                    compiled = re.compile(pattern)
+                except re.error as e:
+                    print_error(f"Regex error in rule pattern '{pattern}': {e}")
+                    continue
+                self.rules.append((compiled, pattern, replacement, required_literal(pattern)))
             else:
                 # For non-regex, treat pattern as literal string
-                output_name = output_name.replace(rule["pattern"], rule["replacement"])
-            if before != output_name:
-                print_verbose(f"Rule applied: Pattern='{rule['pattern']}', Replacement='{rule['replacement']}'")
+                self.rules.append((None, pattern, replacement, pattern))
+        self.sanitize = functools.lru_cache(maxsize=cache_size)(self._apply)
+
+    @classmethod
+    def from_config(cls, config: dict) -> "SanitizerEngine":
+        """
+        Build an engine from the 'SanitizationRules' list of the Extract config, or the built-in rules.
+        """
+        return cls(config.get("SanitizationRules") or SANITIZATION_RULES)
+
+    def _apply(self, input_name: str) -> str:
+        if VERBOSE:
+            print_verbose(f"Sanitizing name: '{input_name}'")
+        output_name = input_name
+        for compiled, pattern, replacement, literal in self.rules:
+            if literal not in output_name:
+                continue
+            before = output_name
+            if compiled is not None:
+                output_name = compiled.sub(replacement, output_name)
+            else:
+                output_name = output_name.replace(pattern, replacement)
+            if VERBOSE and before != output_name:
+                print_verbose(f"Rule applied: Pattern='{pattern}', Replacement='{replacement}'")
                 print_verbose(f"  Before: '{before}'")
                 print_verbose(f"  After:  '{output_name}'")
-        except re.error as e:
-            print_error(f"Regex error in rule pattern '{rule['pattern']}': {e}")
-            # Decide whether to continue or exit
-            # sys.exit(1)
-    print_verbose(f"Sanitized name result: '{output_name}'")
-    return output_name
-
-# --- Recursive Processing Function ---
-def process_source_directory(source_path, destination_parent_path, accumulated_flattened_name, base_destination_dir, original_root_dir_abs):
-    print(colours.GREEN, f"Processing Source Directory: '{source_path}'")
-    print(colours.DARK_GREEN, f" -> Destination Parent Path: '{destination_parent_path}'")
-    print(colours.DARK_GREEN, f" -> Accumulated Flattened Name: '{accumulated_flattened_name}'")
-    print_verbose(f"Processing Source: '{source_path}' -> Dest Parent: '{destination_parent_path}' (Accumulated Name: '{accumulated_flattened_name}')")
+        if VERBOSE:
+            print_verbose(f"Sanitized name result: '{output_name}'")
+        return output_name
+
+# Used when no engine is passed, projects with their own SanitizationRules pass SanitizerEngine.from_config
+DEFAULT_SANITIZER = SanitizerEngine(SANITIZATION_RULES)
+
+def sanitize_name(input_name: str, sanitizer: SanitizerEngine = None) -> str:
+    """
+    Sanitize the given input name based on the given sanitization rules.
+
+    Args:
+        input_name (str): The name to be sanitized.
+        sanitizer (SanitizerEngine): The rules to apply, the built-in SANITIZATION_RULES when not given.
+
+    Returns:
+        str: The sanitized name after applying the rules.
+    """
+    return (sanitizer or DEFAULT_SANITIZER).sanitize(input_name)
+
+# --- Planning Phase ---
+def list_directory(source_path: str) -> tuple:
+    """
+    List the direct child directories and files of a directory on disk, uncached.
+    main() plans from the shared scan cache instead (SCANS.children, same result).
+
+    Returns:
+        tuple[list[str], list[str]]: The child directory paths and the child file paths.
+    """
+    child_dirs = []
+    child_files = []
+    with os.scandir(source_path) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                child_dirs.append(entry.path)
+            elif entry.is_file():
+                child_files.append(entry.path)
+    return child_dirs, child_files
+
+def plan_source_directory(source_path, destination_parent_path, accumulated_flattened_name, base_destination_dir, original_root_dir_abs, plan, list_children=list_directory, sanitizer=None):
+    """
+    Recursively plan the flattening of a source directory without writing anything.
+
+    Single-child directory chains are collapsed into one '++' joined, sanitized name.
+    The destination directories to create and the (source, destination) file pairs
+    are appended to plan["directories"] and plan["files"].
+
+    Args:
+        source_path (str): The source directory to plan.
+        destination_parent_path (str): The destination directory its flattened directory goes into.
+        accumulated_flattened_name (str): The '++' joined name of the collapsed chain so far.
+        base_destination_dir (str): The destination root, used for relative paths in messages.
+        original_root_dir_abs (str): The source root, whose children go directly into the destination.
+        plan (dict): The plan being built.
+        list_children (callable): Lists a directory as (child_dirs, child_files), see list_directory.
+            Passing another lister plans a tree that is not on disk yet.
+        sanitizer (SanitizerEngine): The rules collapsed names are sanitized with, see sanitize_name.
+    """
+    # Logged for every directory, formatted lazily so quiet runs skip the formatting
+    print(colours.GREEN, "Processing Source Directory: '%s'", source_path)
+    print(colours.DARK_GREEN, " -> Destination Parent Path: '%s'", destination_parent_path)
+    print(colours.DARK_GREEN, " -> Accumulated Flattened Name: '%s'", accumulated_flattened_name)
+    print_verbose("Processing Source: '%s' -> Dest Parent: '%s' (Accumulated Name: '%s')", source_path, destination_parent_path, accumulated_flattened_name)
 
     if accumulated_flattened_name:
-        accumulated_flattened_name = sanitize_name(accumulated_flattened_name)
+        accumulated_flattened_name = sanitize_name(accumulated_flattened_name, sanitizer)
 
     child_dirs = []
     child_files = []
@@ -149,12 +535,7 @@ def process_source_directory(source_path, destination_parent_path, accumulated_f
 
     try:
         # Get direct children
-        for item in os.listdir(source_path):
-            item_path = os.path.join(source_path, item)
-            if os.path.isdir(item_path):
-                child_dirs.append(item_path)
-            elif os.path.isfile(item_path):
-                child_files.append(item_path)
+        child_dirs, child_files = list_children(source_path)
         child_count = len(child_dirs) + len(child_files)
     except Exception as ex:
         print_error(f"Error reading contents of '{source_path}': {ex}.")
@@ -169,11 +550,11 @@ def process_source_directory(source_path, destination_parent_path, accumulated_f
         new_accumulated_name = f"{source_base_name}++{child_base_name}" if not accumulated_flattened_name \
                             else f"{accumulated_flattened_name}++{child_base_name}"
 
-        print_verbose(f"Flattening: '{source_base_name}' contains only '{child_base_name}'. New accumulated name: '{new_accumulated_name}'")
-        print_debug(f"Flattening {source_path} into {single_child_dir}")
+        print_verbose("Flattening: '%s' contains only '%s'. New accumulated name: '%s'", source_base_name, child_base_name, new_accumulated_name)
+        print_debug("Flattening %s into %s", source_path, single_child_dir)
 
         # Recurse into the single child directory
-        process_source_directory(single_child_dir, destination_parent_path, new_accumulated_name, base_destination_dir, original_root_dir_abs)
+        plan_source_directory(single_child_dir, destination_parent_path, new_accumulated_name, base_destination_dir, original_root_dir_abs, plan, list_children, sanitizer)
         return
 
     # --- Case 2: Branching or Terminal Condition ---
@@ -187,109 +568,217 @@ def process_source_directory(source_path, destination_parent_path, accumulated_f
         if is_processing_actual_root_dir:
             final_dest_dir_path = destination_parent_path
             print_verbose(f"Processing root directory's children directly into '{final_dest_dir_path}'")
-            # time.sleep(1) # Optional pause
         else:
             if not final_dir_name: # Check against creating folders without name
                 print_error(f"Calculated final directory name is empty for source '{source_path}'. This shouldn't happen unless processing root drive. Aborting.")
                 sys.exit(1)
 
             final_dest_dir_path = os.path.join(destination_parent_path, final_dir_name)
+            plan["directories"].append(final_dest_dir_path)
 
-            if not os.path.exists(final_dest_dir_path):
-                try:
-                    relative_dest_path = os.path.relpath(final_dest_dir_path, base_destination_dir)
-                    print(colours.GREEN, f"  Creating directory: '{relative_dest_path}'")
-                    print_verbose(f"Creating concrete destination directory: '{final_dest_dir_path}'")
-                    os.makedirs(final_dest_dir_path)
-                except Exception as ex:
-                    print_error(f"Error creating directory '{final_dest_dir_path}': {ex}.")
-                    sys.exit(1)
-            else:
-                print_verbose(f"Destination directory '{final_dest_dir_path}' already exists.")
-            # time.sleep(1) # Optional pause
-
-        # Process Files
+        # Plan Files
         if child_files:
-            print_verbose(f"Processing {len(child_files)} files in '{source_path}'.")
+            print_verbose(f"Planning {len(child_files)} files in '{source_path}'.")
             for file_path in child_files:
                 file_name = os.path.basename(file_path)
-                destination_file_path = os.path.join(final_dest_dir_path, file_name)
-                relative_dest_file_path = os.path.relpath(destination_file_path, base_destination_dir)
+                plan["files"].append((file_path, os.path.join(final_dest_dir_path, file_name)))
 
-                try:
-                    print(colours.BLUE, f"    Copying file: '{file_name}' -> '{relative_dest_file_path}'")
-                    print_verbose(f"Copying file '{file_path}' to '{destination_file_path}'")
-                    shutil.copy2(file_path, destination_file_path) # copy2 preserves metadata
-
-                    # Perform hash check
-                    print_verbose(f"Verifying hash for '{file_name}'...")
-                    source_hash = get_file_sha256(file_path)
-                    destination_hash = get_file_sha256(destination_file_path)
-
-                    if source_hash != destination_hash:
-                        print_error(f"Hash mismatch for file '{file_name}'. Dest: '{relative_dest_file_path}'.")
-                        print_error(f"  Source SHA256: {source_hash}")
-                        print_error(f"  Destination SHA256: {destination_hash}")
-                        sys.exit(1)
-                    else:
-                        print_verbose(f"SHA256 hash match confirmed for '{file_name}'.")
-                except Exception as ex:
-                    print_error(f"Error during copy/verify for file '{file_path}' to '{destination_file_path}': {ex}.")
-                    sys.exit(1)
-
-        # Process Subdirectories
+        # Plan Subdirectories
         if child_dirs:
-            print_verbose(f"Processing {len(child_dirs)} subdirectories in '{source_path}'.")
+            print_verbose(f"Planning {len(child_dirs)} subdirectories in '{source_path}'.")
             for dir_path in child_dirs:
-                process_source_directory(dir_path,
+                plan_source_directory(dir_path,
                                     final_dest_dir_path, # New parent
                                     "",                  # Reset accumulated name
                                     base_destination_dir,
-                                    original_root_dir_abs)
+                                    original_root_dir_abs,
+                                    plan,
+                                    list_children,
+                                    sanitizer)
 
         if child_count == 0:
             print_verbose(f"Source directory '{source_path}' is empty.")
 
-        return # Processing for this level complete
+        return # Planning for this level complete
+
+def plan_flatten(root_dir_abs: str, destination_dir_abs: str, list_children=list_directory, sanitizer: SanitizerEngine = None) -> dict:
+    """
+    Build the complete flattening plan for a source root.
+
+    Args:
+        root_dir_abs (str): The absolute source root directory.
+        destination_dir_abs (str): The absolute destination directory.
+        list_children (callable): Lists a directory as (child_dirs, child_files), see list_directory.
+        sanitizer (SanitizerEngine): The project's sanitization rules, the built-in ones when not given.
+
+    Returns:
+        dict: "directories", the destination directories to create in order, and
+        "files", the (source, destination) path pairs to transfer.
+    """
+    plan = {"directories": [], "files": []}
+    plan_source_directory(root_dir_abs, destination_dir_abs, "", destination_dir_abs, root_dir_abs, plan, list_children, sanitizer)
+    return dedupe_plan(plan)
+
+def dedupe_plan(plan: dict) -> dict:
+    """
+    Drop duplicate destinations from a plan, so no two transfers ever write the same file.
+
+    Different sources can flatten to the same destination (e.g. 'a/b/f.txd' and 'a++b/f.txd').
+    Like the serial flattener, the later file in walk order wins. Directories are kept once,
+    at their first position, so parents are still created before their children.
+    """
+    directories = {}
+    for directory in plan["directories"]:
+        directories.setdefault(os.path.normcase(directory), directory)
+
+    files = {}
+    collisions = {}
+    for source_path, destination_path in plan["files"]:
+        key = os.path.normcase(destination_path)
+        if key in files:
+            collisions[key] = collisions.get(key, 1) + 1
+        files[key] = (source_path, destination_path)
+    for key, count in collisions.items():
+        source_path, destination_path = files[key]
+        print_verbose(f"Destination collision: {count} sources flatten to '{destination_path}', keeping '{source_path}'.")
+
+    plan["directories"] = list(directories.values())
+    plan["files"] = list(files.values())
+    return plan
+
+def print_plan(plan: dict, base_destination_dir: str) -> None:
+    """
+    Print a plan without executing it (dry run).
+    """
+    for directory in plan["directories"]:
+        print(colours.GREEN, f"  Directory: '{os.path.relpath(directory, base_destination_dir)}'")
+    for source_path, destination_path in plan["files"]:
+        print(colours.BLUE, f"    File: '{source_path}' -> '{os.path.relpath(destination_path, base_destination_dir)}'")
+    print(colours.CYAN, f"Plan: {len(plan['directories'])} directories, {len(plan['files'])} files.")
+
+# --- Execution Phase ---
+def execute_plan(plan: dict, base_destination_dir: str, mode: str = "copy", verify: str = "full", max_workers: int = 1, store: DedupStore = None) -> int:
+    """
+    Create the planned directories, then transfer the planned files on a thread pool.
+
+    Progress is reported per file as transfers complete, followed by a summary.
+    Failed transfers are reported together at the end and abort the run.
+
+    Args:
+        plan (dict): A plan from plan_flatten.
+        base_destination_dir (str): The destination root, used for relative paths in messages.
+        mode (str): The transfer mode, one of conf.LINK_MODES.
+        verify (str): The copy verification mode, one of conf.VERIFY_MODES.
+        max_workers (int): The number of concurrent transfers.
+        store (DedupStore): The blob store used by the "dedup" mode.
+
+    Returns:
+        int: The number of bytes transferred.
+    """
+    for directory in plan["directories"]:
+        if not os.path.exists(directory):
+            try:
+                print(colours.GREEN, f"  Creating directory: '{os.path.relpath(directory, base_destination_dir)}'")
+                os.makedirs(directory)
+            except Exception as ex:
+                print_error(f"Error creating directory '{directory}': {ex}.")
+                sys.exit(1)
+        else:
+            print_verbose(f"Destination directory '{directory}' already exists.")
+
+    def transfer(pair):
+        source_path, destination_path = pair
+        # Sizes are taken first because "move" removes the source, from the planning scan
+        size = SCANS.stat(source_path).st_size
+        transfer_start = time.perf_counter()
+        used_mode = transfer_file(source_path, destination_path, mode, verify, store)
+        # Copy time includes the inline source hash and any verification (also totalled as flatten.verify)
+        TRACER.accumulate(f"flatten.{used_mode}", seconds=time.perf_counter() - transfer_start, bytes=size, files=1)
+        return used_mode, size
+
+    total = len(plan["files"])
+    used_modes = {}
+    failures = []
+    transferred_bytes = 0
+    start_time = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(transfer, pair): pair for pair in plan["files"]}
+        for done, future in enumerate(as_completed(futures), start=1):
+            source_path, destination_path = futures[future]
+            progress("Flattening", done, total)
+            try:
+                used_mode, size = future.result()
+            except Exception as ex:
+                failures.append((source_path, destination_path, ex))
+                print_error(f"  [{done}/{total}] Error during {mode} of '{source_path}': {ex}.")
+                continue
+            used_modes[used_mode] = used_modes.get(used_mode, 0) + 1
+            transferred_bytes += size
+            print(colours.BLUE, lambda: f"    [{done}/{total}] {used_mode}: '{os.path.basename(source_path)}' -> '{os.path.relpath(destination_path, base_destination_dir)}'")
+
+    elapsed = time.perf_counter() - start_time
+    rate = transferred_bytes / elapsed / (1024 * 1024) if elapsed > 0 else 0.0
+    modes_summary = ", ".join(f"{count} {used}" for used, count in sorted(used_modes.items())) or "none"
+    print(colours.CYAN, f"Transferred {total - len(failures)}/{total} files ({transferred_bytes} bytes) in {elapsed:.2f}s, {rate:.2f} MB/s using {max_workers} worker(s) [{modes_summary}].")
+    if store is not None:
+        report = store.report()
+        saved = report["saved_bytes"] / report["logical_bytes"] * 100 if report["logical_bytes"] else 0.0
+        print(colours.CYAN, f"Dedup: {report['files']} files, {report['logical_bytes']} logical bytes, {report['unique_files']} unique contents, {report['unique_bytes']} unique bytes ({saved:.1f}% saved), {report['written_bytes']} bytes written to the store.")
+
+    if failures:
+        print_error(f"{len(failures)} file(s) failed to transfer:")
+        for source_path, destination_path, ex in failures:
+            print_error(f"  '{source_path}' -> '{destination_path}': {ex}")
+        sys.exit(1)
+    return transferred_bytes
 
 # --- End Main Functions ---
 
 # --- Main Function ---
 
-def main(project_dir: str, module_dir: str) -> None:
+def main(project_dir: str, module_dir: str, dry_run: bool = False, max_workers: int = None, config: ExtractConfig = None) -> None:
     """
     Main function to execute the universal recursive flattening process.
 
     Args:
         project_dir (str): The directory containing the project configuration.
         module_dir (str): The directory containing the module files.
+        dry_run (bool): Only print the flattening plan, without creating or transferring anything.
+        max_workers (int): Overrides Settings.max_workers when given.
+        config (ExtractConfig): The Extract configuration, read from project.json when not given.
 
     Returns:
         None
     """
 
-    global root_dir, destination_dir
+    # Load configuration from JSON file, unless the caller already did
+    if config is None:
+        try:
+            config = ExtractConfig.load(project_dir, module_dir)
+        except (OSError, ValueError) as e:
+            print_error(f"Error loading project.json: {e}")
+            sys.exit(1)
 
-    # Load configuration from JSON file
-    try:
-        with open(os.path.join(project_dir, "project.json"), 'r') as f:
-            config = json.load(f)["Extract"]
-    except Exception as e:
-        print_error(f"Error loading project.json: {e}")
-        sys.exit(1)
+    root_dir = config.out_directory
+    destination_dir = config.flat_directory
+    dedup_store_dir = config.dedup_store
+    verify_mode = config.flat_verify
+    link_mode = config.flat_mode
 
-    try:
-        root_dir = config["Directories"]["OutDirectory"]
-        destination_dir = config["Directories"]["FlatDirectory"]
-    except Exception as e:
-        print_error(f"Error reading paths from project.json: {e}")
-        sys.exit(1)
+    # Region builds can bring their own rule table in project.json
+    sanitizer = SanitizerEngine.from_config(config.raw)
+    if config.raw.get("SanitizationRules"):
+        print(colours.CYAN, f"Using {len(sanitizer.rules)} sanitization rules from project.json.")
 
+    # Concurrent transfers, shares the extraction worker count (0 means one per CPU)
+    max_workers = max_workers or config.max_workers
 
     # --- Main Script ---
     print(colours.YELLOW, "Starting universal recursive flattening copy process (root contents -> destination)...")
     print(colours.CYAN, f"Source Root Directory: '{root_dir}'")
     print(colours.CYAN, f"Destination Directory: '{destination_dir}'")
+    print(colours.CYAN, f"Transfer Mode: '{link_mode}', Copy Verification: '{verify_mode}'")
 
     root_dir_abs = os.path.abspath(root_dir)
     destination_dir_abs = os.path.abspath(destination_dir)
@@ -300,7 +789,9 @@ def main(project_dir: str, module_dir: str) -> None:
         sys.exit(1)
 
     # Ensure DestinationDir exists
-    if not os.path.exists(destination_dir_abs):
+    if dry_run:
+        print(colours.YELLOW, "Dry run: the destination will not be modified.")
+    elif not os.path.exists(destination_dir_abs):
         print(colours.YELLOW, f"Destination directory '{destination_dir_abs}' not found. Creating...")
         try:
             os.makedirs(destination_dir_abs)
@@ -317,8 +808,29 @@ def main(project_dir: str, module_dir: str) -> None:
     print(colours.GRAY, "--------------------------------------------------")
 
     try:
-        # Initial call to the recursive function
-        process_source_directory(root_dir_abs, destination_dir_abs, "", destination_dir_abs, root_dir_abs)
+        # Phase 1: plan the complete source -> destination mapping
+        with TRACER.span("flatten.plan") as counters:
+            plan = plan_flatten(root_dir_abs, destination_dir_abs, list_children=SCANS.children, sanitizer=sanitizer)
+            counters.update(directories=len(plan["directories"]), files=len(plan["files"]))
+        print(colours.CYAN, f"Planned {len(plan['directories'])} directories and {len(plan['files'])} files.")
+
+        # Phase 2: create the directories and transfer the files concurrently
+        if dry_run:
+            print_plan(plan, destination_dir_abs)
+        else:
+            store = DedupStore(os.path.abspath(dedup_store_dir), verify_mode) if link_mode == "dedup" else None
+            try:
+                with TRACER.span("flatten.execute", mode=link_mode, verify=verify_mode, workers=max_workers, files=len(plan["files"])) as counters:
+                    counters["bytes_written"] = execute_plan(plan, destination_dir_abs, link_mode, verify_mode, max_workers, store)
+            finally:
+                SCANS.invalidate(destination_dir_abs)
+                if link_mode == "move":
+                    SCANS.invalidate(root_dir_abs)
+            if store is not None:
+                # Blobs of outputs that were replaced or deleted are no longer linked from anywhere
+                removed, freed = store.prune()
+                if removed:
+                    print(colours.CYAN, f"Pruned {removed} unreferenced blob(s), {freed} bytes freed from '{store.root}'.")
     except Exception as ex:
         print_error(f"An unexpected error occurred during processing: {ex}")
         import traceback
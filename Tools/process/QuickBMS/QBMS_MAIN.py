@@ -1,121 +1,351 @@
 import os
-import re
-import subprocess
-from datetime import datetime
-import json
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 try:
-	from ....printer import print, print_error, print_verbose, print_debug, colours
+	from ....printer import print, print_error, print_verbose, print_debug, progress, colours
 except ImportError:
-	from printer import print, print_error, print_verbose, print_debug, colours
+	from printer import print, print_error, print_verbose, print_debug, progress, colours
+try:
+	from ....instrument import TRACER
+except ImportError:
+	from instrument import TRACER
+try:
+	from ....scan import SCANS
+except ImportError:
+	from scan import SCANS
+try:
+	from ....conf import ExtractConfig
+except ImportError:
+	from conf import ExtractConfig
+try:
+	from .str_archive import StrArchive
+	from .manifest import ExtractionManifest, script_fingerprint
+	from .coverage import CoverageSink
+	from .async_runner import QuickBMSRunner
+	from .batch import BatchRunner
+	from .filters import NameFilter, load_filters
+	from .catalog import Catalog
+	from . import fused
+except ImportError:
+	from str_archive import StrArchive
+	from manifest import ExtractionManifest, script_fingerprint
+	from coverage import CoverageSink
+	from async_runner import QuickBMSRunner
+	from batch import BatchRunner
+	from filters import NameFilter, load_filters
+	from catalog import Catalog
+	import fused
 
 
-def main(project_dir: str, module_dir: str) -> None:
+def get_output_directory(file_path: str, str_directory: str, out_directory: str) -> str:
+    """
+    Returns the '<name>_str' output directory of a .str file, mirroring its path below str_directory.
+    """
+    relative_path = os.path.relpath(file_path, start=str_directory)
+    return os.path.join(out_directory, os.path.splitext(relative_path)[0] + "_str")
+
+
+def build_quickbms_args(overwrite_option: str, bms_script: str, file_path: str, output_directory: str, quickbms_filter: str = "") -> list:
+    """
+    Builds the QuickBMS argument list for the given overwrite option and -f entry filter.
+    """
+    options = ["-f", quickbms_filter] if quickbms_filter else []
+    if overwrite_option == "a":
+        return options + ["-o", bms_script, file_path, output_directory]
+    elif overwrite_option == "r":
+        return options + ["-K", bms_script, file_path, output_directory]
+    elif overwrite_option == "s":
+        return options + ["-k", bms_script, file_path, output_directory]
+    else:
+        return options + [bms_script, file_path, output_directory]
 
-    # Load configuration from JSON file
-    try:
-        with open(os.path.join(project_dir, 'project.json'), 'r') as f:
-            config = json.load(f)["Extract"]
-    except Exception as e:
-        print_error(f"Error loading project.json: {e}")
-        exit(1)
+
+def extract_str_file_native(file_path: str, skip_blocks: dict = None, str_directory: str = "", out_directory: str = "", overwrite_option: str = "s", entry_filter: NameFilter = None) -> dict:
+    """
+    Extracts a single .str file with the native StrArchive reader.
+
+    Returns the same result layout as QuickBMSRunner.run, with a short summary as stdout.
+    The overwrite options map onto QuickBMS': 's' skips existing files, anything else overwrites.
+    Only entries selected by entry_filter are written, and skip_blocks (from the catalog) lists
+    the blocks holding none of them, which are not decoded at all.
+    "timing" holds the start time, wall seconds, worker pid/tid and the trace event args:
+    CPU seconds, bytes read (the archive size), bytes written and files written.
+    """
+    output_directory = get_output_directory(file_path, str_directory, out_directory)
+
+    result = {
+        "file_path": file_path,
+        "output_directory": output_directory,
+        "args": ["native", file_path, output_directory],
+        "stdout": "",
+        "stderr": "",
+        "returncode": None,
+        "error": None,
+        "records": [],
+    }
+    # Measured in the worker process and recorded by the caller, the tracer only runs there
+    timing = result["timing"] = {"start": time.time(), "seconds": 0.0, "pid": os.getpid(), "tid": threading.get_ident(), "args": {}}
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
 
     try:
-        str_directory = config["Directories"]["StrDirectory"]
-        out_directory = config["Directories"]["OutDirectory"]
-        log_file_path = config["Directories"]["LogFilePath"]
-        bms_script = config["Scripts"]["BmsScriptPath"]
+        os.makedirs(output_directory, exist_ok=True)
+        with StrArchive(file_path) as archive:
+            select = entry_filter.matches if entry_filter else None
+            written = archive.extract(output_directory, overwrite=overwrite_option != "s", select=select, skip_blocks=skip_blocks)
+            skipped = f", {len(skip_blocks)} skipped by the filter" if skip_blocks else ""
+            result["stdout"] = f"{len(archive.blocks)} blocks{skipped}, {written} files written"
+            timing["args"].update(bytes_read=os.path.getsize(file_path), bytes_written=archive.bytes_written, files=written)
+        result["returncode"] = 0
     except Exception as e:
-        print_error(f"Error reading paths from main ini file: {e}")
-        exit(1)
+        result["error"] = e
+
+    timing["seconds"] = time.perf_counter() - wall_start
+    timing["args"]["cpu_seconds"] = round(time.process_time() - cpu_start, 6)
+    return result
+
 
-    # Ensure log file exists
-    if not os.path.exists(log_file_path):
-        print(colours.BLUE, f"Creating log file at {log_file_path}")
+def main(project_dir: str, module_dir: str, max_workers: int = None, force: bool = False, config: ExtractConfig = None) -> None:
+    """
+    Extracts every .str file below StrDirectory into OutDirectory.
+
+    Args:
+        project_dir (str): The directory containing project.json.
+        module_dir (str): The directory containing the module files.
+        max_workers (int): Overrides Settings.max_workers when given.
+        force (bool): Ignore the manifest and re-extract every archive.
+        config (ExtractConfig): The Extract configuration, read from project.json when not given.
+    """
+
+    # Load configuration from JSON file, unless the caller already did
+    if config is None:
         try:
-            with open(log_file_path, 'w') as log_file:
-                log_file.write("")
-            print(colours.GREEN, "Log file created successfully.")
-        except Exception as e:
-            print_error(f"Error creating log file: {e}")
+            config = ExtractConfig.load(project_dir, module_dir)
+        except (OSError, ValueError) as e:
+            print_error(f"Error loading project.json: {e}")
             exit(1)
-    else:
-        print(colours.BLUE, f"Log file already exists at {log_file_path}")
+
+    str_directory = config.str_directory
+    out_directory = config.out_directory
+    log_file_path = config.log_file_path
+    manifest_path = config.manifest_path
+    bms_script = config.bms_script
+
+    # Open the coverage log once for the whole run
+    coverage_format = config.coverage_format
+    print(colours.BLUE, f"{'Appending to' if os.path.exists(log_file_path) else 'Creating'} {coverage_format} coverage log at {log_file_path}")
+    try:
+        coverage_sink = CoverageSink(log_file_path, coverage_format)
+    except Exception as e:
+        print_error(f"Error opening log file: {e}")
+        exit(1)
 
     # Parameters
     overwrite_option = "s"  # Default to 's' (skip all)
 
-    quickbms = config["Scripts"]["QuickBMSEXEPath"]
+    quickbms = config.quickbms
+    max_workers = max_workers or config.max_workers
+    engine = config.engine
 
-    # Get all .str files in the source directory
+    # Selective extraction: archive path and entry name filters from project.json
+    try:
+        archive_filter, entry_filter = load_filters(config.raw)
+        quickbms_filter = entry_filter.quickbms_filter() if entry_filter and engine != "native" else ""
+    except ValueError as e:
+        print_error(f"Error reading Filters from project.json: {e}")
+        exit(1)
+
+    # Get all .str files in the source directory, sorted so the processing
+    # order (and therefore the console output and coverage log) is stable.
+    # The scan is shared with the stage fingerprint, the manifest and the catalog.
     str_files = []
-    for root, _, files in os.walk(str_directory):
+    for root, _, files in SCANS.walk(str_directory):
         for file in files:
             if file.endswith(".str"):
                 str_files.append(os.path.join(root, file))
+    str_files.sort()
 
-    print(colours.BLUE, f"Found {len(str_files)} .str files to process.")
+    print(colours.BLUE, f"Found {len(str_files)} .str files.")
 
-    # Process each .str file
-    for file_path in str_files:
-        print(colours.BLUE, f"Processing file: {file_path}")
+    # Archives left out by the filter keep their previous output, the manifest still knows them,
+    # unless the script, engine or entry filter changed and made that output stale
+    all_str_files = str_files
+    if archive_filter:
+        str_files = [file_path for file_path in str_files if archive_filter.matches(os.path.relpath(file_path, start=str_directory))]
+        print(colours.BLUE, f"{len(str_files)} .str files selected by the archive filter.")
 
-        # Construct the output directory
-        relative_path = os.path.relpath(file_path, start=str_directory)
-        output_directory = os.path.join(out_directory, os.path.splitext(relative_path)[0] + "_str")
+    # Fused mode writes straight into the flattened layout, OutDirectory is never created.
+    # It bypasses the manifest: every selected archive is re-extracted, none is skipped as unchanged.
+    if config.fused:
+        coverage_sink.close()
+        try:
+            with TRACER.span("extract.fused", archives=len(str_files), workers=max_workers):
+                fused.run(config, str_files, str_directory, out_directory, max_workers)
+        except Exception as e:
+            print_error(f"Error during fused extraction: {e}")
+            exit(1)
+        finally:
+            SCANS.invalidate(config.flat_directory)
+        return
 
-        print(colours.BLUE, f"Output Directory: {output_directory}")
+    # Consult the manifest so unchanged archives are skipped without launching anything.
+    # Hashing archives (manifest_hash) can dominate this phase, so it is traced on its own.
+    with TRACER.span("extract.manifest", archives=len(str_files)):
+        # A different entry filter produces different output, like a different script: entries it
+        # now excludes would otherwise linger in OutDirectory, so the previous output is removed too
+        # The batch engine produces the same output as the quickbms engine, switching between them re-extracts nothing
+        script = script_fingerprint("quickbms" if engine == "batch" else engine, bms_script)
+        if entry_filter:
+            script += ":" + entry_filter.fingerprint()
+        manifest = ExtractionManifest(
+            manifest_path,
+            script,
+            use_hash=config.manifest_hash,
+        )
+        archive_keys = {file_path: os.path.relpath(file_path, start=str_directory) for file_path in all_str_files}
 
-        # Ensure the output directory exists
-        os.makedirs(output_directory, exist_ok=True)
+        # Output of a different script, engine or entry filter is stale, -k would keep it over the new one
+        outdated = manifest.take_outdated()
+        if outdated:
+            print(colours.YELLOW, f"Extraction script, engine or entry filter changed, removing the previous output of {len(outdated)} archive(s).")
+        for key, record in sorted(outdated.items()):
+            print_verbose(f"Removing previous output of '{key}': {record['output']}")
+            shutil.rmtree(record["output"], ignore_errors=True)
 
-        # Construct the command to run
-        args = []
-        if overwrite_option == "a":
-            args = ["-o", bms_script, file_path, output_directory]
-        elif overwrite_option == "r":
-            args = ["-K", bms_script, file_path, output_directory]
-        elif overwrite_option == "s":
-            args = ["-k", bms_script, file_path, output_directory]
-        else:
-            args = [bms_script, file_path, output_directory]
+        # Prune the output of archives that no longer exist
+        for key in manifest.stale_keys(archive_keys.values()):
+            output_directory = manifest.archives[key]["output"]
+            print(colours.YELLOW, f"Pruning output of removed archive '{key}': {output_directory}")
+            shutil.rmtree(output_directory, ignore_errors=True)
+            manifest.remove(key)
 
-        print(colours.BLUE, f"QuickBMS Command: {quickbms} {' '.join(args)}")
+        pending_files = []
+        for file_path in str_files:
+            key = archive_keys[file_path]
+            output_directory = get_output_directory(file_path, str_directory, out_directory)
+            if not force and manifest.is_current(key, file_path, output_directory):
+                print_verbose(f"Skipping unchanged archive '{key}'")
+                continue
+            if force or key in manifest.archives:
+                # The archive changed (or a re-run is forced): drop its old output, QuickBMS -k would keep stale files
+                print(colours.YELLOW, f"Archive '{key}' {'forced' if force else 'changed'}, removing previous output: {output_directory}")
+                shutil.rmtree(output_directory, ignore_errors=True)
+                manifest.remove(key)
+            pending_files.append(file_path)
 
-        # Execute the QuickBMS command
-        try:
-            result = subprocess.run([quickbms] + args, capture_output=True, text=True)
-            quickbms_output = result.stdout
-            quickbms_error = result.stderr
-            full_output = quickbms_output + "\n" + quickbms_error
-            print(colours.BLUE, "# Start quickBMS Output")
-            print(colours.CYAN, quickbms_output)
-            print(colours.BLUE, "# End quickBMS Output")
-        except Exception as e:
-            print_error(f"Error executing QuickBMS: {e}")
-            continue
+    print(colours.BLUE, f"{len(pending_files)} .str files to process, {len(str_files) - len(pending_files)} unchanged.")
+    str_files = pending_files
+    print(colours.BLUE, f"Running {engine} engine with {max_workers} worker(s).")
 
-        # Extract coverage percentages
-        coverage_regex = re.compile(
-            r'coverage file\s+(-?\d+)\s+(\d+)%\s+\d+\s+\d+\s+\.\s+offset\s+([0-9a-fA-F]+)'
-        )
-        matches = coverage_regex.findall(full_output)
-
-        if matches:
-            print(colours.CYAN, "Coverage Percentages:")
-            for match in matches:
-                file_number, percentage, offset = match
-                print(colours.BLUE, f"  File: {file_number}, Percentage: {percentage}%, Offset: 0x{offset}")
-
-                # Log the file name and percentage to the log file
-                try:
-                    log_entry = f'Time = [{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}], Path = "{file_path}", File = "{file_number}", Percentage = "{percentage}%", Offset = "0x{offset}"\n'
-                    with open(log_file_path, 'a') as log_file:
-                        log_file.write(log_entry)
-                except Exception as e:
-                    print(colours.BLUE, f"Error writing to log file: {e}")
+    # With an entry filter, the catalog tells which blocks hold no selected entry, so the
+    # native engine skips them without decoding; uncatalogued archives are decoded to filter them
+    skip_maps = [None] * len(str_files)
+    catalog_path = config.catalog_path
+    if entry_filter and engine == "native" and str_files:
+        if os.path.isfile(catalog_path):
+            with Catalog(catalog_path) as catalog:
+                for index, file_path in enumerate(str_files):
+                    key = archive_keys[file_path].replace(os.sep, "/")
+                    if catalog.is_current(key, file_path):
+                        skip_maps[index] = catalog.unselected_blocks(key, entry_filter.matches)
+            skipped = sum(len(skip_map) for skip_map in skip_maps if skip_map)
+            uncatalogued = skip_maps.count(None)
+            print(colours.BLUE, f"Entry filter skips {skipped} block(s) using the catalog, {uncatalogued} archive(s) not catalogued.")
         else:
-            print(colours.CYAN, "No coverage information found.")
+            print(colours.YELLOW, f"No catalog at {catalog_path}, every block is decoded to apply the entry filter (see catalog.py build).")
+
+    # Process the .str files concurrently, results are yielded in submission
+    # order so each file is reported in full before the next one. QuickBMS
+    # runs only wait on a subprocess and are driven from an asyncio loop that
+    # streams their output, while the native reader is CPU bound and needs
+    # separate processes to run in parallel. The batch engine reports its
+    # archives shard by shard, as each QuickBMS batch run finishes.
+    quickbms_timeout, tail_lines = config.quickbms_timeout, config.output_tail_lines
+    if engine == "native":
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+        worker = partial(extract_str_file_native, str_directory=str_directory, out_directory=out_directory, overwrite_option=overwrite_option, entry_filter=entry_filter)
+    elif engine == "batch":
+        # Staged next to OutDirectory so the per-archive folders are moved, not copied, into it
+        out_parent, out_name = os.path.split(os.path.normpath(out_directory))
+        staging = os.path.join(out_parent, f".{out_name}_staging")
+        build_args = partial(build_quickbms_args, overwrite_option, bms_script, quickbms_filter=quickbms_filter)
+        executor = BatchRunner(quickbms, build_args, str_directory, staging, max_workers, quickbms_timeout, tail_lines, overwrite=overwrite_option == "a")
+        jobs = [(file_path, get_output_directory(file_path, str_directory, out_directory)) for file_path in str_files]
+        print(colours.BLUE, f"Extracting {len(jobs)} archives in up to {max_workers} QuickBMS batch runs.")
+        if quickbms_timeout:
+            print(colours.BLUE, f"QuickBMS batch runs are killed after {quickbms_timeout:g} seconds per archive they hold.")
+    else:
+        executor = QuickBMSRunner(quickbms, max_workers, quickbms_timeout, tail_lines)
+        jobs = []
+        for file_path in str_files:
+            output_directory = get_output_directory(file_path, str_directory, out_directory)
+            jobs.append((file_path, build_quickbms_args(overwrite_option, bms_script, file_path, output_directory, quickbms_filter), output_directory))
+        if quickbms_timeout:
+            print(colours.BLUE, f"QuickBMS runs are killed after {quickbms_timeout:g} seconds per archive.")
+
+    # The manifest is saved even if the run is interrupted, so finished archives stay recorded
+    try:
+        with TRACER.span("extract.archives", engine=engine, workers=max_workers) as totals, executor:
+            results = executor.map(worker, str_files, skip_maps) if engine == "native" else executor.map(jobs)
+
+            for done, result in enumerate(results, start=1):
+                file_path = result["file_path"]
+                output_directory = result["output_directory"]
+                progress("Extracting", done, len(str_files))
+
+                timing = result["timing"]
+                TRACER.add_event(archive_keys[file_path], "archive", timing["start"], timing["seconds"], timing["args"], timing["pid"], timing["tid"])
+                for counter in ("bytes_read", "bytes_written", "files"):
+                    totals[counter] = totals.get(counter, 0) + timing["args"].get(counter, 0)
+
+                print(colours.BLUE, f"Processing file: {file_path}")
+                print(colours.BLUE, f"Output Directory: {output_directory}")
+                if engine == "native":
+                    print(colours.BLUE, f"Native Extraction: {' '.join(result['args'][1:])}")
+                else:
+                    print(colours.BLUE, f"QuickBMS Command: {quickbms} {' '.join(result['args'])}")
+
+                if result["error"] is not None:
+                    print_error(f"Error executing {engine}: {result['error']}")
+                    if result.get("timed_out"):
+                        # Files QuickBMS was writing when it was killed are truncated, start over next run
+                        shutil.rmtree(output_directory, ignore_errors=True)
+                        print_error(f"Removed the partial output of {file_path}, it will be retried next run.")
+                    continue
+
+                print(colours.BLUE, "# Start quickBMS Output")
+                if result.get("lines", 0) > tail_lines:
+                    print(colours.GRAY, f"[last {tail_lines} of {result['lines']} output lines]")
+                print(colours.CYAN, result["stdout"])
+                print(colours.BLUE, "# End quickBMS Output")
+
+                # Coverage percentages were parsed while the output streamed, log them in one batch per archive
+                records = result["records"]
+
+                if records:
+                    print(colours.CYAN, "Coverage Percentages:")
+                    for record in records:
+                        print(colours.BLUE, f"  File: {record['file']}, Percentage: {record['percentage']}%, Offset: 0x{record['offset']:08x}")
+                    try:
+                        coverage_sink.write_records(records)
+                    except Exception as e:
+                        print(colours.BLUE, f"Error writing to log file: {e}")
+                else:
+                    print(colours.CYAN, "No coverage information found.")
+
+                if result["returncode"] != 0:
+                    print_error(f"{engine} exited with code {result['returncode']} for {file_path}, it will be retried next run.")
+                else:
+                    manifest.update(archive_keys[file_path], file_path, output_directory)
 
-        print(colours.BLUE, f"Processed {os.path.basename(file_path)} -> Output Directory: {output_directory}")
+                print(colours.BLUE, f"Processed {os.path.basename(file_path)} -> Output Directory: {output_directory}")
+    finally:
+        manifest.save()
+        coverage_sink.close()
+        # The flattener's fingerprint and plan must see the new output
+        SCANS.invalidate(out_directory)
 
     print(colours.BLUE, "QuickBMS processing completed.")
@@ -0,0 +1,295 @@
+"""
+This module runs QuickBMS processes concurrently from an asyncio event loop.
+
+Output is read line by line while QuickBMS runs: coverage summaries are parsed as they
+appear and only the last lines of each stream are kept, so a huge archive's file listing
+never piles up in memory. A run over several archives (an input folder, see batch.py) has
+its output split per archive at the 'open input file' lines QuickBMS prints. Each archive can be given a timeout after which its QuickBMS
+process is killed, so a hung run does not stall the pipeline.
+
+The loop lives on a background thread, which keeps the caller synchronous:
+
+    with QuickBMSRunner(quickbms, max_workers=4, timeout=600) as runner:
+        for result in runner.map(jobs):
+            ...
+"""
+
+import asyncio
+import locale
+import os
+import signal
+import threading
+import time
+from collections import deque
+try:
+	from ....instrument import TRACER
+except ImportError:
+	from instrument import TRACER
+try:
+	from .coverage import INPUT_FILE_REGEX, parse_coverage_line
+except ImportError:
+	from coverage import INPUT_FILE_REGEX, parse_coverage_line
+
+# Lines kept from the end of each output stream
+OUTPUT_TAIL_LINES = 200
+# Longest output line read, longer lines are dropped
+STREAM_LIMIT = 1024 * 1024
+# The encoding subprocess text mode would decode QuickBMS' output with
+OUTPUT_ENCODING = locale.getpreferredencoding(False)
+# On POSIX QuickBMS gets its own process group, so a kill also reaches the processes it
+# started (e.g. under wine), which would otherwise keep the output pipes open
+PROCESS_GROUPS = hasattr(os, "killpg")
+
+
+def measure_tree(directory: str) -> tuple:
+    """
+    Returns the number of files below a directory and their total size.
+    """
+    files = 0
+    size = 0
+    for root, _, file_names in os.walk(directory):
+        for name in file_names:
+            files += 1
+            size += os.path.getsize(os.path.join(root, name))
+    return files, size
+
+
+def kill(process: asyncio.subprocess.Process) -> None:
+    """
+    Kills a QuickBMS process, with its process group where there is one.
+    """
+    try:
+        if PROCESS_GROUPS:
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except ProcessLookupError:
+        pass
+
+
+class ArchiveOutput:
+    """
+    The output QuickBMS printed while reading one archive: the last lines, the number
+    of lines, the coverage records and when reading started and how long it took.
+    """
+
+    def __init__(self, tail_lines: int):
+        self.tail = deque(maxlen=tail_lines)
+        self.lines = 0
+        self.records = []
+        self.start = None
+        self.seconds = 0.0
+
+
+class OutputDemux:
+    """
+    Attributes the lines of a QuickBMS run to the archive being read.
+
+    A single archive run attributes everything to its archive. For an input folder,
+    each 'open input file' line switches to the named archive; lines before the
+    first one belong to no archive.
+    """
+
+    def __init__(self, archives: list, tail_lines: int):
+        self.outputs = {path: ArchiveOutput(tail_lines) for path in archives}
+        self._paths = {os.path.normcase(os.path.abspath(path)): path for path in archives}
+        self.current = None
+        if len(archives) == 1:
+            self._switch(archives[0])
+
+    def _switch(self, path: str) -> None:
+        now = time.time()
+        if self.current is not None:
+            output = self.outputs[self.current]
+            output.seconds = now - output.start
+        self.current = path
+        if path is not None:
+            self.outputs[path].start = now
+
+    def feed(self, text: str) -> None:
+        if "open input file" in text and len(self.outputs) > 1:
+            match = INPUT_FILE_REGEX.search(text)
+            if match:
+                self._switch(self._paths.get(os.path.normcase(os.path.abspath(match.group(1)))))
+        if self.current is None:
+            return
+        output = self.outputs[self.current]
+        output.tail.append(text)
+        output.lines += 1
+        record = parse_coverage_line(text, self.current)
+        if record is not None:
+            output.records.append(record)
+
+    def finish(self) -> None:
+        """
+        Closes the timing of the archive read last.
+        """
+        self._switch(None)
+
+
+async def read_stream(stream: asyncio.StreamReader, tail: deque, demux: OutputDemux) -> int:
+    """
+    Reads an output stream to its end, keeping its last lines in tail and passing every line to demux.
+
+    Returns:
+        int: The number of lines read.
+    """
+    lines = 0
+    while True:
+        try:
+            line = await stream.readline()
+        except ValueError:
+            # Longer than STREAM_LIMIT, the reader already discarded the buffered part
+            lines += 1
+            tail.append(f"[output line longer than {STREAM_LIMIT} bytes dropped]")
+            continue
+        if not line:
+            return lines
+        lines += 1
+        text = line.decode(OUTPUT_ENCODING, errors="replace").rstrip("\r\n")
+        tail.append(text)
+        demux.feed(text)
+
+
+class QuickBMSRunner:
+    """
+    Runs at most max_workers QuickBMS processes at a time on a background event loop.
+
+    Args:
+        quickbms (str): The QuickBMS executable.
+        max_workers (int): The number of archives processed concurrently.
+        timeout (float): Seconds after which an archive's QuickBMS process is killed, 0 for no limit.
+        tail_lines (int): The number of lines kept from the end of stdout and stderr.
+    """
+
+    def __init__(self, quickbms: str, max_workers: int, timeout: float = 0, tail_lines: int = OUTPUT_TAIL_LINES):
+        self.quickbms = quickbms
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout if timeout and timeout > 0 else None
+        self.tail_lines = max(1, tail_lines)
+        self._loop = None
+        self._thread = None
+        self._semaphore = None
+
+    def __enter__(self) -> "QuickBMSRunner":
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="quickbms-runner", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Kills the QuickBMS processes still running and stops the event loop.
+        """
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._cancel_all(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+
+    @staticmethod
+    async def _cancel_all() -> None:
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def map(self, jobs):
+        """
+        Starts QuickBMS for every job and yields the results in submission order.
+
+        Args:
+            jobs (iterable[tuple]): The arguments of run() for each job: the archive path, QuickBMS
+                arguments and output directory, and for an input folder the archives it holds.
+
+        Yields:
+            dict: The result of each archive, see run().
+        """
+        futures = [asyncio.run_coroutine_threadsafe(self.run(*job), self._loop) for job in jobs]
+        try:
+            for future in futures:
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    async def run(self, file_path: str, args: list, output_directory: str, archives: list = None) -> dict:
+        """
+        Runs QuickBMS on one archive, once one of the max_workers slots is free.
+
+        When archives is given the run reads several archives (file_path is then only a
+        label), its output is split over them and the timeout is per archive, so the
+        whole run gets the timeout times the number of archives.
+
+        Returns:
+            dict: The file path, output directory, command arguments, the last lines of
+            stdout/stderr, the return code, the error raised (a TimeoutError when the
+            process was killed), the coverage "records", the number of output "lines",
+            "timed_out", the ArchiveOutput of each archive as "outputs" and the "timing"
+            of the run (see extract_str_file_native).
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+
+        result = {
+            "file_path": file_path,
+            "output_directory": output_directory,
+            "args": args,
+            "stdout": "",
+            "stderr": "",
+            "returncode": None,
+            "error": None,
+            "records": [],
+            "lines": 0,
+            "timed_out": False,
+        }
+        stdout_tail = deque(maxlen=self.tail_lines)
+        stderr_tail = deque(maxlen=self.tail_lines)
+        demux = OutputDemux(archives or [file_path], self.tail_lines)
+        timeout = self.timeout * len(archives) if self.timeout and archives else self.timeout
+
+        async with self._semaphore:
+            # QuickBMS' own CPU time is only known for the whole stage, once it is reaped
+            timing = result["timing"] = {"start": time.time(), "seconds": 0.0, "pid": os.getpid(), "tid": threading.get_ident(), "args": {}}
+            wall_start = time.perf_counter()
+            process = None
+            try:
+                os.makedirs(output_directory, exist_ok=True)
+                process = await asyncio.create_subprocess_exec(
+                    self.quickbms, *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, limit=STREAM_LIMIT,
+                    start_new_session=PROCESS_GROUPS,
+                )
+                timing["args"]["spawn_seconds"] = round(time.perf_counter() - wall_start, 6)
+                lines = await asyncio.wait_for(asyncio.gather(
+                    read_stream(process.stdout, stdout_tail, demux),
+                    read_stream(process.stderr, stderr_tail, demux),
+                    process.wait(),
+                ), timeout)
+                result["lines"] = lines[0] + lines[1]
+            except asyncio.TimeoutError:
+                result["timed_out"] = True
+                result["error"] = TimeoutError(f"QuickBMS did not finish within {timeout:g} seconds and was killed.")
+            except Exception as e:
+                result["error"] = e
+            finally:
+                if process is not None and process.returncode is None:
+                    kill(process)
+                    await process.wait()
+            if process is not None:
+                result["returncode"] = process.returncode
+
+        demux.finish()
+        result["outputs"] = demux.outputs
+        result["records"] = [record for output in demux.outputs.values() for record in output.records]
+        result["stdout"] = "\n".join(stdout_tail)
+        result["stderr"] = "\n".join(stderr_tail)
+        timing["seconds"] = time.perf_counter() - wall_start
+        if TRACER.enabled and os.path.isfile(file_path) and os.path.isdir(output_directory):
+            files, size = await asyncio.get_running_loop().run_in_executor(None, measure_tree, output_directory)
+            timing["args"].update(bytes_read=os.path.getsize(file_path), bytes_written=size, files=files)
+        return result
@@ -0,0 +1,208 @@
+"""
+This module provides the 'batch' extraction engine: instead of one QuickBMS process per .str
+file, the archives are split into max_workers shards of about equal total size and each shard
+is extracted by a single QuickBMS run over StrDirectory as an input folder:
+
+    quickbms -F shard_00.txt -d -k simpsons_str.bms <StrDirectory> <staging>/shard_00
+
+-F reads the shard's archives from a filter list (one '{}/<relative path>' wildcard per line)
+and -d puts every archive's files below a '<name>.str' folder. Once a shard finishes, those
+folders are moved to the usual '<name>_str' output directories, so the layout is identical
+to the quickbms engine. The shard's output is split per archive at the 'open input file'
+lines (see async_runner.OutputDemux), so coverage stays attributed to the right archive.
+"""
+
+import heapq
+import os
+import shutil
+try:
+	from ....instrument import TRACER
+except ImportError:
+	from instrument import TRACER
+try:
+	from ....scan import SCANS
+except ImportError:
+	from scan import SCANS
+try:
+	from .async_runner import QuickBMSRunner, measure_tree
+except ImportError:
+	from async_runner import QuickBMSRunner, measure_tree
+
+
+def balance_shards(str_files: list, shards: int) -> list:
+    """
+    Splits archives into at most shards lists of about equal total size, largest first
+    onto the least loaded shard (LPT). Each shard keeps its archives sorted by path.
+    """
+    shards = max(1, min(shards, len(str_files)))
+    loads = [(0, index) for index in range(shards)]
+    assigned = [[] for _ in range(shards)]
+    for size, file_path in sorted(((SCANS.stat(file_path).st_size, file_path) for file_path in str_files), reverse=True):
+        load, index = heapq.heappop(loads)
+        assigned[index].append(file_path)
+        heapq.heappush(loads, (load + size, index))
+    return [sorted(shard) for shard in assigned if shard]
+
+
+def write_filter_list(path: str, archives: list, str_directory: str) -> None:
+    """
+    Writes the QuickBMS -F filter list selecting exactly the given archives of the input folder.
+
+    The leading '{}/' anchors each relative path at a directory boundary, so 'a.str' does not also select 'xa.str'.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        for file_path in archives:
+            f.write("{}/" + os.path.relpath(file_path, start=str_directory).replace(os.sep, "/") + "\n")
+
+
+def find_staged_directories(staging: str, archives: list, str_directory: str) -> dict:
+    """
+    Locates the '<name>.str' folder QuickBMS -d created for each archive below staging.
+
+    -d mirrors the archive's path below the input folder, possibly prefixed with the input
+    folder's own name, so folders are matched on the archive's relative path as a suffix.
+
+    Returns:
+        dict[str, str]: The staged folder of each archive that produced one.
+    """
+    candidates = []
+    for root, directories, _ in os.walk(staging):
+        for name in list(directories):
+            if name.lower().endswith(".str"):
+                directory = os.path.join(root, name)
+                candidates.append((os.path.normcase(os.path.relpath(directory, start=staging)).replace(os.sep, "/"), directory))
+                directories.remove(name)
+
+    staged = {}
+    for file_path in archives:
+        relative = os.path.normcase(os.path.relpath(file_path, start=str_directory)).replace(os.sep, "/")
+        matches = [directory for key, directory in candidates if key == relative or key.endswith("/" + relative)]
+        if matches:
+            staged[file_path] = min(matches, key=len)
+    return staged
+
+
+def merge_directory(source: str, destination: str, overwrite: bool) -> None:
+    """
+    Moves a staged folder to its output directory. Into an existing output directory files are
+    moved one by one, existing ones are kept unless overwrite is set (QuickBMS -k / -o).
+    """
+    if not os.path.isdir(destination):
+        os.makedirs(os.path.dirname(destination) or ".", exist_ok=True)
+        shutil.move(source, destination)
+        return
+    for root, _, files in os.walk(source):
+        target_root = os.path.join(destination, os.path.relpath(root, start=source))
+        os.makedirs(target_root, exist_ok=True)
+        for name in files:
+            target = os.path.join(target_root, name)
+            if overwrite or not os.path.exists(target):
+                os.replace(os.path.join(root, name), target)
+    shutil.rmtree(source, ignore_errors=True)
+
+
+class BatchRunner:
+    """
+    Extracts archives in size balanced shards, one QuickBMS run per shard, and yields a
+    result per archive with the same layout as QuickBMSRunner.run.
+
+    Args:
+        quickbms (str): The QuickBMS executable.
+        build_args (callable): Builds the QuickBMS arguments (script, overwrite and -f options)
+            for an input and output path, see QBMS_MAIN.build_quickbms_args.
+        str_directory (str): The input folder holding every archive.
+        staging (str): A scratch folder on the same volume as the output directories.
+        max_workers (int): The number of shards, which all run concurrently.
+        timeout (float): Seconds per archive after which a shard's QuickBMS process is killed, 0 for no limit.
+        tail_lines (int): The number of output lines kept per archive.
+        overwrite (bool): Replace existing files when merging into existing output directories.
+    """
+
+    def __init__(self, quickbms: str, build_args, str_directory: str, staging: str, max_workers: int,
+                 timeout: float = 0, tail_lines: int = 200, overwrite: bool = False):
+        self.build_args = build_args
+        self.str_directory = str_directory
+        self.staging = staging
+        self.max_workers = max_workers
+        self.overwrite = overwrite
+        self.runner = QuickBMSRunner(quickbms, max_workers, timeout, tail_lines)
+
+    def __enter__(self) -> "BatchRunner":
+        self.runner.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.runner.__exit__(exc_type, exc_value, traceback)
+        shutil.rmtree(self.staging, ignore_errors=True)
+
+    def map(self, jobs):
+        """
+        Runs every shard and yields the result of each archive, shard by shard.
+
+        Args:
+            jobs (list[tuple[str, str]]): The archive path and output directory of each archive.
+        """
+        output_directories = dict(jobs)
+        shards = balance_shards(list(output_directories), self.max_workers)
+
+        # Leftovers of an interrupted run would be merged into the next one
+        shutil.rmtree(self.staging, ignore_errors=True)
+        os.makedirs(self.staging)
+        shard_jobs = []
+        for index, archives in enumerate(shards):
+            label = f"shard {index + 1}/{len(shards)}"
+            filter_list = os.path.join(self.staging, f"shard_{index:02d}.txt")
+            write_filter_list(filter_list, archives, self.str_directory)
+            shard_staging = os.path.join(self.staging, f"shard_{index:02d}")
+            args = ["-F", filter_list, "-d"] + self.build_args(self.str_directory, shard_staging)
+            shard_jobs.append((label, args, shard_staging, archives))
+
+        for (label, args, shard_staging, archives), shard in zip(shard_jobs, self.runner.map(shard_jobs)):
+            yield from self._archive_results(shard, archives, output_directories)
+            shutil.rmtree(shard_staging, ignore_errors=True)
+
+    def _archive_results(self, shard: dict, archives: list, output_directories: dict):
+        """
+        Moves the staged output of a finished shard into place and yields one result per archive.
+
+        An archive counts as extracted when the shard succeeded, or when QuickBMS printed its
+        coverage summary and went on to the next archive before failing. The staged output of
+        any other archive is discarded, so it is retried next run.
+        """
+        staged = find_staged_directories(shard["output_directory"], archives, self.str_directory) if shard["error"] is None else {}
+        outputs = shard["outputs"]
+        opened = [file_path for file_path in archives if outputs[file_path].start is not None]
+        last_opened = max(opened, key=lambda file_path: outputs[file_path].start) if opened else None
+
+        for file_path in archives:
+            output = outputs[file_path]
+            output_directory = output_directories[file_path]
+            result = {
+                "file_path": file_path,
+                "output_directory": output_directory,
+                "args": shard["args"],
+                "stdout": "\n".join(output.tail),
+                "stderr": "",
+                "returncode": shard["returncode"],
+                "error": shard["error"],
+                "records": output.records,
+                "lines": output.lines,
+                "timed_out": shard["timed_out"],
+                "timing": dict(shard["timing"], start=output.start or shard["timing"]["start"], seconds=output.seconds, args={}),
+            }
+            if result["error"] is None:
+                if output.start is None and shard["returncode"] == 0:
+                    result["error"] = RuntimeError(f"QuickBMS never opened this archive in {shard['file_path']}, check the -F filter list.")
+                elif shard["returncode"] != 0 and output.records and file_path != last_opened:
+                    result["returncode"] = 0
+
+            if result["error"] is None and result["returncode"] == 0:
+                if file_path in staged:
+                    merge_directory(staged[file_path], output_directory, self.overwrite)
+                else:
+                    # The archive holds no (selected) entries, QuickBMS created nothing
+                    os.makedirs(output_directory, exist_ok=True)
+                if TRACER.enabled:
+                    files, size = measure_tree(output_directory)
+                    result["timing"]["args"].update(bytes_read=os.path.getsize(file_path), bytes_written=size, files=files)
+            yield result
@@ -0,0 +1,355 @@
+"""
+This module maintains a persistent SQLite catalog of every .str archive below StrDirectory:
+the SToc TOC blocks and the inner entries of each block (logical name, offset, size), so an
+asset can be located by name and extracted on its own, without extracting everything.
+
+Stored blocks are indexed by reading only their entry headers from the mapped archive, the
+payload pages are never touched. Entry names of RefPack compressed blocks are inside the
+compressed data, so those blocks have to be decoded once while indexing; the catalog records
+them so later lookups and filtered extractions (see filters.py) never decode them again.
+
+The catalog is updated incrementally: archives whose size and mtime are unchanged are kept,
+changed and new ones are re-indexed in parallel, and removed ones are dropped.
+
+    python -m Tools.process.QuickBMS.catalog build
+    python -m Tools.process.QuickBMS.catalog find "*/frontend/*.txd"
+    python -m Tools.process.QuickBMS.catalog extract build/PS3/pal_en/frontend/logo.txd logo.txd
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+try:
+	from ....printer import print, print_error, print_verbose, print_debug, colours
+except ImportError:
+	from printer import print, print_error, print_verbose, print_debug, colours
+try:
+	from ....scan import SCANS
+except ImportError:
+	from scan import SCANS
+try:
+	from ....conf import ExtractConfig
+except ImportError:
+	from conf import ExtractConfig
+try:
+	from .str_archive import StrArchive, StrArchiveError, StrEntry
+except ImportError:
+	from str_archive import StrArchive, StrArchiveError, StrEntry
+
+
+CATALOG_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS archives (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,      -- relative to StrDirectory, like the manifest keys
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    blocks INTEGER NOT NULL,
+    error TEXT                      -- set when the archive could not be parsed
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    archive_id INTEGER NOT NULL REFERENCES archives(id) ON DELETE CASCADE,
+    block INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    size INTEGER NOT NULL,          -- decoded size
+    stored_size INTEGER NOT NULL,
+    compressed INTEGER NOT NULL,
+    PRIMARY KEY (archive_id, block)
+);
+CREATE TABLE IF NOT EXISTS entries (
+    archive_id INTEGER NOT NULL REFERENCES archives(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,           -- log order inside the archive
+    name TEXT NOT NULL,             -- logical name, the path below the archive's '_str' directory
+    raw_name TEXT NOT NULL,
+    block INTEGER NOT NULL,
+    offset INTEGER NOT NULL,        -- offset inside the decoded block
+    size INTEGER NOT NULL,
+    PRIMARY KEY (archive_id, seq)
+);
+CREATE INDEX IF NOT EXISTS entries_name ON entries (name);
+"""
+
+
+def index_archive(file_path: str) -> dict:
+    """
+    Parses the TOC and entry headers of an archive.
+
+    Runs in a worker process. Compressed blocks are decoded to read their entry names.
+
+    Returns:
+        dict: "blocks", a list of (block, offset, size, stored_size, compressed) rows,
+        "entries", a list of (seq, name, raw_name, block, offset, size) rows, and "error".
+    """
+    result = {"blocks": [], "entries": [], "error": None}
+    try:
+        with StrArchive(file_path) as archive:
+            result["blocks"] = [(b.index, b.offset, b.size, b.stored_size, int(b.compressed)) for b in archive.blocks]
+            for seq, (name, entry) in enumerate(archive.index()):
+                result["entries"].append((seq, name.replace(os.sep, "/"), entry.name, entry.block, entry.offset, entry.size))
+    except (OSError, StrArchiveError) as e:
+        result["error"] = str(e)
+    return result
+
+
+class Catalog:
+    """
+    The SQLite catalog of archives, blocks and entries.
+
+    Usage:
+        with Catalog(path) as catalog:
+            catalog.update(str_directory)
+            for match in catalog.lookup("build/PS3/pal_en/frontend/logo.txd"):
+                ...
+    """
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.execute("PRAGMA journal_mode = WAL")
+
+        version = None
+        if self.connection.execute("SELECT name FROM sqlite_master WHERE name = 'meta'").fetchone():
+            row = self.connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            version = row["value"] if row else None
+        if version is not None and version != str(CATALOG_VERSION):
+            # Another layout: start over rather than migrating a cache
+            self.connection.executescript("DROP TABLE IF EXISTS entries; DROP TABLE IF EXISTS blocks; DROP TABLE IF EXISTS archives; DROP TABLE IF EXISTS meta;")
+        self.connection.executescript(SCHEMA)
+        self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (str(CATALOG_VERSION),))
+        self.connection.commit()
+
+    def __enter__(self) -> "Catalog":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def update(self, str_directory: str, max_workers: int = None, full: bool = False) -> dict:
+        """
+        Brings the catalog in line with the .str files below str_directory.
+
+        Args:
+            str_directory (str): The StrDirectory to index.
+            max_workers (int): Worker processes used to index changed archives.
+            full (bool): Re-index every archive, not only changed ones.
+
+        Returns:
+            dict: The number of "indexed", "unchanged" and "removed" archives.
+        """
+        current = {}
+        for root, _, files in SCANS.walk(str_directory):
+            for file in files:
+                if file.endswith(".str"):
+                    file_path = os.path.join(root, file)
+                    current[os.path.relpath(file_path, start=str_directory).replace(os.sep, "/")] = file_path
+
+        recorded = {row["path"]: row for row in self.connection.execute("SELECT id, path, size, mtime_ns FROM archives")}
+        removed = [key for key in recorded if key not in current]
+        changed = []
+        for key in sorted(current):
+            stat = SCANS.stat(current[key])
+            row = recorded.get(key)
+            if full or row is None or row["size"] != stat.st_size or row["mtime_ns"] != stat.st_mtime_ns:
+                changed.append((key, stat))
+
+        with self.connection:
+            for key in removed:
+                print_verbose(f"Removing '{key}' from the catalog")
+                self.connection.execute("DELETE FROM archives WHERE path = ?", (key,))
+
+        if changed:
+            print(colours.BLUE, f"Indexing {len(changed)} archive(s), {len(current) - len(changed)} unchanged.")
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                results = executor.map(index_archive, [current[key] for key, _ in changed])
+                # One transaction per archive, so an interrupted update keeps the finished ones
+                for (key, stat), result in zip(changed, results):
+                    with self.connection:
+                        self._store(key, stat, result)
+                    if result["error"]:
+                        print_error(f"Could not index '{key}': {result['error']}")
+                    else:
+                        print_verbose(f"Indexed '{key}': {len(result['blocks'])} blocks, {len(result['entries'])} entries")
+
+        return {"indexed": len(changed), "unchanged": len(current) - len(changed), "removed": len(removed)}
+
+    def _store(self, key: str, stat: os.stat_result, result: dict) -> None:
+        self.connection.execute("DELETE FROM archives WHERE path = ?", (key,))
+        archive_id = self.connection.execute(
+            "INSERT INTO archives (path, size, mtime_ns, blocks, error) VALUES (?, ?, ?, ?, ?)",
+            (key, stat.st_size, stat.st_mtime_ns, len(result["blocks"]), result["error"]),
+        ).lastrowid
+        self.connection.executemany(
+            "INSERT INTO blocks (archive_id, block, offset, size, stored_size, compressed) VALUES (?, ?, ?, ?, ?, ?)",
+            [(archive_id,) + row for row in result["blocks"]],
+        )
+        self.connection.executemany(
+            "INSERT INTO entries (archive_id, seq, name, raw_name, block, offset, size) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(archive_id,) + row for row in result["entries"]],
+        )
+
+    _ENTRY_QUERY = """
+        SELECT a.path AS archive, e.seq, e.name, e.raw_name, e.block, e.offset, e.size,
+               b.compressed, b.offset AS block_offset, b.stored_size
+        FROM entries e
+        JOIN archives a ON a.id = e.archive_id
+        JOIN blocks b ON b.archive_id = e.archive_id AND b.block = e.block
+    """
+
+    def lookup(self, name: str) -> list:
+        """
+        Returns every entry with this logical name (an indexed lookup), in archive and log order.
+        """
+        return [dict(row) for row in self.connection.execute(
+            self._ENTRY_QUERY + " WHERE e.name = ? ORDER BY a.path, e.seq", (name.replace("\\", "/"),))]
+
+    def search(self, pattern: str) -> list:
+        """
+        Returns the entries whose logical name matches a glob pattern (SQLite GLOB, case sensitive).
+        """
+        return [dict(row) for row in self.connection.execute(
+            self._ENTRY_QUERY + " WHERE e.name GLOB ? ORDER BY a.path, e.seq", (pattern.replace("\\", "/"),))]
+
+    def archive_entries(self, key: str) -> list:
+        """
+        Returns the entries of one archive in log order.
+        """
+        return [dict(row) for row in self.connection.execute(
+            self._ENTRY_QUERY + " WHERE a.path = ? ORDER BY e.seq", (key,))]
+
+    def is_current(self, key: str, file_path: str) -> bool:
+        """
+        Checks whether an archive is catalogued and unchanged since (same size and mtime).
+        """
+        row = self.connection.execute("SELECT size, mtime_ns, error FROM archives WHERE path = ?", (key,)).fetchone()
+        if row is None or row["error"]:
+            return False
+        stat = SCANS.stat(file_path)
+        return row["size"] == stat.st_size and row["mtime_ns"] == stat.st_mtime_ns
+
+    def unselected_blocks(self, key: str, select) -> dict:
+        """
+        Returns the blocks of an archive holding no entry accepted by select, mapped to their
+        entry counts, so extraction can skip them without decoding (StrArchive.extract skip_blocks).
+        """
+        counts = {}
+        selected = set()
+        for row in self.connection.execute(
+                "SELECT b.block, e.name FROM blocks b JOIN archives a ON a.id = b.archive_id "
+                "LEFT JOIN entries e ON e.archive_id = b.archive_id AND e.block = b.block WHERE a.path = ?", (key,)):
+            counts.setdefault(row["block"], 0)
+            if row["name"] is None:
+                continue
+            counts[row["block"]] += 1
+            if row["block"] not in selected and select(row["name"]):
+                selected.add(row["block"])
+        return {block: count for block, count in counts.items() if block not in selected}
+
+    def stats(self) -> dict:
+        row = self.connection.execute("""
+            SELECT (SELECT COUNT(*) FROM archives) AS archives,
+                   (SELECT COUNT(*) FROM archives WHERE error IS NOT NULL) AS failed,
+                   (SELECT COUNT(*) FROM blocks) AS blocks,
+                   (SELECT COUNT(*) FROM blocks WHERE compressed) AS compressed_blocks,
+                   (SELECT COUNT(*) FROM entries) AS entries,
+                   (SELECT COALESCE(SUM(size), 0) FROM entries) AS bytes
+        """).fetchone()
+        return dict(row)
+
+
+def extract_asset(str_directory: str, match: dict, destination: str) -> None:
+    """
+    Extracts one catalogued entry (a row returned by lookup or search) to a file.
+
+    Raises:
+        StrArchiveError: If the archive changed since it was catalogued.
+    """
+    file_path = os.path.join(str_directory, match["archive"])
+    with StrArchive(file_path) as archive:
+        if match["block"] >= len(archive.blocks) or archive.blocks[match["block"]].offset != match["block_offset"]:
+            raise StrArchiveError(f"'{match['archive']}' changed since it was catalogued, update the catalog first.")
+        archive.extract_entry(StrEntry(match["raw_name"], match["block"], match["offset"], match["size"]), destination)
+
+
+def load_paths(project_dir: str, module_dir: str) -> tuple:
+    """
+    Returns the StrDirectory and catalog path from project.json.
+    """
+    config = ExtractConfig.load(project_dir, module_dir)
+    return config.str_directory, config.catalog_path
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Catalog of the entries inside every .str archive")
+    parser.add_argument("--project", default=".", help="Directory containing project.json (default: current directory)")
+    parser.add_argument("--source", help="StrDirectory, overrides project.json")
+    parser.add_argument("--catalog", help="Catalog database path, overrides project.json")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Create or incrementally update the catalog")
+    build.add_argument("--jobs", type=int, help="Worker processes (default: one per CPU)")
+    build.add_argument("--full", action="store_true", help="Re-index every archive")
+    find = commands.add_parser("find", help="Look up entries by logical name or glob pattern")
+    find.add_argument("name", help="Logical name, e.g. build/PS3/pal_en/frontend/logo.txd, or a glob such as '*.txd'")
+    extract = commands.add_parser("extract", help="Extract a single entry")
+    extract.add_argument("name", help="Logical name of the entry")
+    extract.add_argument("destination", help="File to write, or an existing directory")
+    extract.add_argument("--archive", help="Archive to take the entry from when several contain it")
+    commands.add_parser("stats", help="Print catalog totals")
+    args = parser.parse_args(argv)
+
+    str_directory, catalog_path = args.source, args.catalog
+    if not str_directory or not catalog_path:
+        try:
+            config_source, config_catalog = load_paths(args.project, os.path.abspath(args.project))
+        except (OSError, ValueError, KeyError) as e:
+            print_error(f"Error loading project.json: {e}")
+            return 1
+        str_directory = str_directory or config_source
+        catalog_path = catalog_path or config_catalog
+
+    with Catalog(catalog_path) as catalog:
+        if args.command == "build":
+            counts = catalog.update(str_directory, args.jobs, args.full)
+            print(colours.GREEN, f"Catalog updated: {counts['indexed']} indexed, {counts['unchanged']} unchanged, {counts['removed']} removed.")
+        elif args.command == "stats":
+            for key, value in catalog.stats().items():
+                print(colours.CYAN, f"{key}: {value}")
+        elif args.command == "find":
+            is_glob = any(c in args.name for c in "*?[")
+            matches = catalog.search(args.name) if is_glob else catalog.lookup(args.name)
+            for match in matches:
+                print(colours.BLUE, f"{match['archive']}: {match['name']} (block {match['block']}{', compressed' if match['compressed'] else ''}, offset 0x{match['offset']:x}, {match['size']} bytes)")
+            print(colours.CYAN, f"{len(matches)} match(es).")
+            return 0 if matches else 1
+        else:
+            matches = [m for m in catalog.lookup(args.name) if not args.archive or m["archive"] == args.archive.replace("\\", "/")]
+            if not matches:
+                print_error(f"'{args.name}' is not in the catalog.")
+                return 1
+            if len(matches) > 1:
+                print(colours.YELLOW, f"'{args.name}' is in {len(matches)} archives, using '{matches[0]['archive']}' (see --archive).")
+            destination = args.destination
+            if os.path.isdir(destination):
+                destination = os.path.join(destination, os.path.basename(args.name))
+            try:
+                extract_asset(str_directory, matches[0], destination)
+            except (OSError, StrArchiveError) as e:
+                print_error(f"Error extracting '{args.name}': {e}")
+                return 1
+            print(colours.GREEN, f"Extracted '{args.name}' from '{matches[0]['archive']}' to {destination}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
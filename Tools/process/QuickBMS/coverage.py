@@ -0,0 +1,108 @@
+"""
+This module provides parsing of QuickBMS coverage output and the structured sink it is logged to.
+Records are collected per archive and written in bulk through one long-lived file handle,
+as JSON Lines by default or in the legacy 'Time = [...], Path = ...' text format.
+"""
+
+import json
+import re
+from datetime import datetime
+try:
+	from ....conf import COVERAGE_FORMATS
+except ImportError:
+	from conf import COVERAGE_FORMATS
+
+# Matches the coverage summary QuickBMS prints for every input file
+COVERAGE_REGEX = re.compile(
+    r'coverage file\s+(-?\d+)\s+(\d+)%\s+\d+\s+\d+\s+\.\s+offset\s+([0-9a-fA-F]+)'
+)
+
+# Matches the line QuickBMS prints when it starts reading an input file, e.g. from an input folder
+INPUT_FILE_REGEX = re.compile(r'open input file\s+(.+?)\s*$')
+
+
+def coverage_record(match: re.Match, archive_path: str, time: str = None) -> dict:
+    """
+    Builds a coverage record from a COVERAGE_REGEX match.
+    """
+    file_number, percentage, offset = match.groups()
+    return {
+        "time": time or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "path": archive_path,
+        "file": int(file_number),
+        "percentage": int(percentage),
+        "offset": int(offset, 16),
+    }
+
+
+def parse_coverage(output: str, archive_path: str) -> list:
+    """
+    Extracts the coverage records from the output of one QuickBMS run.
+
+    Args:
+        output (str): The combined stdout and stderr of QuickBMS.
+        archive_path (str): The .str file the output belongs to.
+
+    Returns:
+        list[dict]: Records with "time", "path", "file", "percentage" and "offset" keys.
+    """
+    time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return [coverage_record(match, archive_path, time) for match in COVERAGE_REGEX.finditer(output)]
+
+
+def parse_coverage_line(line: str, archive_path: str) -> dict:
+    """
+    Parses one line of QuickBMS output as it is streamed.
+
+    Returns:
+        dict: The coverage record, or None when the line holds no coverage summary.
+    """
+    if "coverage" not in line:
+        return None
+    match = COVERAGE_REGEX.search(line)
+    return coverage_record(match, archive_path) if match else None
+
+
+def format_record(record: dict, log_format: str) -> str:
+    """
+    Formats a coverage record as one log line, including the newline.
+    """
+    if log_format == "text":
+        return (f'Time = [{record["time"]}], Path = "{record["path"]}", File = "{record["file"]}", '
+                f'Percentage = "{record["percentage"]}%", Offset = "0x{record["offset"]:08x}"\n')
+    return json.dumps(record) + "\n"
+
+
+class CoverageSink:
+    """
+    An append-only coverage log kept open for a whole extraction run.
+
+    Usage:
+        with CoverageSink(log_file_path) as sink:
+            sink.write_records(parse_coverage(output, file_path))
+    """
+
+    def __init__(self, path: str, log_format: str = "jsonl"):
+        if log_format not in COVERAGE_FORMATS:
+            raise ValueError(f"Unknown coverage log format '{log_format}', expected one of {', '.join(COVERAGE_FORMATS)}.")
+        self.path = path
+        self.log_format = log_format
+        self._file = open(path, "a", encoding="utf-8")
+
+    def __enter__(self) -> "CoverageSink":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def write_records(self, records: list) -> None:
+        """
+        Writes the records of one archive in a single write and flushes them.
+        """
+        if not records:
+            return
+        self._file.write("".join(format_record(record, self.log_format) for record in records))
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
@@ -0,0 +1,188 @@
+"""
+This module computes coverage statistics from the QuickBMS coverage log in a single streaming pass.
+It reads JSON Lines records (see coverage.py) as well as the legacy text log, keeps constant
+memory per file number using online algorithms (Welford's mean/variance and a histogram
+of the integer percentages for the median), and can write a JSON report to diff between builds.
+
+    python Tools/process/QuickBMS/coverage_stats.py qbms.log --json coverage_report.json
+"""
+
+import argparse
+import json
+import math
+import re
+import sys
+
+# Matches the legacy 'File = "0", Percentage = "99%"' text log lines
+LEGACY_REGEX = re.compile(r'File\s*=\s*"(-?\d+)"\s*,\s*Percentage\s*=\s*"(\d+)%"')
+
+# Thresholds of the "values below" breakdown
+THRESHOLDS = (10, 20, 30, 40, 50, 60, 70, 80, 90, 100, 101)
+
+
+class IntegerHistogram:
+    """
+    Counts of integer values, for exact quantiles in memory bounded by the number of distinct values.
+
+    Coverage percentages are integers in a small range (0 - 100, occasionally above), so
+    this stays a few hundred entries at most however many records are streamed.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+
+    def add(self, value: int) -> None:
+        self.counts[value] = self.counts.get(value, 0) + 1
+        self.total += 1
+
+    def _value_at(self, rank: int) -> int:
+        seen = 0
+        for value in sorted(self.counts):
+            seen += self.counts[value]
+            if seen > rank:
+                return value
+        raise IndexError(rank)
+
+    def quantile(self, p: float) -> float:
+        """
+        Returns the p quantile, interpolating between the two middle values like a median does.
+        """
+        if not self.total:
+            return float("nan")
+        position = p * (self.total - 1)
+        lower = self._value_at(math.floor(position))
+        upper = self._value_at(math.ceil(position))
+        return lower + (upper - lower) * (position - math.floor(position))
+
+
+class RunningStats:
+    """
+    Count, mean, standard deviation (Welford), min, max, median and threshold counts.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.histogram = IntegerHistogram()
+        self.below = {threshold: 0 for threshold in THRESHOLDS}
+
+    def add(self, value: int) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+        self.histogram.add(value)
+        for threshold in THRESHOLDS:
+            if value < threshold:
+                self.below[threshold] += 1
+
+    def stddev(self) -> float:
+        # Population standard deviation, as eval_log.csx computed it
+        return math.sqrt(self.m2 / self.count) if self.count else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": round(self.mean, 4),
+            "median": round(self.histogram.quantile(0.5), 4),
+            "min": self.minimum,
+            "max": self.maximum,
+            "stddev": round(self.stddev(), 4),
+            "below": {str(threshold): count for threshold, count in self.below.items()},
+        }
+
+
+def iter_coverage(lines):
+    """
+    Yields (file_number, percentage) pairs from JSON Lines records or legacy text log lines.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("{"):
+            try:
+                record = json.loads(line)
+                yield int(record["file"]), int(record["percentage"])
+            except (ValueError, KeyError, TypeError):
+                continue
+        else:
+            match = LEGACY_REGEX.search(line)
+            if match:
+                yield int(match.group(1)), int(match.group(2))
+
+
+def compute_stats(lines) -> dict:
+    """
+    Computes per file number and combined statistics over a stream of log lines.
+
+    Returns:
+        dict: A report with "files", keyed by file number, and "all".
+    """
+    combined = RunningStats()
+    per_file = {}
+    for file_number, percentage in iter_coverage(lines):
+        combined.add(percentage)
+        stats = per_file.get(file_number)
+        if stats is None:
+            stats = per_file[file_number] = RunningStats()
+        stats.add(percentage)
+
+    return {
+        "files": {str(file_number): per_file[file_number].to_dict() for file_number in sorted(per_file)},
+        "all": combined.to_dict(),
+    }
+
+
+def print_stats(label: str, stats: dict) -> None:
+    print(label)
+    print(f"  Count:   {stats['count']}")
+    if not stats["count"]:
+        return
+    print(f"  Mean:    {stats['mean']:.2f}%")
+    print(f"  Median:  {stats['median']:.2f}%")
+    print(f"  Min:     {stats['min']}%")
+    print(f"  Max:     {stats['max']}%")
+    print(f"  Std Dev: {stats['stddev']:.2f}%")
+    print("  Values below thresholds:")
+    for threshold, count in stats["below"].items():
+        print(f"    Below {threshold}%: {count} entries ({count / stats['count'] * 100:.2f}%)")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Coverage statistics for the QuickBMS coverage log")
+    parser.add_argument("log", nargs="?", default="qbms.log", help="Coverage log, JSON Lines or legacy text (default: qbms.log)")
+    parser.add_argument("--json", dest="json_path", help="Write the report as JSON to this path ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.log, "r", encoding="utf-8") as f:
+            report = compute_stats(f)
+    except OSError as e:
+        print(f"Error: cannot read log file '{args.log}': {e}", file=sys.stderr)
+        return 1
+
+    if args.json_path == "-":
+        json.dump(report, sys.stdout, indent=4, sort_keys=True)
+        print()
+        return 0
+
+    for file_number, stats in report["files"].items():
+        print_stats(f"File {file_number}", stats)
+    print_stats("All Files", report["all"])
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4, sort_keys=True)
+        print(f"Report written to {args.json_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+This module provides the include/exclude filters for selective extraction.
+
+Archive filters match the archive path relative to StrDirectory (e.g. 'Assets_2_Frontend/frontend.str'),
+entry filters the logical entry name inside an archive (e.g. 'texture_dictionary/foo/t.txd' or
+'81DE1738_str/EU_EN/assets/localization/l.bin'). Both use '/' separators.
+
+Patterns are shell globs matched case-insensitively against the whole name, like QuickBMS -f
+wildcards ('*' also matches '/'), or regular expressions searched in the name when prefixed
+with 're:'. A name is selected when it matches any include pattern (or there are none) and
+no exclude pattern. Configured in project.json:
+
+    "Filters": {
+        "archive_include": [], "archive_exclude": ["Assets_1_Video_Movies/*"],
+        "entry_include": ["texture_dictionary/*", "re:^(81DE1738|CD99D1BE)_str/"],
+        "entry_exclude": []
+    }
+"""
+
+import fnmatch
+import json
+import re
+
+REGEX_PREFIX = "re:"
+FILTER_KEYS = ("archive_include", "archive_exclude", "entry_include", "entry_exclude")
+
+
+def compile_pattern(pattern: str) -> tuple:
+    """
+    Compiles a glob or 're:' pattern into (compiled regex, search), search being False for globs.
+    """
+    if pattern.startswith(REGEX_PREFIX):
+        return re.compile(pattern[len(REGEX_PREFIX):]), True
+    return re.compile(fnmatch.translate(pattern.replace("\\", "/")), re.IGNORECASE), False
+
+
+class NameFilter:
+    """
+    A set of include and exclude patterns. An empty filter selects everything.
+    """
+
+    def __init__(self, include: list = (), exclude: list = ()):
+        self.include = list(include)
+        self.exclude = list(exclude)
+        self._include = [compile_pattern(pattern) for pattern in self.include]
+        self._exclude = [compile_pattern(pattern) for pattern in self.exclude]
+
+    def __bool__(self) -> bool:
+        return bool(self.include or self.exclude)
+
+    @staticmethod
+    def _any(patterns: list, name: str) -> bool:
+        for regex, search in patterns:
+            if (regex.search(name) if search else regex.match(name)):
+                return True
+        return False
+
+    def matches(self, name: str) -> bool:
+        """
+        Checks whether a name is selected.
+        """
+        name = name.replace("\\", "/")
+        if self._include and not self._any(self._include, name):
+            return False
+        return not self._any(self._exclude, name)
+
+    def fingerprint(self) -> str:
+        """
+        Returns a stable description of the filter, for manifests and stage fingerprints.
+        """
+        return json.dumps({"include": self.include, "exclude": self.exclude}, sort_keys=True)
+
+    def quickbms_filter(self) -> str:
+        """
+        Returns the filter as a QuickBMS -f argument: comma separated wildcards, '!' marking exclusions.
+
+        Raises:
+            ValueError: If a pattern is a regular expression, QuickBMS only supports wildcards.
+        """
+        for pattern in self.include + self.exclude:
+            if pattern.startswith(REGEX_PREFIX):
+                raise ValueError(f"Entry filter '{pattern}' is a regular expression, the quickbms engine only supports wildcards.")
+        return ",".join(self.include + ["!" + pattern for pattern in self.exclude])
+
+
+def load_filters(config: dict) -> tuple:
+    """
+    Reads the Filters block of the Extract configuration.
+
+    Returns:
+        tuple[NameFilter, NameFilter]: The archive filter and the entry filter.
+
+    Raises:
+        ValueError: If the block is malformed or a regular expression does not compile.
+    """
+    filters = config.get("Filters") or {}
+    if not isinstance(filters, dict):
+        raise ValueError("Filters must be an object.")
+    unknown = sorted(set(filters) - set(FILTER_KEYS))
+    if unknown:
+        raise ValueError(f"Unknown Filters key(s) {', '.join(unknown)}, expected {', '.join(FILTER_KEYS)}.")
+    patterns = {}
+    for key in FILTER_KEYS:
+        value = filters.get(key) or []
+        if isinstance(value, str):
+            value = [value]
+        if not all(isinstance(pattern, str) for pattern in value):
+            raise ValueError(f"Filters.{key} must be a list of patterns.")
+        patterns[key] = value
+    try:
+        return (NameFilter(patterns["archive_include"], patterns["archive_exclude"]),
+                NameFilter(patterns["entry_include"], patterns["entry_exclude"]))
+    except re.error as e:
+        raise ValueError(f"Invalid filter regular expression: {e}") from None
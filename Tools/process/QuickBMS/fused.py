@@ -0,0 +1,144 @@
+"""
+This module implements fused extraction: the native engine writes every entry straight to its
+final flattened location, instead of materializing OutDirectory for flat.py to copy again.
+
+The flattened layout depends on the shape of the whole extracted tree (single-child chains are
+collapsed), so the entry names of every archive are listed first and the tree OutDirectory
+would have is built in memory. flat.plan_flatten plans that virtual tree with the same '++'
+collapsing and sanitization rules, and the archives are then extracted once into the plan.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+try:
+	from ....printer import print, print_error, print_verbose, print_debug, colours
+except ImportError:
+	from printer import print, print_error, print_verbose, print_debug, colours
+try:
+	from ....instrument import TRACER
+except ImportError:
+	from instrument import TRACER
+try:
+	from .str_archive import StrArchive
+	from .filters import load_filters
+except ImportError:
+	from str_archive import StrArchive
+	from filters import load_filters
+try:
+	from ..Flat import flat
+except ImportError:
+	from Tools.process.Flat import flat
+
+
+def list_archive_entries(file_path: str) -> list:
+    """
+    Returns the logical entry names of an archive, without writing anything.
+    """
+    with StrArchive(file_path) as archive:
+        return archive.entry_names()
+
+
+def extract_archive_to(file_path: str, destinations: dict) -> int:
+    """
+    Extracts the entries of an archive to their planned destination paths.
+    """
+    with StrArchive(file_path) as archive:
+        return archive.extract_to(destinations)
+
+
+def build_virtual_tree(root: str, archive_entries: dict) -> dict:
+    """
+    Builds the directory tree the two-stage extraction would leave in OutDirectory.
+
+    Args:
+        root (str): The absolute OutDirectory path.
+        archive_entries (dict): Maps each archive's '_str' output directory to its logical entry names.
+
+    Returns:
+        dict: Maps every virtual directory path to its (child_dirs, child_files) lists, the
+        shape flat.list_directory returns.
+    """
+    tree = {root: ([], [])}
+
+    def add_directory(path: str) -> None:
+        if path in tree:
+            return
+        parent = os.path.dirname(path)
+        add_directory(parent)
+        tree[parent][0].append(path)
+        tree[path] = ([], [])
+
+    for output_directory, names in archive_entries.items():
+        add_directory(output_directory)
+        for name in names:
+            file_path = os.path.join(output_directory, name)
+            add_directory(os.path.dirname(file_path))
+            tree[os.path.dirname(file_path)][1].append(file_path)
+    return tree
+
+
+def run(config, str_files: list, str_directory: str, out_directory: str, max_workers: int) -> None:
+    """
+    Extracts the given archives directly into the flattened FlatDirectory layout.
+
+    Args:
+        config (ExtractConfig): The Extract configuration.
+        str_files (list): The .str files to extract (already archive filtered), sorted.
+            Their entries are narrowed down by the Filters.entry_* patterns.
+        str_directory (str): The source directory the archives are relative to.
+        out_directory (str): The OutDirectory the two-stage extraction would write, it is not created.
+        max_workers (int): The number of worker processes.
+    """
+    flat_directory = config.flat_directory
+    root = os.path.abspath(out_directory)
+    destination = os.path.abspath(flat_directory)
+    sanitizer = flat.SanitizerEngine.from_config(config.raw)
+    _, entry_filter = load_filters(config.raw)
+
+    print(colours.CYAN, f"Fused extraction into '{destination}' (virtual source root '{root}').")
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        # Pass 1: list every archive's entries and plan the flattened tree
+        archive_directories = [
+            os.path.join(root, os.path.splitext(os.path.relpath(file_path, start=str_directory))[0] + "_str")
+            for file_path in str_files
+        ]
+        archive_entries = {}
+        with TRACER.span("fused.list", archives=len(str_files)):
+            for file_path, output_directory, names in zip(str_files, archive_directories, executor.map(list_archive_entries, str_files)):
+                if entry_filter:
+                    names = [name for name in names if entry_filter.matches(name)]
+                print_verbose(f"Listed {len(names)} entries in '{file_path}'")
+                archive_entries[output_directory] = names
+
+        with TRACER.span("fused.plan") as counters:
+            tree = build_virtual_tree(root, archive_entries)
+            plan = flat.plan_flatten(root, destination, list_children=tree.__getitem__, sanitizer=sanitizer)
+            planned = dict(plan["files"])
+            counters.update(directories=len(plan["directories"]), files=len(planned))
+        print(colours.CYAN, f"Planned {len(plan['directories'])} directories and {len(planned)} files.")
+
+        os.makedirs(destination, exist_ok=True)
+        for directory in plan["directories"]:
+            os.makedirs(directory, exist_ok=True)
+
+        # Pass 2: extract each archive once, straight to its planned destinations.
+        # Entries that lost a destination collision (see flat.dedupe_plan) are not in the plan and not written.
+        destinations = []
+        for output_directory in archive_directories:
+            archive_destinations = {}
+            for name in archive_entries[output_directory]:
+                source_path = os.path.join(output_directory, name)
+                if source_path in planned:
+                    archive_destinations[name] = planned[source_path]
+                else:
+                    print_verbose(f"Skipping '{source_path}', another entry flattens to the same destination.")
+            destinations.append(archive_destinations)
+        written = 0
+        with TRACER.span("fused.extract") as counters:
+            for file_path, count in zip(str_files, executor.map(extract_archive_to, str_files, destinations)):
+                print(colours.BLUE, f"Extracted {count} files from {os.path.basename(file_path)}")
+                written += count
+            counters["files"] = written
+
+    print(colours.GREEN, f"Fused extraction completed: {written} files written to '{destination}'.")
@@ -0,0 +1,135 @@
+"""
+This module provides the incremental extraction manifest used by QBMS_MAIN.
+It records a fingerprint of every extracted .str archive (size, mtime and optionally
+a SHA256 of its contents) together with the hash of the extraction script, so
+unchanged archives can be skipped without launching QuickBMS.
+"""
+
+import hashlib
+import json
+import os
+try:
+	from ....scan import SCANS
+except ImportError:
+	from scan import SCANS
+
+MANIFEST_VERSION = 1
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_sha256(file_path: str) -> str:
+    """
+    Calculates the SHA256 hash of a file, reading it in 1 MiB blocks.
+    """
+    sha256_hash = hashlib.sha256()
+    buffer = bytearray(HASH_BLOCK_SIZE)
+    view = memoryview(buffer)
+    with open(file_path, "rb", buffering=0) as f:
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            sha256_hash.update(view[:read])
+    return sha256_hash.hexdigest()
+
+
+def script_fingerprint(engine: str, bms_script: str) -> str:
+    """
+    Returns a fingerprint of everything besides the archive that shapes the extracted output.
+    """
+    script_hash = file_sha256(bms_script) if os.path.isfile(bms_script) else "missing"
+    return f"{engine}:{script_hash}"
+
+
+class ExtractionManifest:
+    """
+    The persistent record of which archives have been extracted, and from what.
+
+    Entries are keyed by the archive path relative to StrDirectory and store the
+    archive's size, mtime_ns, optional sha256 and the output directory it produced.
+    """
+
+    def __init__(self, path: str, script: str, use_hash: bool = False):
+        self.path = path
+        self.script = script
+        self.use_hash = use_hash
+        self.archives = {}
+        # Records made with a different script or engine, their output is stale (see take_outdated)
+        self.outdated = {}
+
+        if os.path.isfile(path):
+            try:
+                with open(path, "r") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+            # A different script or engine invalidates every recorded extraction
+            if data.get("version") == MANIFEST_VERSION:
+                if data.get("script") == script:
+                    self.archives = data.get("archives", {})
+                else:
+                    self.outdated = data.get("archives", {})
+
+    def take_outdated(self) -> dict:
+        """
+        Returns the records invalidated by a script or engine change, and forgets them.
+
+        Their output directories have to be removed by the caller: extraction skips files
+        that already exist, so they would otherwise never be refreshed.
+        """
+        outdated, self.outdated = self.outdated, {}
+        return outdated
+
+    def is_current(self, key: str, file_path: str, output_directory: str) -> bool:
+        """
+        Checks whether an archive was extracted before and has not changed since.
+
+        When hashing is enabled, an archive whose size or mtime changed but whose
+        contents hash is unchanged counts as current and has its record refreshed.
+        """
+        record = self.archives.get(key)
+        if record is None or not os.path.isdir(output_directory):
+            return False
+
+        stat = SCANS.stat(file_path)
+        if record["size"] == stat.st_size and record["mtime_ns"] == stat.st_mtime_ns:
+            return True
+        if self.use_hash and record.get("sha256") and record["size"] == stat.st_size:
+            if file_sha256(file_path) == record["sha256"]:
+                record["mtime_ns"] = stat.st_mtime_ns
+                return True
+        return False
+
+    def update(self, key: str, file_path: str, output_directory: str) -> None:
+        """
+        Records a successful extraction of an archive.
+        """
+        stat = SCANS.stat(file_path)
+        self.archives[key] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": file_sha256(file_path) if self.use_hash else None,
+            "output": output_directory,
+        }
+
+    def remove(self, key: str) -> None:
+        self.archives.pop(key, None)
+
+    def stale_keys(self, current_keys) -> list:
+        """
+        Returns the recorded archives that are no longer present in the source directory.
+        """
+        current_keys = set(current_keys)
+        return sorted(key for key in self.archives if key not in current_keys)
+
+    def save(self) -> None:
+        """
+        Writes the manifest, replacing the previous one atomically.
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"version": MANIFEST_VERSION, "script": self.script, "archives": self.archives}, f, indent=4, sort_keys=True)
+        os.replace(temp_path, self.path)
@@ -0,0 +1,286 @@
+"""
+This module provides a decompressor for EA RefPack streams, the 0x10fb signed blocks
+simpsons_str.bms extracts with 'comtype dk2' and 'clog'.
+Output is written into a caller supplied (or reused) buffer through memoryviews, so
+literals and back-references are copied without intermediate bytes objects.
+A greedy compressor producing streams the decompressor (and QuickBMS) accept is
+provided for synthetic test archives.
+"""
+
+REFPACK_SIGNATURE = 0x10FB
+
+# Encoder limits: the long command reaches 131072 bytes back and copies up to 1028 bytes
+MAX_DISTANCE = 131072
+MAX_LENGTH = 1028
+# Candidate positions remembered per 3 byte prefix, more finds longer matches but is slower
+HASH_CHAIN_DEPTH = 16
+
+
+class RefPackError(Exception):
+    """
+    Raised when a RefPack stream is malformed or does not fit its output buffer.
+    """
+
+
+def header_size(src) -> int:
+    """
+    Returns the size of the RefPack header at the start of src.
+
+    The first byte carries the flags: 0x80 selects 4 byte size fields instead of 3,
+    0x01 flags an additional compressed size field before the decoded size.
+    """
+    if len(src) < 2 or ((src[0] << 8) | src[1]) & 0x3EFF != REFPACK_SIGNATURE:
+        raise RefPackError("Missing RefPack 0x10fb signature.")
+    size_width = 4 if src[0] & 0x80 else 3
+    return 2 + size_width * (2 if src[0] & 0x01 else 1)
+
+
+def decoded_size(src) -> int:
+    """
+    Returns the decoded size stored in the RefPack header of src.
+    """
+    start = header_size(src)
+    size_width = 4 if src[0] & 0x80 else 3
+    return int.from_bytes(src[start - size_width:start], "big")
+
+
+def decompress_into(src, dst) -> int:
+    """
+    Decompresses a RefPack stream into a preallocated buffer.
+
+    Args:
+        src: The compressed stream (bytes, bytearray, mmap or memoryview), starting with the header.
+        dst: A writable buffer (bytearray or memoryview) at least as large as the decoded data.
+
+    Returns:
+        int: The number of bytes written to dst.
+    """
+    src = memoryview(src)
+    out = memoryview(dst)
+    out_size = len(out)
+    src_size = len(src)
+    pos = header_size(src)
+    o = 0
+
+    try:
+        while pos < src_size:
+            b0 = src[pos]
+            if b0 < 0x80:
+                b1 = src[pos + 1]
+                pos += 2
+                literal = b0 & 0x03
+                length = ((b0 & 0x1C) >> 2) + 3
+                distance = ((b0 & 0x60) << 3) + b1 + 1
+            elif b0 < 0xC0:
+                b1 = src[pos + 1]
+                b2 = src[pos + 2]
+                pos += 3
+                literal = b1 >> 6
+                length = (b0 & 0x3F) + 4
+                distance = ((b1 & 0x3F) << 8) + b2 + 1
+            elif b0 < 0xE0:
+                b1 = src[pos + 1]
+                b2 = src[pos + 2]
+                b3 = src[pos + 3]
+                pos += 4
+                literal = b0 & 0x03
+                length = ((b0 & 0x0C) << 6) + b3 + 5
+                distance = ((b0 & 0x10) << 12) + (b1 << 8) + b2 + 1
+            else:
+                # Literal run (0xE0 - 0xFB) or end of stream (0xFC - 0xFF)
+                pos += 1
+                literal = ((b0 & 0x1F) << 2) + 4 if b0 < 0xFC else b0 & 0x03
+                if literal:
+                    if o + literal > out_size or pos + literal > src_size:
+                        raise RefPackError("Literal run overflows the stream or output buffer.")
+                    out[o:o + literal] = src[pos:pos + literal]
+                    o += literal
+                    pos += literal
+                if b0 >= 0xFC:
+                    break
+                continue
+
+            if literal:
+                if o + literal > out_size or pos + literal > src_size:
+                    raise RefPackError("Literal run overflows the stream or output buffer.")
+                out[o:o + literal] = src[pos:pos + literal]
+                o += literal
+                pos += literal
+
+            start = o - distance
+            if start < 0:
+                raise RefPackError("Back-reference points before the start of the output.")
+            if o + length > out_size:
+                raise RefPackError("Back-reference overflows the output buffer.")
+
+            if distance >= length:
+                out[o:o + length] = out[start:start + length]
+            else:
+                # Overlapping copy: out[start:o] repeats with period 'distance', so the
+                # already expanded region can be copied in chunks that double each step.
+                copied = 0
+                while copied < length:
+                    chunk = min(length - copied, o + copied - start)
+                    out[o + copied:o + copied + chunk] = out[start:start + chunk]
+                    copied += chunk
+            o += length
+    except IndexError:
+        raise RefPackError("Truncated RefPack stream.") from None
+
+    return o
+
+
+class RefPackDecoder:
+    """
+    Decompresses RefPack streams into a single reused output buffer.
+
+    The memoryview returned by decode is only valid until the next call.
+    """
+
+    def __init__(self, initial_size: int = 0):
+        self._buffer = bytearray(initial_size)
+
+    def decode(self, src, size: int) -> memoryview:
+        """
+        Decompresses src, whose decoded size is size (the TOC SIZE field), into the reused buffer.
+        """
+        if len(self._buffer) < size:
+            self._buffer = bytearray(size)
+        written = decompress_into(src, memoryview(self._buffer)[:size])
+        return memoryview(self._buffer)[:written]
+
+
+def decompress(src, size: int = None) -> bytes:
+    """
+    Decompresses a RefPack stream into a new bytes object.
+
+    Args:
+        src: The compressed stream, starting with the header.
+        size (int): The decoded size, read from the stream header when omitted.
+    """
+    if size is None:
+        size = decoded_size(src)
+    dst = bytearray(size)
+    written = decompress_into(src, dst)
+    return bytes(memoryview(dst)[:written])
+
+
+def _encodable(length: int, distance: int) -> bool:
+    """
+    Checks whether a back-reference fits one of the three copy commands.
+    """
+    if length == 3:
+        return distance <= 1024
+    if length == 4:
+        return distance <= 16384
+    return distance <= MAX_DISTANCE
+
+
+def _emit_literals(out: bytearray, literals) -> bytes:
+    """
+    Emits literal runs (multiples of 4 bytes, at most 112) and returns the 0 - 3 bytes left over.
+    """
+    pos = 0
+    while len(literals) - pos >= 4:
+        count = min(112, (len(literals) - pos) // 4 * 4)
+        out.append(0xE0 + (count - 4) // 4)
+        out += literals[pos:pos + count]
+        pos += count
+    return literals[pos:]
+
+
+def _emit_copy(out: bytearray, literals: bytes, length: int, distance: int) -> None:
+    """
+    Emits the shortest copy command for a back-reference, carrying up to 3 preceding literals.
+    """
+    count = len(literals)
+    d = distance - 1
+    if length <= 10 and distance <= 1024:
+        out += bytes(((((d >> 8) << 5) | ((length - 3) << 2) | count), d & 0xFF))
+    elif length <= 67 and distance <= 16384:
+        out += bytes((0x80 | (length - 4), (count << 6) | (d >> 8), d & 0xFF))
+    else:
+        out += bytes((0xC0 | ((d >> 16) << 4) | (((length - 5) >> 8) << 2) | count,
+                      (d >> 8) & 0xFF,
+                      d & 0xFF,
+                      (length - 5) & 0xFF))
+    out += literals
+
+
+def compress(data, chain_depth: int = HASH_CHAIN_DEPTH) -> bytes:
+    """
+    Compresses data into a RefPack stream using greedy matching over hash chains of 3 byte prefixes.
+
+    The stream decodes to data with decompress; it is not byte-identical to EA's encoder.
+
+    Args:
+        data: The bytes to compress.
+        chain_depth (int): The number of earlier positions tried per prefix.
+
+    Returns:
+        bytes: The stream, with a 3 byte size header (4 bytes from 16 MiB on).
+    """
+    data = bytes(data)
+    size = len(data)
+    if size < 1 << 24:
+        out = bytearray((0x10, 0xFB)) + size.to_bytes(3, "big")
+    else:
+        out = bytearray((0x90, 0xFB)) + size.to_bytes(4, "big")
+
+    chains = {}
+    literal_start = 0
+    i = 0
+    while i + 3 <= size:
+        key = data[i:i + 3]
+        chain = chains.get(key)
+        best_length = 0
+        best_distance = 0
+        if chain:
+            limit = min(MAX_LENGTH, size - i)
+            for candidate in reversed(chain):
+                distance = i - candidate
+                if distance > MAX_DISTANCE:
+                    break
+                # Only candidates that beat the best match so far are worth extending
+                if best_length and (best_length >= limit or data[candidate + best_length] != data[i + best_length]):
+                    continue
+                length = 3
+                while length < limit:
+                    step = min(32, limit - length)
+                    if data[candidate + length:candidate + length + step] == data[i + length:i + length + step]:
+                        length += step
+                        continue
+                    while data[candidate + length] == data[i + length]:
+                        length += 1
+                    break
+                if length > best_length and _encodable(length, distance):
+                    best_length = length
+                    best_distance = distance
+                    if length == limit:
+                        break
+        else:
+            chain = chains[key] = []
+
+        if not best_length:
+            chain.append(i)
+            if len(chain) > chain_depth:
+                del chain[0]
+            i += 1
+            continue
+
+        leftover = _emit_literals(out, data[literal_start:i])
+        _emit_copy(out, leftover, best_length, best_distance)
+
+        # Index the copied positions too, so later data can refer into them
+        for position in range(i, min(i + best_length, size - 2)):
+            position_chain = chains.setdefault(data[position:position + 3], [])
+            position_chain.append(position)
+            if len(position_chain) > chain_depth:
+                del position_chain[0]
+        i += best_length
+        literal_start = i
+
+    leftover = _emit_literals(out, data[literal_start:])
+    out.append(0xFC + len(leftover))
+    out += leftover
+    return bytes(out)
@@ -0,0 +1,412 @@
+"""
+This module rebuilds SToc (.str) archives from their extracted '_str' directories, an in-process
+replacement for QuickBMS reimport (quickbms.exe -G -w -r, see Tools/quickbms/exe/reimport*.bat)
+without its Windows requirement and in-place size limits.
+
+The original archive is the template: its header, TOC fields and inner entry headers are kept,
+only the payloads change. Every entry whose logical name (see str_archive.output_name) has a file
+in the '_str' directory gets that file's contents and its header SIZE is patched, entries without
+a file keep their payload. Like QuickBMS -k extraction, only the first entry of a duplicated name
+is taken from the directory. Blocks whose payloads are all unchanged are copied as stored, so an
+unmodified directory repacks to a byte-identical archive. Changed blocks are rebuilt, padded to
+the 0x800 block alignment and, if they were RefPack compressed, recompressed on a process pool,
+block by block.
+
+Repacked archives are written below RepackDirectory, mirroring StrDirectory. A manifest records
+the inputs each archive was repacked from, so only archives whose template or '_str' directory
+changed are rebuilt.
+
+    python -m Tools.process.QuickBMS.repack
+    python -m Tools.process.QuickBMS.repack --jobs 8 Map_3-02_BartmanBegins/c.str
+"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+try:
+	from ....printer import print, print_error, print_verbose, print_debug, colours
+except ImportError:
+	from printer import print, print_error, print_verbose, print_debug, colours
+try:
+	from ....conf import ExtractConfig
+except ImportError:
+	from conf import ExtractConfig
+try:
+	from ....scheduler import fingerprint_paths
+except ImportError:
+	from scheduler import fingerprint_paths
+try:
+	from ....scan import SCANS
+except ImportError:
+	from scan import SCANS
+try:
+	from .refpack import compress
+	from .str_archive import BLOCK_ALIGNMENT, ENTRY_PREFIX_SIZE, TOC_ENTRY_SIZE, StrArchive, StrArchiveError, align, output_name, parse_entries
+	from .QBMS_MAIN import get_output_directory
+except ImportError:
+	from refpack import compress
+	from str_archive import BLOCK_ALIGNMENT, ENTRY_PREFIX_SIZE, TOC_ENTRY_SIZE, StrArchive, StrArchiveError, align, output_name, parse_entries
+	from QBMS_MAIN import get_output_directory
+
+
+REPACK_MANIFEST_VERSION = 1
+# Recompression jobs per worker that may be queued before the oldest archive is written
+PENDING_BLOCKS_PER_WORKER = 2
+
+
+def size_field_offset(data, start: int) -> int:
+    """
+    Returns the offset of the SIZE long in the header of the named entry starting at start.
+
+    Walks the header like parse_entries: a name, 0x10 dummy bytes, two more names, the dummy field and ZERO.
+    """
+    pos = start + ENTRY_PREFIX_SIZE
+    pos += 4 + struct.unpack_from(">I", data, pos)[0] + 0x10
+    for _ in range(2):
+        pos += 4 + struct.unpack_from(">I", data, pos)[0]
+    pos += 4 + struct.unpack_from(">I", data, pos)[0] + 4
+    return pos
+
+
+def rebuild_block(data, entries: list, replacements: dict) -> bytes:
+    """
+    Rebuilds the decoded contents of a block with some entry payloads replaced.
+
+    Entry headers are copied and their SIZE patched; payloads are padded to 4 bytes, except a
+    last entry the original did not pad and a header-less entry, whose size is the rest of the block.
+
+    Args:
+        data (bytes | memoryview): The decoded block.
+        entries (list[StrEntry]): The entries of the block, see parse_entries.
+        replacements (dict[int, bytes]): The new payload of entries, by position in entries.
+
+    Returns:
+        bytes: The decoded contents of the rebuilt block.
+    """
+    out = bytearray()
+    start = 0
+    for position, entry in enumerate(entries):
+        # The next entry starts after the payload rounded up to 4 bytes
+        padded_end = entry.offset + align(entry.size, 4)
+        end = min(padded_end, len(data))
+        payload = replacements.get(position)
+        if payload is None:
+            out += data[start:end]
+        else:
+            header = bytearray(data[start:entry.offset])
+            headerless = struct.unpack_from(">I", data, start + 12)[0] == 0
+            if not headerless:
+                struct.pack_into(">I", header, size_field_offset(data, start) - start, len(payload))
+            out += header
+            out += payload
+            if not headerless and (position < len(entries) - 1 or end == padded_end):
+                out += b"\x00" * (-len(payload) % 4)
+        start = end
+    return bytes(out)
+
+
+def plan_archive(template_path: str, source_directory: str, executor: ProcessPoolExecutor) -> dict:
+    """
+    Matches the entries of a template archive against the files of its '_str' directory and
+    rebuilds the changed blocks, submitting the recompression of compressed ones to executor.
+
+    Returns:
+        dict: "header" (everything before the first block), "info_offset", "toc" (the original
+        TOC fields), "blocks" (the stored data, decoded size and stored size of each block; rebuilt
+        blocks have no stored size yet, compressed ones a Future of compress as their data),
+        "tail" (data after the last block), "entries", "replaced", "changed" and "recompressed"
+        counts, and "unused", the files of the directory that are not in the archive.
+    """
+    replaced = 0
+    used = set()
+    blocks = []
+    changed = recompressed = 0
+    logged = 0
+    with StrArchive(template_path) as archive, open(template_path, "rb") as f:
+        first_offset = archive.blocks[0].offset if archive.blocks else os.fstat(f.fileno()).st_size
+        header = bytearray(f.read(first_offset))
+        info_offset = struct.unpack_from(">I", header, 16)[0]
+        if info_offset + len(archive.blocks) * TOC_ENTRY_SIZE > len(header):
+            raise StrArchiveError(f"The TOC of '{template_path}' is not in front of its blocks, it cannot be rebuilt.")
+        toc = [struct.unpack_from(">QIIII", header, info_offset + i * TOC_ENTRY_SIZE) for i in range(len(archive.blocks))]
+
+        for block in archive.blocks:
+            data = archive.read_block(block)
+            try:
+                entries = parse_entries(block.index, data)
+                replacements = {}
+                for position, entry in enumerate(entries):
+                    name = output_name(entry.name, logged)
+                    logged += 1
+                    if name in used:
+                        continue
+                    used.add(name)
+                    file_path = os.path.join(source_directory, name)
+                    if not os.path.isfile(file_path):
+                        continue
+                    with open(file_path, "rb") as source:
+                        payload = source.read()
+                    if data[entry.offset:entry.offset + entry.size] != payload:
+                        replacements[position] = payload
+                if replacements:
+                    new_data = rebuild_block(data, entries, replacements)
+            finally:
+                data.release()
+
+            if not replacements:
+                # Unchanged blocks keep their stored bytes, padding included
+                f.seek(block.offset)
+                blocks.append((f.read(block.stored_size), block.size, block.stored_size))
+                continue
+            replaced += len(replacements)
+            changed += 1
+            if block.compressed:
+                blocks.append((executor.submit(compress, new_data), len(new_data), None))
+                recompressed += 1
+            else:
+                blocks.append((new_data, len(new_data), None))
+
+        end = archive.blocks[-1].offset + archive.blocks[-1].stored_size if archive.blocks else first_offset
+        f.seek(end)
+        tail = f.read()
+
+    unused = []
+    for root, _, files in os.walk(source_directory):
+        for file in files:
+            name = os.path.relpath(os.path.join(root, file), start=source_directory)
+            if name not in used:
+                unused.append(name)
+
+    return {
+        "header": header,
+        "info_offset": info_offset,
+        "toc": toc,
+        "blocks": blocks,
+        "tail": tail,
+        "entries": logged,
+        "replaced": replaced,
+        "changed": changed,
+        "recompressed": recompressed,
+        "unused": sorted(unused),
+    }
+
+
+def write_archive(destination: str, plan: dict) -> int:
+    """
+    Writes a planned archive, waiting for the recompression of its blocks, and patches its TOC.
+
+    The file is written next to destination and moved into place once complete.
+
+    Returns:
+        int: The size of the written archive.
+    """
+    header = plan["header"]
+    stored_blocks = []
+    for index, (stored, size, stored_size) in enumerate(plan["blocks"]):
+        if isinstance(stored, Future):
+            stored = stored.result()
+        if stored_size is None:
+            stored_size = align(len(stored), BLOCK_ALIGNMENT)
+        dummy, old_size, ignore_size, _, dummy2 = plan["toc"][index]
+        # IGNORE_SIZE follows SIZE where the template had them equal
+        if ignore_size == old_size:
+            ignore_size = size
+        struct.pack_into(">QIIII", header, plan["info_offset"] + index * TOC_ENTRY_SIZE, dummy, size, ignore_size, stored_size, dummy2)
+        stored_blocks.append((stored, stored_size))
+
+    os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+    temp_path = destination + ".tmp"
+    written = 0
+    with open(temp_path, "wb") as f:
+        f.write(header)
+        written += len(header)
+        for stored, stored_size in stored_blocks:
+            f.write(stored)
+            f.write(b"\x00" * (stored_size - len(stored)))
+            written += stored_size
+        f.write(plan["tail"])
+        written += len(plan["tail"])
+    os.replace(temp_path, destination)
+    return written
+
+
+class RepackManifest:
+    """
+    The persistent record of the inputs every archive was last repacked from.
+
+    Entries are keyed by the archive path relative to StrDirectory and hold the fingerprint of
+    the template archive and its '_str' directory, and the size and mtime of the repacked archive.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.archives = {}
+        if os.path.isfile(path):
+            try:
+                with open(path, "r") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+            if data.get("version") == REPACK_MANIFEST_VERSION:
+                self.archives = data.get("archives", {})
+
+    def is_current(self, key: str, inputs: str, destination: str) -> bool:
+        """
+        Checks whether an archive was repacked from these inputs and its output is still in place.
+        """
+        record = self.archives.get(key)
+        if record is None or record["inputs"] != inputs or not os.path.isfile(destination):
+            return False
+        stat = os.stat(destination)
+        return record["size"] == stat.st_size and record["mtime_ns"] == stat.st_mtime_ns
+
+    def update(self, key: str, inputs: str, destination: str) -> None:
+        """
+        Records a successful repack of an archive.
+        """
+        stat = os.stat(destination)
+        self.archives[key] = {"inputs": inputs, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "output": destination}
+
+    def save(self) -> None:
+        """
+        Writes the manifest, replacing the previous one atomically.
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"version": REPACK_MANIFEST_VERSION, "archives": self.archives}, f, indent=4, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+
+def find_archives(config: ExtractConfig, selected: list = None) -> list:
+    """
+    Lists the archives to repack as (key, template, '_str' directory, destination) tuples.
+
+    Args:
+        config (ExtractConfig): The Extract configuration.
+        selected (list[str]): Archive paths relative to StrDirectory, every archive when empty.
+    """
+    str_directory = config.str_directory
+    if selected:
+        str_files = [os.path.join(str_directory, path) for path in selected]
+    else:
+        str_files = []
+        for root, _, files in os.walk(str_directory):
+            for file in files:
+                if file.endswith(".str"):
+                    str_files.append(os.path.join(root, file))
+    archives = []
+    for file_path in sorted(str_files):
+        key = os.path.relpath(file_path, start=str_directory)
+        destination = os.path.join(config.repack_directory, key)
+        archives.append((key, file_path, get_output_directory(file_path, str_directory, config.out_directory), destination))
+    return archives
+
+
+def repack(config: ExtractConfig, selected: list = None, max_workers: int = None, full: bool = False) -> dict:
+    """
+    Rebuilds the archives whose template or '_str' directory changed since they were last repacked.
+
+    Archives are planned one after another while their blocks are recompressed in the background;
+    an archive is written once its blocks are done, oldest first.
+
+    Args:
+        config (ExtractConfig): The Extract configuration.
+        selected (list[str]): Archive paths relative to StrDirectory, every archive when empty.
+        max_workers (int): Worker processes recompressing blocks, Settings.max_workers when not given.
+        full (bool): Repack every archive, not only changed ones.
+
+    Returns:
+        dict: The number of "repacked", "unchanged", "skipped" and "failed" archives.
+    """
+    max_workers = max_workers or config.max_workers
+    manifest = RepackManifest(config.repack_manifest_path)
+    counts = {"repacked": 0, "unchanged": 0, "skipped": 0, "failed": 0}
+
+    jobs = []
+    for key, template, source, destination in find_archives(config, selected):
+        if os.path.normcase(os.path.abspath(template)) == os.path.normcase(os.path.abspath(destination)):
+            print_error(f"RepackDirectory would overwrite '{template}', it has to differ from StrDirectory.")
+            counts["failed"] += 1
+            continue
+        if not os.path.isfile(template) or not os.path.isdir(source):
+            print(colours.YELLOW, f"Skipping '{key}': {'archive' if not os.path.isfile(template) else 'extracted directory ' + source} not found.")
+            counts["skipped"] += 1
+            continue
+        # fingerprint_paths reads through the shared scan cache, an earlier repack() in this process may have filled it
+        SCANS.invalidate(template)
+        SCANS.invalidate(source)
+        inputs = fingerprint_paths([template, source])
+        if not full and manifest.is_current(key, inputs, destination):
+            print_verbose(f"Skipping unchanged archive '{key}'")
+            counts["unchanged"] += 1
+            continue
+        jobs.append((key, template, source, destination, inputs))
+
+    print(colours.BLUE, f"{len(jobs)} archive(s) to repack, {counts['unchanged']} unchanged.")
+
+    def finish(key: str, destination: str, inputs: str, plan: dict) -> None:
+        try:
+            size = write_archive(destination, plan)
+        except (OSError, StrArchiveError) as e:
+            print_error(f"Error repacking '{key}': {e}")
+            counts["failed"] += 1
+            return
+        manifest.update(key, inputs, destination)
+        counts["repacked"] += 1
+        print(colours.GREEN, f"Repacked '{key}': {plan['replaced']} of {plan['entries']} entries replaced, {plan['changed']} of {len(plan['blocks'])} blocks rebuilt ({plan['recompressed']} recompressed), {size} bytes -> {destination}")
+        if plan["unused"]:
+            print(colours.YELLOW, f"  {len(plan['unused'])} file(s) in the extracted directory are not in the archive and were not added.")
+            for name in plan["unused"]:
+                print_verbose(f"  Not in the archive: {name}")
+
+    # The manifest is saved even if the run is interrupted, so finished archives stay recorded
+    pending = deque()
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for key, template, source, destination, inputs in jobs:
+                try:
+                    plan = plan_archive(template, source, executor)
+                except (OSError, StrArchiveError) as e:
+                    print_error(f"Error reading '{key}': {e}")
+                    counts["failed"] += 1
+                    continue
+                pending.append((key, destination, inputs, plan))
+                while len(pending) > 1 and sum(queued["recompressed"] for *_, queued in pending) > max_workers * PENDING_BLOCKS_PER_WORKER:
+                    finish(*pending.popleft())
+            while pending:
+                finish(*pending.popleft())
+    finally:
+        manifest.save()
+        SCANS.invalidate(config.repack_directory)
+    return counts
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Rebuild .str archives from their extracted '_str' directories")
+    parser.add_argument("archives", nargs="*", help="Archives to repack, relative to StrDirectory (default: every archive)")
+    parser.add_argument("--project", default=".", help="Directory containing project.json (default: current directory)")
+    parser.add_argument("--jobs", type=int, help="Worker processes recompressing blocks (default: Settings.max_workers)")
+    parser.add_argument("--full", action="store_true", help="Repack every archive, not only changed ones")
+    args = parser.parse_args(argv)
+
+    try:
+        config = ExtractConfig.load(args.project, Path(__file__).resolve().parents[3])
+    except (OSError, ValueError) as e:
+        print_error(f"Error loading project.json: {e}")
+        return 1
+
+    counts = repack(config, args.archives, args.jobs, args.full)
+    print(colours.GREEN, f"Repack finished: {counts['repacked']} repacked, {counts['unchanged']} unchanged, {counts['skipped']} skipped, {counts['failed']} failed.")
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,437 @@
+"""
+This module provides a native reader for the Simpsons Game SToc (.str) archive format.
+It implements the same layout as Tools/quickbms/simpsons_str.bms, so archives can be
+extracted in-process instead of by spawning quickbms.exe for every file.
+The archive is memory-mapped: uncompressed entries are copied from the file to their
+destination without being read into memory, so the resident size of an extraction is
+bounded by the largest compressed block rather than by the archive size.
+"""
+
+import errno
+import mmap
+import os
+import re
+import struct
+from typing import Callable, Iterator, NamedTuple
+try:
+    from .refpack import REFPACK_SIGNATURE, RefPackDecoder, RefPackError
+except ImportError:
+    from refpack import REFPACK_SIGNATURE, RefPackDecoder, RefPackError
+
+# --- Format Constants ---
+STR_MAGIC = b"SToc"
+BLOCK_ALIGNMENT = 0x800
+# "SToc" followed by the twelve header longs (DUMMY1 .. DUMMY12)
+STR_HEADER_SIZE = 4 + 12 * 4
+# DUMMY longlong, SIZE, IGNORE_SIZE, XSIZE, DUMMY
+TOC_ENTRY_SIZE = 8 + 4 + 4 + 4 + 4
+# DUMMY1, DUMMY2, DUMMY3, HEADER_SIZE of every inner entry
+ENTRY_PREFIX_SIZE = 0x10
+
+# Chunk size for copying uncompressed entries when the OS has no file-to-file copy
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Characters QuickBMS will not put in an output file name
+INVALID_NAME_CHARS = re.compile(r'[<>:"|?*\x00-\x1f]')
+
+
+class StrArchiveError(Exception):
+    """
+    Raised when an archive does not follow the SToc layout.
+    """
+
+
+class StrBlock(NamedTuple):
+    """
+    A TOC entry: one (optionally RefPack compressed) block of inner entries.
+    """
+    index: int
+    offset: int          # absolute offset of the block data in the archive (BASE_OFF)
+    size: int            # decoded size of the block (SIZE)
+    stored_size: int     # bytes the block occupies in the archive (XSIZE)
+    compressed: bool     # block data starts with the 0x10fb signature
+
+
+class StrEntry(NamedTuple):
+    """
+    A named inner entry inside a decoded block.
+    """
+    name: str            # raw entry name, empty for header-less trailing data
+    block: int           # index of the owning block
+    offset: int          # offset of the payload inside the decoded block
+    size: int            # payload size in bytes
+
+
+def align(value: int, alignment: int) -> int:
+    """
+    Rounds value up to the next multiple of alignment (BMS 'math VAR x ALIGN').
+    """
+    return (value + alignment - 1) // alignment * alignment
+
+
+def parse_entries(block_index: int, data: bytes) -> list:
+    """
+    Parses the inner entries of a decoded block, following the inner loop of simpsons_str.bms.
+
+    Args:
+        block_index (int): The index of the block the data belongs to.
+        data (bytes | memoryview): The decoded block (MEMORY_FILE).
+
+    Returns:
+        list[StrEntry]: The entries in the order QuickBMS would log them.
+    """
+    entries = []
+    mem_size = len(data)
+    offset = 0
+
+    def read_long(pos: int) -> int:
+        if pos + 4 > mem_size:
+            raise StrArchiveError(f"Entry header at 0x{offset:x} in block {block_index} runs past the end of the block.")
+        return struct.unpack_from(">I", data, pos)[0]
+
+    def read_string(pos: int, length: int) -> str:
+        if pos + length > mem_size:
+            raise StrArchiveError(f"Entry name at 0x{pos:x} in block {block_index} runs past the end of the block.")
+        # getdstring keeps everything up to the first NUL
+        return bytes(data[pos:pos + length]).split(b"\x00", 1)[0].decode("latin-1")
+
+    while offset < mem_size:
+        header_size = read_long(offset + 12)
+        if header_size == 0:
+            payload_offset = offset + ENTRY_PREFIX_SIZE
+            size = mem_size - payload_offset
+            name = ""
+        else:
+            pos = offset + ENTRY_PREFIX_SIZE
+            name_size = read_long(pos)
+            pos += 4 + name_size + 0x10
+            # The third name is the one QuickBMS ends up logging
+            for _ in range(2):
+                name_size = read_long(pos)
+                name = read_string(pos + 4, name_size)
+                pos += 4 + name_size
+            dummy_size = read_long(pos)
+            pos += 4 + dummy_size + 4  # dummy data and the ZERO long
+            size = read_long(pos)
+            payload_offset = offset + ENTRY_PREFIX_SIZE + header_size
+
+        if payload_offset + size > mem_size:
+            raise StrArchiveError(f"Entry '{name}' in block {block_index} runs past the end of the block.")
+
+        entries.append(StrEntry(name, block_index, payload_offset, size))
+        offset = payload_offset + align(size, 4)
+
+    return entries
+
+
+def output_name(name: str, index: int) -> str:
+    """
+    Converts an entry name into the relative output path QuickBMS would write.
+
+    Unnamed entries get QuickBMS' '%08x.dat' fallback name based on the number of
+    files already logged from the archive.
+    """
+    if not name:
+        return f"{index:08x}.dat"
+    parts = []
+    for part in name.replace("\\", "/").split("/"):
+        if part in ("", ".", ".."):
+            continue
+        parts.append(INVALID_NAME_CHARS.sub("_", part))
+    return os.path.join(*parts) if parts else f"{index:08x}.dat"
+
+
+def copy_file_range_to(src_fd: int, dst_fd: int, offset: int, size: int) -> bool:
+    """
+    Copies size bytes at offset of src_fd to the current position of dst_fd inside the kernel.
+
+    Uses os.copy_file_range or os.sendfile where the platform provides them.
+
+    Returns:
+        bool: False if neither is supported for these files, so the caller has to copy itself.
+    """
+    for copy in (getattr(os, "copy_file_range", None), getattr(os, "sendfile", None)):
+        if copy is None or size == 0:
+            continue
+        done = 0
+        try:
+            while done < size:
+                if copy is os.sendfile:
+                    sent = copy(dst_fd, src_fd, offset + done, size - done)
+                else:
+                    sent = copy(src_fd, dst_fd, size - done, offset + done)
+                if sent == 0:
+                    break
+                done += sent
+        except OSError as e:
+            if done == 0 and e.errno in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF, errno.ENOTSOCK):
+                continue
+            raise
+        if done == size:
+            return True
+        raise StrArchiveError(f"Unexpected end of file copying {size} bytes at 0x{offset:x}.")
+    return size == 0
+
+
+class StrArchive:
+    """
+    An open SToc archive.
+
+    Usage:
+        with StrArchive(path) as archive:
+            archive.extract(output_directory)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._decoder = RefPackDecoder()
+        # Total payload bytes written by extract() and extract_to()
+        self.bytes_written = 0
+        self._file = open(path, "rb")
+        self._map = None
+        try:
+            if os.fstat(self._file.fileno()).st_size < STR_HEADER_SIZE:
+                raise StrArchiveError(f"'{self.path}' is too small to be a SToc archive.")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._map)
+            self.blocks = self._read_toc()
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self) -> "StrArchive":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._view.release()
+            try:
+                self._map.close()
+            except BufferError:
+                # A caller still holds a view of a block, the map is closed once it is released
+                pass
+            self._map = None
+        self._file.close()
+
+    def _read_at(self, offset: int, size: int) -> memoryview:
+        if offset + size > len(self._map):
+            raise StrArchiveError(f"Unexpected end of file reading {size} bytes at 0x{offset:x} in '{self.path}'.")
+        return self._view[offset:offset + size]
+
+    def _release(self, offset: int, size: int) -> None:
+        """
+        Drops mapped pages of an already copied range from the resident set, where supported.
+        """
+        if hasattr(self._map, "madvise") and hasattr(mmap, "MADV_DONTNEED"):
+            start = offset - offset % mmap.PAGESIZE
+            self._map.madvise(mmap.MADV_DONTNEED, start, offset + size - start)
+
+    def _write_stored(self, f, offset: int, size: int) -> None:
+        """
+        Writes size bytes at offset of the archive to the open file f, without reading them into memory.
+        """
+        f.flush()
+        if copy_file_range_to(self._file.fileno(), f.fileno(), offset, size):
+            return
+        for chunk_offset in range(offset, offset + size, COPY_CHUNK_SIZE):
+            chunk_size = min(COPY_CHUNK_SIZE, offset + size - chunk_offset)
+            f.write(self._view[chunk_offset:chunk_offset + chunk_size])
+            self._release(chunk_offset, chunk_size)
+
+    def _read_toc(self) -> list:
+        header = self._read_at(0, STR_HEADER_SIZE)
+        if header[:4] != STR_MAGIC:
+            raise StrArchiveError(f"'{self.path}' is not a SToc archive.")
+
+        fields = struct.unpack_from(">12I", header, 4)
+        info_offset = fields[3]
+        file_count = (fields[1] >> 24) & 0xFF
+
+        base_offset = align(STR_HEADER_SIZE + file_count * TOC_ENTRY_SIZE, BLOCK_ALIGNMENT)
+        toc = self._read_at(info_offset, file_count * TOC_ENTRY_SIZE)
+
+        blocks = []
+        for i in range(file_count):
+            _, size, _, stored_size, _ = struct.unpack_from(">QIIII", toc, i * TOC_ENTRY_SIZE)
+            sign = struct.unpack(">H", self._read_at(base_offset, 2))[0]
+            blocks.append(StrBlock(i, base_offset, size, stored_size, sign == REFPACK_SIGNATURE))
+            base_offset += stored_size
+        return blocks
+
+    def read_stored(self, block: StrBlock) -> memoryview:
+        """
+        Returns a view of the data of a block as stored in the archive, compressed or not.
+        """
+        return self._read_at(block.offset, block.stored_size if block.compressed else block.size)
+
+    def read_block(self, block: StrBlock) -> memoryview:
+        """
+        Returns the decoded data of a block (the BMS MEMORY_FILE).
+
+        Uncompressed blocks are a view of the mapped archive. Compressed blocks are
+        decoded into a buffer shared by the whole archive, so the returned view is
+        only valid until the next call.
+
+        Raises:
+            StrArchiveError: If a compressed block does not decode.
+        """
+        if block.compressed:
+            try:
+                return self._decoder.decode(self.read_stored(block), block.size)
+            except RefPackError as e:
+                raise StrArchiveError(f"Block {block.index} at 0x{block.offset:x} does not decode: {e}") from e
+        return self.read_stored(block)
+
+    def _iter_block_entries(self, skip_blocks: dict = None) -> Iterator[tuple]:
+        """
+        Yields (block, decoded block data, entry, logical name) for every inner entry, in log order.
+
+        Blocks in skip_blocks, which maps block indices to their entry counts (known from the
+        catalog), are neither read nor decoded; the counts keep unnamed entries' names right.
+        """
+        logged = 0
+        for block in self.blocks:
+            if skip_blocks and block.index in skip_blocks:
+                logged += skip_blocks[block.index]
+                continue
+            data = self.read_block(block)
+            try:
+                for entry in parse_entries(block.index, data):
+                    yield block, data, entry, output_name(entry.name, logged)
+                    logged += 1
+            finally:
+                data.release()
+
+    def iter_entries(self) -> Iterator[tuple]:
+        """
+        Yields (logical_name, size, payload) for every inner entry without writing anything to disk.
+
+        logical_name is the path the entry is extracted to below the archive's '_str' directory.
+        payload is a memoryview: entries of uncompressed blocks are views of the mapped archive
+        and are only read from disk when accessed. Compressed blocks have to be decoded to find
+        their entry names, so they are decoded once when the first of their entries is reached,
+        into a shared buffer; copy the payload if it is needed after advancing the iterator.
+        """
+        for _, data, entry, name in self._iter_block_entries():
+            payload = data[entry.offset:entry.offset + entry.size]
+            try:
+                yield name, entry.size, payload
+            finally:
+                payload.release()
+
+    def _write_entry(self, block: StrBlock, data: memoryview, entry: StrEntry, destination: str) -> None:
+        # A bare file name (catalog extract ... logo.txd) goes to the working directory
+        directory = os.path.dirname(destination)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # The destination may be a hardlink into OutDirectory or a dedup blob left by an
+        # earlier flatten, so it is replaced rather than written through
+        try:
+            os.remove(destination)
+        except FileNotFoundError:
+            pass
+        with open(destination, "wb") as f:
+            if block.compressed:
+                f.write(data[entry.offset:entry.offset + entry.size])
+            else:
+                self._write_stored(f, block.offset + entry.offset, entry.size)
+        self.bytes_written += entry.size
+
+    def entry_names(self) -> list:
+        """
+        Returns the logical names of the entries that extract() would write, in order and without duplicates.
+        """
+        names = {}
+        for _, _, _, name in self._iter_block_entries():
+            names.setdefault(name, None)
+        return list(names)
+
+    def index(self) -> list:
+        """
+        Returns (logical_name, StrEntry) for every inner entry in log order, without reading payloads.
+
+        Compressed blocks still have to be decoded, their entry headers are inside the compressed data.
+        """
+        return [(name, entry) for _, _, entry, name in self._iter_block_entries()]
+
+    def extract(self, output_directory: str, overwrite: bool = False, select: Callable[[str], bool] = None, skip_blocks: dict = None) -> int:
+        """
+        Extracts every inner entry below output_directory.
+
+        Args:
+            output_directory (str): The directory to write the entries to.
+            overwrite (bool): Overwrite existing files instead of skipping them (QuickBMS -o vs -k).
+            select (callable): Only entries whose logical name it accepts are written.
+            skip_blocks (dict): Blocks without selected entries, mapped to their entry counts,
+                which are skipped without being decoded (see Catalog.unselected_blocks).
+
+        Returns:
+            int: The number of files written.
+        """
+        written = 0
+        for block, data, entry, name in self._iter_block_entries(skip_blocks):
+            if select is not None and not select(name):
+                continue
+            destination = os.path.join(output_directory, name)
+            if not overwrite and os.path.exists(destination):
+                continue
+            self._write_entry(block, data, entry, destination)
+            written += 1
+        return written
+
+    def extract_entry(self, entry: StrEntry, destination: str) -> None:
+        """
+        Extracts a single entry, e.g. one located through the catalog, to destination.
+
+        Only the entry's own block is read, and decoded if it is compressed.
+        """
+        block = self.blocks[entry.block]
+        data = self.read_block(block)
+        try:
+            if entry.offset + entry.size > len(data):
+                raise StrArchiveError(f"Entry at 0x{entry.offset:x} in block {entry.block} runs past the end of the block.")
+            self._write_entry(block, data, entry, destination)
+        finally:
+            data.release()
+
+    def extract_to(self, destinations: dict) -> int:
+        """
+        Extracts entries to explicit destination paths, e.g. their final flattened location.
+
+        Entries whose logical name is not in destinations are skipped. Like QuickBMS -k, only
+        the first entry with a given logical name is written.
+
+        Args:
+            destinations (dict): Maps logical names (see iter_entries) to destination file paths.
+
+        Returns:
+            int: The number of files written.
+        """
+        written = 0
+        done = set()
+        for block, data, entry, name in self._iter_block_entries():
+            destination = destinations.get(name)
+            if destination is None or name in done:
+                continue
+            done.add(name)
+            self._write_entry(block, data, entry, destination)
+            written += 1
+        return written
+
+
+def iter_entries(str_path: str) -> Iterator[tuple]:
+    """
+    Streams the entries of a .str archive as (logical_name, size, payload) tuples.
+
+    See StrArchive.iter_entries for the lifetime of the payload views.
+
+    Usage:
+        for name, size, payload in iter_entries(path):
+            if name.endswith(".txd"):
+                convert_texture(name, bytes(payload))
+    """
+    with StrArchive(str_path) as archive:
+        yield from archive.iter_entries()
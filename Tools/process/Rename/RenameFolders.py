@@ -1,18 +1,29 @@
 import os
-import json
 try:
 	from ....printer import print, print_error, print_verbose, print_debug, colours
 except ImportError:
 	from printer import print, print_error, print_verbose, print_debug, colours
+try:
+	from ....scan import SCANS
+except ImportError:
+	from scan import SCANS
+try:
+	from ....conf import ExtractConfig
+except ImportError:
+	from conf import ExtractConfig
 
-def main(project_dir, module_dir) -> None:
+def main(project_dir, module_dir, config: ExtractConfig = None) -> None:
 
-    # Load configuration from JSON file
-    with open(os.path.join(project_dir, 'project.json'), 'r') as f:
-        config = json.load(f)
+    # Load configuration from JSON file, unless the caller already did
+    if config is None:
+        try:
+            config = ExtractConfig.load(project_dir, module_dir)
+        except (OSError, ValueError) as e:
+            print_error(f"Error loading project.json: {e}")
+            exit(1)
 
     # Directory where the files are located
-    strdirectory = config['Extract']['Directories']['StrDirectory']
+    strdirectory = config.str_directory
 
     print(colours.YELLOW, f"Processing directory: {strdirectory}")
 
@@ -47,27 +58,31 @@ def main(project_dir, module_dir) -> None:
     renamed_items = 0
     skipped_items = 0
 
-    # Get all directories in the directory
-    for item in os.listdir(strdirectory):
-        item_path = os.path.join(strdirectory, item)
-        if os.path.isdir(item_path):
-            total_items += 1
-            #print(f"Processing item: {item}")
+    # Get all directories in the directory, from the listing the stage fingerprint already made
+    child_dirs, _ = SCANS.children(strdirectory)
+    for item_path in child_dirs:
+        item = os.path.basename(item_path)
+        total_items += 1
+        #print(f"Processing item: {item}")
+
+        # Check if the old name exists in the mapping
+        if item in rename_map:
+            new_name = rename_map[item]
+            new_path = os.path.join(strdirectory, new_name)
+            print(colours.GRAY, f"Old path: {item_path}")
+            print(colours.GRAY, f"New path: {new_path}")
 
-            # Check if the old name exists in the mapping
-            if item in rename_map:
-                new_name = rename_map[item]
-                new_path = os.path.join(strdirectory, new_name)
-                print(colours.GRAY, f"Old path: {item_path}")
-                print(colours.GRAY, f"New path: {new_path}")
+            # Perform the renaming
+            os.rename(item_path, new_path)
+            print(colours.GREEN, f"Renamed '{item}' to '{new_name}'")
+            renamed_items += 1
+        else:
+            print(colours.CYAN, f"Skipped '{item}' - no matching key in rename map")
+            skipped_items += 1
 
-                # Perform the renaming
-                os.rename(item_path, new_path)
-                print(colours.GREEN, f"Renamed '{item}' to '{new_name}'")
-                renamed_items += 1
-            else:
-                print(colours.CYAN, f"Skipped '{item}' - no matching key in rename map")
-                skipped_items += 1
+    # The renamed folders change every path below StrDirectory
+    if renamed_items:
+        SCANS.invalidate(strdirectory)
 
     # Log summary
     print(colours.GREEN, f"Processing complete. Total items: {total_items}, Renamed: {renamed_items}, Skipped: {skipped_items}")
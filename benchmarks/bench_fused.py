@@ -0,0 +1,128 @@
+"""
+Checks that fused extraction produces the same FlatDirectory as the two-stage extract + flatten
+pipeline on a synthetic dump, and times both. The dump gets an extra archive whose entries
+'a/b/f.txd' and 'a++b/f.txd' flatten to the same destination, so collision handling is covered:
+
+    python benchmarks/bench_fused.py
+    python benchmarks/bench_fused.py --archives 32 --compressed-ratio 1.0 --keep
+
+Exits with 1 when the trees differ, the mismatches are listed as by Tools/process/Flat/compare.py.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import printer
+from conf import ExtractConfig
+from scan import SCANS
+from synthetic import build_archive, entry_record, generate_dump
+from Tools.process.QuickBMS import QBMS_MAIN
+from Tools.process.Flat import flat
+from Tools.process.Flat.compare import compare_trees
+
+MODULE_DIR = Path(__file__).resolve().parent.parent
+
+
+def write_project(project_dir: str, source: str, fused: bool, max_workers: int) -> ExtractConfig:
+    """
+    Writes a native engine project.json extracting source below project_dir and loads it.
+    """
+    os.makedirs(project_dir, exist_ok=True)
+    extract = {
+        "Directories": {
+            "StrDirectory": source,
+            "OutDirectory": os.path.join(project_dir, "out"),
+            "FlatDirectory": os.path.join(project_dir, "flat"),
+            "LogFilePath": os.path.join(project_dir, "coverage.log"),
+            "ManifestPath": os.path.join(project_dir, "manifest.json"),
+            "CatalogPath": os.path.join(project_dir, "catalog.sqlite"),
+            "DedupStore": os.path.join(project_dir, "dedup_store"),
+            "RepackDirectory": os.path.join(project_dir, "repacked"),
+            "RepackManifestPath": os.path.join(project_dir, "repack_manifest.json"),
+        },
+        "Scripts": {
+            "BmsScriptPath": str(MODULE_DIR / "Tools" / "quickbms" / "simpsons_str.bms"),
+            "QuickBMSEXEPath": str(MODULE_DIR / "Tools" / "quickbms" / "exe" / "quickbms.exe"),
+        },
+        "Settings": {"max_workers": max_workers, "engine": "native", "flat_verify": "none", "fused": fused},
+    }
+    with open(os.path.join(project_dir, "project.json"), "w") as f:
+        json.dump({"Extract": extract}, f, indent=4)
+    return ExtractConfig.load(Path(project_dir), MODULE_DIR)
+
+
+def run_two_stage(config: ExtractConfig) -> None:
+    QBMS_MAIN.main(config.project_dir, config.module_dir, force=True, config=config)
+    flat.main(config.project_dir, config.module_dir, config=config)
+
+
+def run_fused(config: ExtractConfig) -> None:
+    QBMS_MAIN.main(config.project_dir, config.module_dir, force=True, config=config)
+
+
+def timed(run, config: ExtractConfig) -> float:
+    SCANS.clear()
+    start = time.perf_counter()
+    run(config)
+    return time.perf_counter() - start
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Fused extraction against extract + flatten on synthetic data")
+    parser.add_argument("--archives", type=int, default=8, help="Synthetic archives to generate")
+    parser.add_argument("--entries", type=int, default=32, help="Entries per block")
+    parser.add_argument("--compressed-ratio", type=float, default=0.5, help="Share of RefPack compressed blocks")
+    parser.add_argument("-j", "--jobs", type=int, default=0, help="Worker processes, 0 means one per CPU")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary directory and print its path")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench_fused_")
+    try:
+        source = os.path.join(root, "src")
+        stats = generate_dump(source, archives=args.archives, blocks_per_archive=4, entries_per_block=args.entries, compressed_ratio=args.compressed_ratio)
+        # Two entries flattening to one destination, the later one wins in both pipelines
+        collision = entry_record("a/b/f.txd", b"first") + entry_record("a++b/f.txd", b"second")
+        build_archive(os.path.join(source, "collision", "collision.str"), [(collision, False)])
+        two_stage = write_project(os.path.join(root, "two_stage"), source, False, args.jobs)
+        fused = write_project(os.path.join(root, "fused"), source, True, args.jobs)
+
+        printer.set_quiet(True)
+        try:
+            two_stage_seconds = timed(run_two_stage, two_stage)
+            fused_seconds = timed(run_fused, fused)
+        finally:
+            printer.set_quiet(False)
+
+        megabytes = stats["bytes"] / (1024 * 1024)
+        for name, seconds in (("two-stage", two_stage_seconds), ("fused", fused_seconds)):
+            print(f"{name:<10} {seconds * 1000:10.2f} ms {stats['files'] / seconds:12.0f} files/s {megabytes / seconds:10.2f} MB/s")
+
+        result = compare_trees(two_stage.flat_directory, fused.flat_directory)
+        mismatches = 0
+        for key, paths in result.items():
+            for path in paths:
+                print(f"{key}: {path}")
+            mismatches += len(paths)
+        if mismatches:
+            print(f"Fused output differs from the two-stage output: {mismatches} mismatch(es).")
+            return 1
+        print(f"Fused output is identical to the two-stage output ({stats['files']} files).")
+        return 0
+    finally:
+        if args.keep:
+            print(f"Kept {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
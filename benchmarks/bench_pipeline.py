@@ -0,0 +1,182 @@
+"""
+Throughput benchmarks for extraction, flattening and sanitization on synthetic data.
+
+The suites follow the asv layout (setup/teardown plus time_* methods, params), so they can be
+collected by asv, and the bundled runner reports files/s and MB/s without it:
+
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --suite Flatten --json bench.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import generate_chain_tree, generate_dump
+from Tools.process.QuickBMS.str_archive import StrArchive
+from Tools.process.Flat import flat
+
+
+class ExtractSuite:
+    """
+    Native extraction of a synthetic StrDirectory, stored or RefPack compressed blocks.
+    """
+    params = [0.0, 1.0]
+    param_names = ["compressed_ratio"]
+
+    def setup(self, compressed_ratio):
+        self.root = tempfile.mkdtemp(prefix="bench_extract_")
+        self.source = os.path.join(self.root, "src")
+        stats = generate_dump(self.source, archives=8, blocks_per_archive=4, entries_per_block=32, compressed_ratio=compressed_ratio)
+        self.files = stats["files"]
+        self.bytes = stats["bytes"]
+        self.archives = sorted(
+            os.path.join(directory, name)
+            for directory, _, names in os.walk(self.source)
+            for name in names if name.endswith(".str")
+        )
+
+    def teardown(self, compressed_ratio):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def time_extract(self, compressed_ratio):
+        output = os.path.join(self.root, "out")
+        for index, path in enumerate(self.archives):
+            with StrArchive(path) as archive:
+                archive.extract(os.path.join(output, f"{index:03d}_str"), overwrite=True)
+
+
+class FlattenSuite:
+    """
+    Planning and executing the flattening of deep single-child directory chains.
+    """
+    params = ["copy", "hardlink"]
+    param_names = ["mode"]
+
+    def setup(self, mode):
+        self.root = tempfile.mkdtemp(prefix="bench_flatten_")
+        self.source = os.path.join(self.root, "out")
+        stats = generate_chain_tree(self.source, chains=64, depth=8, files_per_leaf=8)
+        self.files = stats["files"]
+        self.bytes = stats["bytes"]
+        self.destination = os.path.join(self.root, "flat")
+        self.sanitizer = flat.SanitizerEngine(flat.SANITIZATION_RULES)
+
+    def teardown(self, mode):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def time_plan(self, mode):
+        with contextlib.redirect_stdout(io.StringIO()):
+            flat.plan_flatten(self.source, self.destination, sanitizer=self.sanitizer)
+
+    def time_flatten(self, mode):
+        shutil.rmtree(self.destination, ignore_errors=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            plan = flat.plan_flatten(self.source, self.destination, sanitizer=self.sanitizer)
+            flat.execute_plan(plan, self.destination, mode, "none", max_workers=os.cpu_count() or 1)
+
+
+class SanitizeSuite:
+    """
+    Sanitizing flattened '++' names with the built-in rules, cold and with a warm cache.
+    """
+
+    def setup(self):
+        self.root = tempfile.mkdtemp(prefix="bench_sanitize_")
+        generate_chain_tree(self.root, chains=256, depth=8, files_per_leaf=0)
+        self.names = []
+        for directory, _, _ in os.walk(self.root):
+            relative = os.path.relpath(directory, self.root)
+            if relative != ".":
+                self.names.append(relative.replace(os.sep, "++"))
+        self.files = len(self.names)
+        self.bytes = sum(len(name) for name in self.names)
+        self.warm = flat.SanitizerEngine(flat.SANITIZATION_RULES)
+        for name in self.names:
+            self.warm.sanitize(name)
+
+    def teardown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def time_sanitize_cold(self):
+        engine = flat.SanitizerEngine(flat.SANITIZATION_RULES)
+        for name in self.names:
+            engine.sanitize(name)
+
+    def time_sanitize_cached(self):
+        for name in self.names:
+            self.warm.sanitize(name)
+
+
+SUITES = (ExtractSuite, FlattenSuite, SanitizeSuite)
+
+
+def run_suite(suite_class, min_time: float, repeat: int) -> list:
+    """
+    Runs every time_* method of a suite for each parameter and returns the best timings.
+    """
+    results = []
+    params = getattr(suite_class, "params", None)
+    for param in (params if params is not None else [None]):
+        args = () if params is None else (param,)
+        suite = suite_class()
+        suite.setup(*args)
+        try:
+            for method_name in sorted(name for name in dir(suite) if name.startswith("time_")):
+                method = getattr(suite, method_name)
+                method(*args)  # warm-up, also fills caches the first run would pay for
+                best = float("inf")
+                for _ in range(repeat):
+                    runs = 0
+                    start = time.perf_counter()
+                    elapsed = 0.0
+                    while elapsed < min_time or runs == 0:
+                        method(*args)
+                        runs += 1
+                        elapsed = time.perf_counter() - start
+                    best = min(best, elapsed / runs)
+                results.append({
+                    "benchmark": f"{suite_class.__name__}.{method_name}" + ("" if params is None else f"({param})"),
+                    "seconds": best,
+                    "files": suite.files,
+                    "bytes": suite.bytes,
+                    "files_per_second": suite.files / best,
+                    "mb_per_second": suite.bytes / best / (1024 * 1024),
+                })
+        finally:
+            suite.teardown(*args)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Extraction, flattening and sanitization throughput on synthetic data")
+    parser.add_argument("--suite", action="append", choices=[suite.__name__.replace("Suite", "") for suite in SUITES], help="Only run these suites")
+    parser.add_argument("-t", "--min-time", type=float, default=0.5, help="Minimum seconds per measurement")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Measurements per benchmark, the best is reported")
+    parser.add_argument("--json", dest="json_path", help="Also write the results as JSON to this path")
+    args = parser.parse_args()
+
+    results = []
+    for suite_class in SUITES:
+        if args.suite and suite_class.__name__.replace("Suite", "") not in args.suite:
+            continue
+        for result in run_suite(suite_class, args.min_time, args.repeat):
+            print(f"{result['benchmark']:<40} {result['seconds'] * 1000:10.2f} ms {result['files_per_second']:12.0f} files/s {result['mb_per_second']:10.2f} MB/s")
+            results.append(result)
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Micro-benchmark for the RefPack (0x10fb) decompressor.
+
+Reports decode throughput in MB/s of decoded output, on synthetic streams and,
+when .str archives are given, on every compressed block they contain.
+
+    python benchmarks/bench_refpack.py
+    python benchmarks/bench_refpack.py Source/USRDIR/Assets_2_Frontend/frontend.str
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Tools.process.QuickBMS.refpack import RefPackDecoder
+from Tools.process.QuickBMS.str_archive import StrArchive
+
+
+def synthetic_stream(size: int, seed: int = 0, literal_ratio: float = 0.3) -> tuple:
+    """
+    Builds a valid RefPack stream decoding to roughly size bytes.
+
+    Every command form is used: short, medium and long back-references (including
+    overlapping run-length copies), literal runs and the end-of-stream command.
+
+    Returns:
+        tuple[bytes, bytes]: The compressed stream and the data it decodes to.
+    """
+    rng = random.Random(seed)
+    out = bytearray()
+    body = bytearray()
+
+    while len(out) < size:
+        if not out or rng.random() < literal_ratio:
+            count = rng.randrange(1, 28) * 4
+            literal = bytes(rng.randrange(256) for _ in range(count))
+            body.append(0xE0 + (count - 4) // 4)
+            body += literal
+            out += literal
+            continue
+
+        literal = bytes(rng.randrange(256) for _ in range(rng.randrange(4)))
+        out += literal
+        kind = rng.randrange(3)
+        if kind == 0:
+            distance = rng.randrange(1, min(len(out), 1024) + 1)
+            length = rng.randrange(3, 11)
+            body += bytes(((((distance - 1) >> 8) << 5) | ((length - 3) << 2) | len(literal),
+                           (distance - 1) & 0xFF))
+        elif kind == 1:
+            distance = rng.randrange(1, min(len(out), 16384) + 1)
+            length = rng.randrange(4, 68)
+            body += bytes((0x80 | (length - 4),
+                           (len(literal) << 6) | ((distance - 1) >> 8),
+                           (distance - 1) & 0xFF))
+        else:
+            distance = rng.randrange(1, min(len(out), 131072) + 1)
+            length = rng.randrange(5, 1029)
+            body += bytes((0xC0 | (((distance - 1) >> 16) << 4) | (((length - 5) >> 8) << 2) | len(literal),
+                           ((distance - 1) >> 8) & 0xFF,
+                           (distance - 1) & 0xFF,
+                           (length - 5) & 0xFF))
+        body += literal
+        start = len(out) - distance
+        for i in range(length):
+            out.append(out[start + i])
+
+    body.append(0xFC)
+    header = bytes((0x10, 0xFB)) + len(out).to_bytes(3, "big")
+    return header + bytes(body), bytes(out)
+
+
+def measure(decoder: RefPackDecoder, src: bytes, size: int, min_time: float) -> float:
+    """
+    Decodes src repeatedly for at least min_time seconds and returns MB/s of output.
+    """
+    runs = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        decoder.decode(src, size)
+        runs += 1
+        elapsed = time.perf_counter() - start
+    return size * runs / elapsed / (1024 * 1024)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="RefPack decompression micro-benchmark")
+    parser.add_argument("archives", nargs="*", help=".str archives whose compressed blocks are benchmarked")
+    parser.add_argument("-t", "--min-time", type=float, default=1.0, help="Minimum seconds per measurement")
+    args = parser.parse_args()
+
+    decoder = RefPackDecoder()
+
+    print("Synthetic streams:")
+    for label, size, literal_ratio in (("64 KiB, literal heavy", 64 * 1024, 0.7),
+                                       ("64 KiB, match heavy", 64 * 1024, 0.1),
+                                       ("1 MiB, mixed", 1024 * 1024, 0.3)):
+        src, expected = synthetic_stream(size, literal_ratio=literal_ratio)
+        if bytes(decoder.decode(src, len(expected))) != expected:
+            sys.exit(f"Synthetic stream '{label}' decoded incorrectly.")
+        print(f"  {label:<24} {measure(decoder, src, len(expected), args.min_time):10.2f} MB/s")
+
+    for path in args.archives:
+        with StrArchive(path) as archive:
+            blocks = [block for block in archive.blocks if block.compressed]
+            if not blocks:
+                print(f"{path}: no compressed blocks")
+                continue
+            total_size = sum(block.size for block in blocks)
+            sources = [archive.read_stored(block) for block in blocks]
+
+        runs = 0
+        start = time.perf_counter()
+        elapsed = 0.0
+        while elapsed < args.min_time:
+            for src, block in zip(sources, blocks):
+                decoder.decode(src, block.size)
+            runs += 1
+            elapsed = time.perf_counter() - start
+        print(f"{path}: {len(blocks)} compressed blocks, {total_size * runs / elapsed / (1024 * 1024):.2f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Checks the repacker round trip on a synthetic dump, and times it:
+
+1. An unmodified extraction repacks to byte-identical archives.
+2. After files are grown and shrunk, extracting the repacked archives gives back the edited tree.
+3. A template with an undecodable block is counted as failed, the other archives are unaffected.
+
+    python benchmarks/bench_repack.py
+    python benchmarks/bench_repack.py --archives 16 --compressed-ratio 1.0 --keep
+
+Exits with 1 when any check fails.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import printer
+from scan import SCANS
+from bench_fused import write_project
+from synthetic import build_archive, entry_record, generate_dump
+from Tools.process.QuickBMS import QBMS_MAIN, repack
+from Tools.process.QuickBMS.str_archive import StrArchive
+from Tools.process.Flat.compare import compare_trees
+
+
+def edit_extracted_files(out_directory: str) -> int:
+    """
+    Grows every sixth extracted file and shrinks the one after it, returns the number of edited files.
+    """
+    edited = 0
+    for root, _, files in sorted(os.walk(out_directory)):
+        for index, name in enumerate(sorted(files)):
+            if index % 6 not in (0, 1):
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                data = f.read()
+            data = data * 2 + b"grown" if index % 6 == 0 else data[:len(data) // 3] + b"shrunk"
+            with open(path, "wb") as f:
+                f.write(data)
+            edited += 1
+    return edited
+
+
+def changed_archives(config) -> list:
+    """
+    Returns the keys of the repacked archives that are not byte-identical to their templates.
+    """
+    changed = []
+    for key, template, _, repacked in repack.find_archives(config):
+        with open(template, "rb") as f, open(repacked, "rb") as g:
+            if f.read() != g.read():
+                changed.append(key)
+    return changed
+
+
+def extract_repacked(config, destination: str) -> None:
+    """
+    Extracts every repacked archive below destination, in the OutDirectory layout.
+    """
+    for _, _, _, repacked in repack.find_archives(config):
+        with StrArchive(repacked) as archive:
+            archive.extract(QBMS_MAIN.get_output_directory(repacked, config.repack_directory, destination), overwrite=True)
+
+
+def timed_repack(config, max_workers: int) -> tuple:
+    SCANS.clear()
+    start = time.perf_counter()
+    counts = repack.repack(config, max_workers=max_workers or None)
+    return counts, time.perf_counter() - start
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Repack round trip on synthetic data")
+    parser.add_argument("--archives", type=int, default=8, help="Synthetic archives to generate")
+    parser.add_argument("--entries", type=int, default=32, help="Entries per block")
+    parser.add_argument("--compressed-ratio", type=float, default=0.5, help="Share of RefPack compressed blocks")
+    parser.add_argument("-j", "--jobs", type=int, default=0, help="Worker processes, 0 means one per CPU")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary directory and print its path")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench_repack_")
+    failures = []
+    try:
+        source = os.path.join(root, "src")
+        generate_dump(source, archives=args.archives, blocks_per_archive=4, entries_per_block=args.entries, compressed_ratio=args.compressed_ratio)
+        config = write_project(os.path.join(root, "project"), source, False, args.jobs)
+
+        printer.set_quiet(True)
+        try:
+            QBMS_MAIN.main(config.project_dir, config.module_dir, force=True, config=config)
+            unmodified_counts, unmodified_seconds = timed_repack(config, args.jobs)
+            changed = changed_archives(config)
+            edited = edit_extracted_files(config.out_directory)
+            edited_counts, edited_seconds = timed_repack(config, args.jobs)
+        finally:
+            printer.set_quiet(False)
+        print(f"{'unmodified':<10} {unmodified_seconds * 1000:10.2f} ms {unmodified_counts['repacked']:6d} archives repacked")
+        print(f"{'edited':<10} {edited_seconds * 1000:10.2f} ms {edited_counts['repacked']:6d} archives repacked, {edited} files edited")
+
+        # 1. Byte-identical archives from the unmodified extraction, compared before the edits were repacked
+        if unmodified_counts["failed"] or unmodified_counts["repacked"] != args.archives:
+            failures.append(f"unmodified repack: {unmodified_counts}")
+        for key in changed:
+            failures.append(f"not byte-identical: {key}")
+
+        # 2. The repacked archives extract to the edited tree
+        reextracted = os.path.join(root, "reextracted")
+        extract_repacked(config, reextracted)
+        result = compare_trees(config.out_directory, reextracted)
+        for key, paths in result.items():
+            for path in paths:
+                failures.append(f"round trip {key}: {path}")
+
+        # 3. An undecodable template fails on its own
+        records = b"".join(entry_record(f"corrupt/entry_{index}.bin", bytes(range(256)) * 8) for index in range(4))
+        corrupt = os.path.join(source, "corrupt", "corrupt.str")
+        build_archive(corrupt, [(records, True)])
+        with open(corrupt, "r+b") as f:
+            # The first RefPack opcode becomes a back-reference before the start of the output
+            f.seek(0x805)
+            f.write(b"\x00\x40")
+        os.makedirs(QBMS_MAIN.get_output_directory(corrupt, source, config.out_directory), exist_ok=True)
+        printer.set_quiet(True)
+        try:
+            corrupt_counts, _ = timed_repack(config, args.jobs)
+        finally:
+            printer.set_quiet(False)
+        if corrupt_counts["failed"] != 1 or corrupt_counts["unchanged"] != args.archives:
+            failures.append(f"corrupt template: {corrupt_counts}")
+    finally:
+        if args.keep:
+            print(f"Kept {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+    for failure in failures:
+        print(failure)
+    if failures:
+        print(f"Repack round trip failed: {len(failures)} problem(s).")
+        return 1
+    print("Repack round trip is intact.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""
+Generator for synthetic SToc (.str) archives and extracted-looking directory trees.
+
+Archives follow the simpsons_str.bms layout: the 'SToc' header, the 24 byte TOC entries,
+0x800 aligned blocks, optionally RefPack (0x10fb) compressed, holding named inner entries.
+Entry names use deep single-child directory chains like the real dump, which flat.py
+collapses into '++' joined names.
+
+    python benchmarks/synthetic.py GameFiles/synthetic --archives 16 --compressed 0.5
+"""
+
+import argparse
+import os
+import random
+import struct
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Tools.process.QuickBMS.refpack import compress
+from Tools.process.QuickBMS.str_archive import BLOCK_ALIGNMENT, STR_HEADER_SIZE, STR_MAGIC, align
+
+# Directory levels seen in the real dump, chains are built from these
+CHAIN_PARTS = (
+    "build", "PS3", "pal_en", "texture_dictionary", "assets_rws", "story_mode", "streams",
+    "chars", "props", "localization", "audio", "global", "frontend", "shaders", "anim",
+)
+EXTENSIONS = (".txd", ".rws", ".snu", ".bin", ".lh2", ".dff")
+
+
+def entry_record(name: str, payload: bytes) -> bytes:
+    """
+    Builds one named inner entry: the 16 byte prefix, the header with its three
+    names, dummy field, ZERO and SIZE, then the payload padded to 4 bytes.
+    """
+    encoded = name.encode("latin-1") + b"\x00"
+    name_field = struct.pack(">I", len(encoded)) + encoded
+    header = (name_field + b"\x00" * 0x10 + name_field + name_field
+              + struct.pack(">I", 4) + b"\x00" * 4
+              + struct.pack(">II", 0, len(payload)))
+    prefix = struct.pack(">IIII", 0, 0, 0, len(header))
+    return prefix + header + payload + b"\x00" * (-len(payload) % 4)
+
+
+def build_archive(path: str, blocks: list) -> int:
+    """
+    Writes a SToc archive.
+
+    Args:
+        path (str): The .str file to write.
+        blocks (list[tuple[bytes, bool]]): The decoded contents of each block and whether to compress it.
+
+    Returns:
+        int: The size of the written archive.
+    """
+    toc = bytearray()
+    body = bytearray()
+    for data, compressed in blocks:
+        stored = compress(data) if compressed else data
+        stored_size = align(len(stored), BLOCK_ALIGNMENT)
+        # dummy, SIZE (decoded), IGNORE_SIZE, XSIZE (stored, aligned), dummy
+        toc += struct.pack(">QIIII", 0, len(data), len(data), stored_size, 0)
+        body += stored + b"\x00" * (stored_size - len(stored))
+
+    # INFO_OFF is the fourth long, the block count the top byte of the second
+    header = STR_MAGIC + struct.pack(">12I", 0, len(blocks) << 24, 0, STR_HEADER_SIZE, 0, 0, 0, 0, 0, 0, 0, 0)
+    base_offset = align(STR_HEADER_SIZE + len(toc), BLOCK_ALIGNMENT)
+    data = header + toc
+    data += b"\x00" * (base_offset - len(data)) + body
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return len(data)
+
+
+def random_payload(rng: random.Random, size: int, redundancy: float = 0.6) -> bytes:
+    """
+    Returns size bytes where roughly a redundancy fraction repeats earlier data, so compression ratios look plausible.
+    """
+    out = bytearray()
+    while len(out) < size:
+        if out and rng.random() < redundancy:
+            start = rng.randrange(len(out))
+            out += out[start:start + rng.randrange(8, 256)]
+        else:
+            out += rng.randbytes(rng.randrange(4, 64))
+    return bytes(out[:size])
+
+
+def chain_directory(rng: random.Random, depth: int) -> str:
+    """
+    Returns a single-child chain of depth directories, e.g. 'build/PS3/pal_en/chars/...'.
+    """
+    return "/".join(rng.choice(CHAIN_PARTS) for _ in range(depth))
+
+
+def generate_dump(root: str, archives: int = 8, blocks_per_archive: int = 4, entries_per_block: int = 16,
+                  payload_size: int = 4096, compressed_ratio: float = 0.5, chain_depth: int = 6, seed: int = 0) -> dict:
+    """
+    Writes a synthetic StrDirectory of archives below root.
+
+    Each block groups its entries below one chain, so the extracted tree has the long
+    single-child runs the flattener collapses.
+
+    Returns:
+        dict: "archives", "files" and "bytes" (decoded payload bytes) written, and "archive_bytes".
+    """
+    rng = random.Random(seed)
+    stats = {"archives": 0, "files": 0, "bytes": 0, "archive_bytes": 0}
+    for archive_index in range(archives):
+        blocks = []
+        for block_index in range(blocks_per_archive):
+            chain = chain_directory(rng, chain_depth)
+            records = bytearray()
+            for entry_index in range(entries_per_block):
+                payload = random_payload(rng, rng.randrange(payload_size // 2, payload_size * 3 // 2 + 1))
+                records += entry_record(f"{chain}/asset_{block_index:03d}_{entry_index:05d}{rng.choice(EXTENSIONS)}", payload)
+                stats["files"] += 1
+                stats["bytes"] += len(payload)
+            blocks.append((bytes(records), rng.random() < compressed_ratio))
+        path = os.path.join(root, f"level_{archive_index % 4:02d}", f"archive_{archive_index:03d}.str")
+        stats["archive_bytes"] += build_archive(path, blocks)
+        stats["archives"] += 1
+    return stats
+
+
+def generate_chain_tree(root: str, chains: int = 32, depth: int = 8, files_per_leaf: int = 8, file_size: int = 4096, seed: int = 0) -> dict:
+    """
+    Writes an OutDirectory-like tree of single-child directory chains ending in a few files each.
+
+    Returns:
+        dict: "directories", "files" and "bytes" written.
+    """
+    rng = random.Random(seed)
+    stats = {"directories": 0, "files": 0, "bytes": 0}
+    for chain_index in range(chains):
+        leaf = os.path.join(root, f"archive_{chain_index:03d}_str", *chain_directory(rng, depth).split("/"))
+        os.makedirs(leaf, exist_ok=True)
+        stats["directories"] += depth + 1
+        for file_index in range(files_per_leaf):
+            payload = random_payload(rng, file_size)
+            with open(os.path.join(leaf, f"asset_{file_index:05d}{rng.choice(EXTENSIONS)}"), "wb") as f:
+                f.write(payload)
+            stats["files"] += 1
+            stats["bytes"] += len(payload)
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate synthetic .str archives for benchmarks and tests")
+    parser.add_argument("output", help="Directory to write the archives to (a StrDirectory)")
+    parser.add_argument("--archives", type=int, default=8, help="Number of archives")
+    parser.add_argument("--blocks", type=int, default=4, help="Blocks per archive")
+    parser.add_argument("--entries", type=int, default=16, help="Entries per block")
+    parser.add_argument("--payload-size", type=int, default=4096, help="Average entry size in bytes")
+    parser.add_argument("--compressed", type=float, default=0.5, help="Fraction of RefPack compressed blocks")
+    parser.add_argument("--depth", type=int, default=6, help="Depth of the single-child directory chains")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    stats = generate_dump(args.output, args.archives, args.blocks, args.entries, args.payload_size, args.compressed, args.depth, args.seed)
+    print(f"Wrote {stats['archives']} archives ({stats['archive_bytes']} bytes) holding {stats['files']} files ({stats['bytes']} bytes) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,15 @@ import time
 
 from typing import Optional
 
+# Extraction engines selectable through Extract.Settings.engine
+ENGINES = ("quickbms", "batch", "native")
+# Coverage log formats selectable through Extract.Settings.coverage_format
+COVERAGE_FORMATS = ("jsonl", "text")
+# Flattener copy verification modes, Extract.Settings.flat_verify
+VERIFY_MODES = ("none", "size", "full")
+# Flattener transfer modes, Extract.Settings.flat_mode
+LINK_MODES = ("copy", "hardlink", "reflink", "move", "dedup")
+
 
 def find_project_json(module_dir: Path) -> Path:
     """
@@ -49,14 +58,14 @@ def create_conf(module_dir: Path, project_dir: Path) -> tuple[Path, dict]:
         tuple[Path, dict]: A tuple contajsonng the resolved path to the created configuration file and the config object.
     """
 
-    conf_path = Path(project_dir / "Project.json")
+    conf_path = Path(project_dir / "project.json")
     module_name = "Extract"
 
     # Check if the configuration file contains the module configuration 'Extract'
     if conf_path.exists():
         with open(conf_path, 'r') as f:
             porjectConfig = json.load(f)
-            if module_name in porjectConfig.get('Extract', {}):
+            if module_name in porjectConfig:
                 print(colours.CYAN, f"INFO 6 Configuration file already exists at {conf_path}")
                 return conf_path.resolve(), porjectConfig
             else:
@@ -73,11 +82,49 @@ def create_conf(module_dir: Path, project_dir: Path) -> tuple[Path, dict]:
                         "StrDirectory": str(project_dir / "Source" / "USRDIR"),
                         "OutDirectory": str(module_dir / "GameFiles" / "QbmsOut"),
                         "FlatDirectory": str(module_dir / "GameFiles" / "quickbms_out"),
-                        "LogFilePath": str(module_dir / "qbms.log")
+                        "LogFilePath": str(module_dir / "qbms.log"),
+                        "ManifestPath": str(module_dir / "GameFiles" / "qbms_manifest.json"),
+                        "CatalogPath": str(module_dir / "GameFiles" / "str_catalog.sqlite"),
+                        "DedupStore": str(module_dir / "GameFiles" / "dedup_store"),
+                        "StageStatePath": str(module_dir / "GameFiles" / "stage_state.json"),
+                        "RunReportPath": str(module_dir / "GameFiles" / "run_report.json"),
+                        "RepackDirectory": str(module_dir / "GameFiles" / "repacked"),
+                        "RepackManifestPath": str(module_dir / "GameFiles" / "repack_manifest.json")
                     },
                     'Scripts': {
                         "BmsScriptPath": str(module_dir / "Tools" / "quickbms" / "simpsons_str.bms"),
                         "QuickBMSEXEPath": str(module_dir / "Tools" / "quickbms" / "exe" / "quickbms.exe"),
+                    },
+                    'Settings': {
+                        # Number of parallel extraction workers, 0 means one per CPU
+                        "max_workers": 0,
+                        # Extraction engine: 'quickbms' (quickbms.exe per archive), 'batch' (quickbms.exe per
+                        # shard of archives, using an input folder with -F and -d) or 'native' (in-process reader)
+                        "engine": "quickbms",
+                        # Seconds after which a QuickBMS run is killed and its archive retried next run, 0 means no limit
+                        "quickbms_timeout": 0,
+                        # Lines kept and printed from the end of each QuickBMS output
+                        "output_tail_lines": 200,
+                        # Also hash archive contents, so touched but unchanged archives are not re-extracted
+                        "manifest_hash": False,
+                        # Flattener copy verification: 'none', 'size' or 'full' (re-hash the copy)
+                        "flat_verify": "full",
+                        # Flattener transfer mode: 'copy', 'hardlink', 'reflink', 'move' (consumes OutDirectory)
+                        # or 'dedup' (hardlinks into DedupStore, one blob per distinct content)
+                        "flat_mode": "copy",
+                        # Coverage log format: 'jsonl' (one JSON record per line) or 'text' (legacy)
+                        "coverage_format": "jsonl",
+                        # Native engine only: extract straight into FlatDirectory, skipping OutDirectory and the flattener.
+                        # Fused archives are not recorded in the manifest, every archive is re-extracted whenever
+                        # the extract stage runs (see benchmarks/bench_fused.py for the equivalence check)
+                        "fused": False,
+                    },
+                    # Selective extraction: globs (or 're:' regexes) on archive paths and entry names
+                    'Filters': {
+                        "archive_include": [],
+                        "archive_exclude": [],
+                        "entry_include": [],
+                        "entry_exclude": [],
                     }
                 }
                 # *** Key Change: Add the 'Extract' config to the loaded data ***
@@ -90,23 +137,136 @@ def create_conf(module_dir: Path, project_dir: Path) -> tuple[Path, dict]:
     return conf_path.resolve(), porjectConfig
 
 
-def main(module_dir: Path) -> None:
+def _section(extract: dict, name: str) -> dict:
+    section = extract.get(name) or {}
+    if not isinstance(section, dict):
+        raise ValueError(f"Extract.{name} must be an object.")
+    return section
+
+
+def _path(section: dict, name: str, key: str, default: Optional[Path] = None) -> str:
+    value = section.get(key) or (str(default) if default is not None else None)
+    if not value:
+        raise ValueError(f"Missing Extract.{name}.{key} in project.json.")
+    if not isinstance(value, str):
+        raise ValueError(f"Extract.{name}.{key} must be a path, got {value!r}.")
+    return value
+
+
+def _choice(settings: dict, key: str, choices: tuple, default: str) -> str:
+    value = str(settings.get(key, default)).lower()
+    if value not in choices:
+        raise ValueError(f"Invalid {key} value '{value}', expected one of {', '.join(choices)}.")
+    return value
+
+
+def _number(settings: dict, key: str, kind: type, default):
+    value = settings.get(key)
+    try:
+        return kind(value) if value is not None else default
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {key} value '{value}', expected a number.") from None
+
+
+class ExtractConfig:
+    """
+    The 'Extract' block of project.json, read and validated once and passed to every stage.
+
+    Paths are kept as written in project.json, the optional cache locations default to files
+    in the module's GameFiles directory. Settings hold their effective values, e.g. a max_workers
+    of 0 is already the CPU count. Blocks the stages interpret themselves (Filters,
+    SanitizationRules) are read from raw, which is also what the stage scheduler fingerprints.
+
+    Args:
+        extract (dict): The 'Extract' block of project.json.
+        project_dir (Path): The directory containing project.json.
+        module_dir (Path): The directory containing the module files.
+
+    Raises:
+        ValueError: If a required path is missing or a setting is invalid.
+    """
+
+    def __init__(self, extract: dict, project_dir: Path, module_dir: Path):
+        if not isinstance(extract, dict):
+            raise ValueError("Extract must be an object.")
+        self.raw = extract
+        self.project_dir = Path(project_dir)
+        self.module_dir = Path(module_dir)
+        game_files = self.module_dir / "GameFiles"
+
+        directories = _section(extract, "Directories")
+        self.str_directory = _path(directories, "Directories", "StrDirectory")
+        self.out_directory = _path(directories, "Directories", "OutDirectory")
+        self.flat_directory = _path(directories, "Directories", "FlatDirectory")
+        self.log_file_path = _path(directories, "Directories", "LogFilePath")
+        self.manifest_path = _path(directories, "Directories", "ManifestPath", game_files / "qbms_manifest.json")
+        self.catalog_path = _path(directories, "Directories", "CatalogPath", game_files / "str_catalog.sqlite")
+        self.dedup_store = _path(directories, "Directories", "DedupStore", game_files / "dedup_store")
+        self.state_path = _path(directories, "Directories", "StageStatePath", game_files / "stage_state.json")
+        self.report_path = _path(directories, "Directories", "RunReportPath", game_files / "run_report.json")
+        self.repack_directory = _path(directories, "Directories", "RepackDirectory", game_files / "repacked")
+        self.repack_manifest_path = _path(directories, "Directories", "RepackManifestPath", game_files / "repack_manifest.json")
+
+        scripts = _section(extract, "Scripts")
+        self.bms_script = _path(scripts, "Scripts", "BmsScriptPath")
+        self.quickbms = _path(scripts, "Scripts", "QuickBMSEXEPath")
+
+        settings = _section(extract, "Settings")
+        # 0 (or a missing value) means one worker per CPU
+        self.max_workers = _number(settings, "max_workers", int, 0)
+        if self.max_workers <= 0:
+            self.max_workers = os.cpu_count() or 1
+        self.engine = _choice(settings, "engine", ENGINES, "quickbms")
+        # 0 means QuickBMS may run for as long as it takes
+        self.quickbms_timeout = max(_number(settings, "quickbms_timeout", float, 0.0), 0.0)
+        self.output_tail_lines = max(_number(settings, "output_tail_lines", int, 200), 1)
+        self.manifest_hash = bool(settings.get("manifest_hash", False))
+        self.flat_verify = _choice(settings, "flat_verify", VERIFY_MODES, "full")
+        self.flat_mode = _choice(settings, "flat_mode", LINK_MODES, "copy")
+        self.coverage_format = _choice(settings, "coverage_format", COVERAGE_FORMATS, "jsonl")
+        self.fused = bool(settings.get("fused", False))
+        if self.fused and self.engine != "native":
+            raise ValueError("Fused extraction requires the native engine (Settings.engine = 'native').")
+
+    @classmethod
+    def load(cls, project_dir: Path, module_dir: Path) -> "ExtractConfig":
+        """
+        Reads and validates the 'Extract' block of project_dir/project.json.
+
+        Raises:
+            OSError: If project.json cannot be read.
+            ValueError: If it is not valid JSON, has no 'Extract' block or the block is invalid.
+        """
+        with open(Path(project_dir) / "project.json", "r") as f:
+            project_config = json.load(f)
+        if not isinstance(project_config, dict) or "Extract" not in project_config:
+            raise ValueError("project.json has no 'Extract' configuration.")
+        return cls(project_config["Extract"], project_dir, module_dir)
+
+
+def main(module_dir: Path, project_dir: Optional[Path] = None) -> ExtractConfig:
     """
     The main entry point for the module initialization process.
 
     Args:
         module_dir (Path): The directory of the module.
+        project_dir (Path): The directory containing project.json, searched from module_dir when not given.
+
+    Returns:
+        ExtractConfig: The validated Extract configuration of the project.
     """
     print(colours.YELLOW, "INFO 1 Running jsont.")
 
-    print(colours.YELLOW, "INFO 2 Finding project.json.")
-    #time.sleep(5)
-    project_dir = find_project_json(module_dir)
+    if project_dir is None:
+        print(colours.YELLOW, "INFO 2 Finding project.json.")
+        #time.sleep(5)
+        project_dir = find_project_json(module_dir)
 
     print(colours.YELLOW, "INFO 5 Creating module configuration.")
     #time.sleep(5)
-    create_conf(module_dir=module_dir, project_dir=project_dir)
+    _, project_config = create_conf(module_dir=module_dir, project_dir=Path(project_dir))
+    config = ExtractConfig(project_config["Extract"], project_dir, module_dir)
 
     print(colours.GREEN, "INFO 9 Completed jsont.")
 
-    return project_dir
+    return config
@@ -1,30 +1,41 @@
 import os
+import re
 import subprocess
 import argparse
 
-global QUICKBMS_EXE, BMS_SCRIPT, STR_INPUT_DIR, OUTPUT_BASE_DIR
+from Tools.process.QuickBMS.filters import NameFilter
+
+global QUICKBMS_EXE, BMS_SCRIPT, STR_INPUT_DIR, OUTPUT_BASE_DIR, ARCHIVE_FILTER, ENTRY_FILTER
 # Hardcoded paths
 QUICKBMS_EXE = r"A:\Dev\Games\TheSimpsonsGame\PAL\Modules\Extract\Tools\quickbms\exe\quickbms.exe"
 BMS_SCRIPT = r"A:\Dev\Games\TheSimpsonsGame\PAL\Modules\Extract\Tools\quickbms\simpsons_str.bms"
 STR_INPUT_DIR = r"A:\Dev\Games\TheSimpsonsGame\PAL\Source\USRDIR"
 OUTPUT_BASE_DIR = r"A:\Dev\Games\TheSimpsonsGame\PAL\Modules\Extract\GameFiles\QbmsOuttmp"
+# Include/exclude filters, see Tools/process/QuickBMS/filters.py
+ARCHIVE_FILTER = NameFilter()
+ENTRY_FILTER = NameFilter()
 
 def extract_str_file(file_path: str):
-    global QUICKBMS_EXE, BMS_SCRIPT, STR_INPUT_DIR, OUTPUT_BASE_DIR
+    global QUICKBMS_EXE, BMS_SCRIPT, STR_INPUT_DIR, OUTPUT_BASE_DIR, ARCHIVE_FILTER, ENTRY_FILTER
     if not file_path.endswith('.str'):
         print(f"Skipping non-.str file: {file_path}")
         return
 
     # Create output directory for this str file
     relative_path = os.path.relpath(file_path, start=STR_INPUT_DIR)
+    if not ARCHIVE_FILTER.matches(relative_path):
+        print(f"Skipping filtered-out archive: {file_path}")
+        return
     output_dir = os.path.join(OUTPUT_BASE_DIR, os.path.splitext(relative_path)[0] + "_str")
     os.makedirs(output_dir, exist_ok=True)
 
     print(f"Extracting {file_path} to {output_dir}...")
 
     try:
+        # QuickBMS -f only extracts the entries matching the filter wildcards
+        filter_args = ["-f", ENTRY_FILTER.quickbms_filter()] if ENTRY_FILTER else []
         subprocess.run(
-            [QUICKBMS_EXE, "-o", BMS_SCRIPT, file_path, output_dir],
+            [QUICKBMS_EXE] + filter_args + ["-o", BMS_SCRIPT, file_path, output_dir],
             check=True
         )
         print(f"Done: {file_path}")
@@ -32,15 +43,26 @@ def extract_str_file(file_path: str):
         print(f"Extraction failed for {file_path}: {e}")
 
 def main():
-    global QUICKBMS_EXE, BMS_SCRIPT, STR_INPUT_DIR, OUTPUT_BASE_DIR
+    global QUICKBMS_EXE, BMS_SCRIPT, STR_INPUT_DIR, OUTPUT_BASE_DIR, ARCHIVE_FILTER, ENTRY_FILTER
     parser = argparse.ArgumentParser(description="Extract .str files via QuickBMS")
     parser.add_argument("-e", "--quickbms", default=QUICKBMS_EXE, help="Path to quickbms.exe")
     parser.add_argument("-s", "--script",    default=BMS_SCRIPT,  help="Path to .bms script")
     parser.add_argument("-i", "--input",     default=STR_INPUT_DIR, help="Input directory or file")
     parser.add_argument("-o", "--output",    default=OUTPUT_BASE_DIR, help="Base output directory")
+    parser.add_argument("--include", action="append", default=[], help="Only extract entries matching this wildcard (passed to QuickBMS -f), repeatable")
+    parser.add_argument("--exclude", action="append", default=[], help="Do not extract entries matching this wildcard, repeatable")
+    parser.add_argument("--include-archive", action="append", default=[], help="Only process archives (relative to --input) matching this glob or 're:' regex, repeatable")
+    parser.add_argument("--exclude-archive", action="append", default=[], help="Do not process archives matching this pattern, repeatable")
     parser.add_argument("paths", nargs="*", help="Files or directories to process")
     args = parser.parse_args()
 
+    try:
+        ARCHIVE_FILTER = NameFilter(args.include_archive, args.exclude_archive)
+        ENTRY_FILTER = NameFilter(args.include, args.exclude)
+        ENTRY_FILTER.quickbms_filter()
+    except (ValueError, re.error) as e:
+        parser.error(str(e))
+
     # Override globals
 
     QUICKBMS_EXE, BMS_SCRIPT, STR_INPUT_DIR, OUTPUT_BASE_DIR = (
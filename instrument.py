@@ -0,0 +1,182 @@
+"""
+This module records timing instrumentation for the extraction pipeline as a Chrome trace-event
+file (load it in chrome://tracing or https://ui.perfetto.dev). Stages, phases and archives are
+recorded as complete events carrying wall time, CPU time, bytes read/written and file counts in
+their args, and hot spots too small for their own events (per-file copies and hashes) are
+summed into totals stored with the trace.
+
+Recording is off until enable() is called; disabled spans only check a flag. A cProfile or
+tracemalloc profiler can additionally wrap any single stage, see profile().
+"""
+try:
+    from .printer import print, print_error, print_verbose, print_debug, colours
+except ImportError:
+    from printer import print, print_error, print_verbose, print_debug, colours
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+PROFILE_MODES = ("cprofile", "tracemalloc")
+
+
+def cpu_seconds() -> float:
+    """
+    Returns the CPU time of this process and its reaped children (QuickBMS, pool workers).
+    """
+    times = os.times()
+    return time.process_time() + times.children_user + times.children_system
+
+
+class Tracer:
+    """
+    Collects trace events from any thread and writes them as Chrome trace-event JSON.
+
+    Timestamps are taken from time.time() so events measured in worker processes
+    line up with the ones recorded here.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self.events = []
+        self.totals = {}
+        self._origin = time.time()
+        self._lock = threading.Lock()
+
+    def enable(self, path: str) -> None:
+        """
+        Starts recording, the trace is written to path by save().
+        """
+        self.enabled = True
+        self.path = str(path)
+        self._origin = time.time()
+        self.events.append({"name": "process_name", "ph": "M", "pid": os.getpid(), "tid": 0, "args": {"name": "run.py"}})
+
+    def add_event(self, name: str, category: str, start: float, seconds: float, args: dict = None, pid: int = None, tid: int = None) -> None:
+        """
+        Records a complete event, e.g. one measured in a worker process.
+
+        Args:
+            name (str): The event name, e.g. the archive path.
+            category (str): The event category: "stage", "phase" or "archive".
+            start (float): The start time as returned by time.time().
+            seconds (float): The wall time.
+            args (dict): Counters shown with the event (cpu_seconds, bytes_read, bytes_written, files...).
+            pid (int): The process that did the work, defaults to this one.
+            tid (int): The thread that did the work, defaults to the calling thread.
+        """
+        if not self.enabled:
+            return
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": round((start - self._origin) * 1e6, 1),
+            "dur": round(seconds * 1e6, 1),
+            "pid": os.getpid() if pid is None else pid,
+            "tid": threading.get_ident() if tid is None else tid,
+            "args": args or {},
+        }
+        with self._lock:
+            self.events.append(event)
+
+    def accumulate(self, name: str, **values) -> None:
+        """
+        Adds values (seconds, bytes, files...) to the named total, e.g. "flatten.verify".
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            total = self.totals.setdefault(name, {})
+            for key, value in values.items():
+                total[key] = total.get(key, 0) + value
+
+    @contextmanager
+    def span(self, name: str, category: str = "phase", **args):
+        """
+        Records the enclosed block as an event with its wall and CPU time.
+
+        Yields a dict the block can add counters to (bytes_read, bytes_written, files...).
+        CPU time is process wide and includes reaped child processes, so it covers the
+        worker threads and processes the block waits for.
+        """
+        if not self.enabled:
+            yield {}
+            return
+        start = time.time()
+        wall_start = time.perf_counter()
+        cpu_start = cpu_seconds()
+        try:
+            yield args
+        finally:
+            args["cpu_seconds"] = round(cpu_seconds() - cpu_start, 6)
+            self.add_event(name, category, start, time.perf_counter() - wall_start, args)
+
+    def save(self) -> None:
+        """
+        Writes the trace, when recording is enabled.
+        """
+        if not self.enabled:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            trace = {"traceEvents": list(self.events), "displayTimeUnit": "ms", "otherData": {"totals": self.totals}}
+        with open(self.path, "w") as f:
+            json.dump(trace, f, indent=1)
+        print(colours.CYAN, f"Trace written to {self.path} ({len(trace['traceEvents'])} events).")
+
+
+# The process-wide tracer used by run.py and the stages
+TRACER = Tracer()
+
+
+@contextmanager
+def profile(name: str, mode: str, output_directory: str):
+    """
+    Profiles the enclosed block (one stage) with cProfile or tracemalloc.
+
+    cProfile writes <name>.prof (open with pstats or snakeviz) and prints the top functions by
+    cumulative time; tracemalloc writes <name>.tracemalloc.txt with the top allocation sites and
+    prints the peak. Only this process is profiled, not pool worker processes.
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Invalid profile mode '{mode}', expected one of {', '.join(PROFILE_MODES)}.")
+    os.makedirs(output_directory, exist_ok=True)
+
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            path = os.path.join(output_directory, f"{name}.prof")
+            profiler.dump_stats(path)
+            summary = io.StringIO()
+            pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(20)
+            print(colours.GRAY, summary.getvalue())
+            print(colours.CYAN, f"cProfile stats for stage '{name}' written to {path}.")
+        return
+
+    tracemalloc.start()
+    try:
+        yield
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        path = os.path.join(output_directory, f"{name}.tracemalloc.txt")
+        with open(path, "w") as f:
+            f.write(f"Peak traced memory: {peak} bytes\n")
+            for stat in snapshot.statistics("lineno")[:50]:
+                f.write(f"{stat}\n")
+        print(colours.CYAN, f"Stage '{name}' peak traced memory {peak / (1024 * 1024):.2f} MiB, allocation sites written to {path}.")
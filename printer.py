@@ -1,11 +1,39 @@
 """
 This module provides utility functions for logging messages with ANSI colour codes.
 It includes functions for standard, error, verbose, and debug logging.
+
+Messages go through a small logging backend built for runs that log tens of thousands of lines:
+
+- The level is read from the VERBOSE and DEBUG environment variables once and cached, see
+  set_level() and refresh_level(); dropped messages return before any formatting.
+- Messages can be lazy: '%'-style with arguments, print(colours.BLUE, "Copied %s", name),
+  or a callable returning the text. They are only formatted when they are written.
+- Standard output is buffered and written in batches, by a background thread at least every
+  FLUSH_INTERVAL seconds, before every error and at exit. flush() forces a write.
+- Quiet mode (set_quiet(), run.py --quiet) drops everything but errors and shows the
+  progress() of long loops as a single updating progress bar instead.
 """
 
+import atexit
 import builtins
 import sys
 import os  # Import os for environment variable check
+import threading
+import time
+
+# --- Levels ---
+DEBUG = 10
+VERBOSE = 15
+INFO = 20
+ERROR = 40
+
+# Seconds buffered output may wait before the background writer flushes it
+FLUSH_INTERVAL = 0.1
+# Buffered characters that trigger an immediate write
+FLUSH_SIZE = 64 * 1024
+# Seconds between progress bar redraws
+PROGRESS_INTERVAL = 0.2
+PROGRESS_WIDTH = 30
 
 # --- ANSI colour Codes ---
 class colours(object):
@@ -22,38 +50,215 @@ class colours(object):
     GRAY = '\033[90m'
     DARK_GREEN = '\033[32m'
 
+# --- Level State ---
+def level_from_environment() -> int:
+    """
+    Returns the level selected by the VERBOSE and DEBUG environment variables ('true' enables them).
+    """
+    if os.environ.get("DEBUG", "").lower() == "true":
+        return DEBUG
+    if os.environ.get("VERBOSE", "").lower() == "true":
+        return VERBOSE
+    return INFO
+
+_level = level_from_environment()
+_quiet = False
+
+def set_level(level: int) -> None:
+    """
+    Sets the lowest level that is written: DEBUG, VERBOSE, INFO or ERROR.
+    """
+    global _level
+    _level = level
+
+def refresh_level() -> None:
+    """
+    Re-reads the level from the environment, e.g. after VERBOSE was changed at runtime.
+    """
+    set_level(level_from_environment())
+
+def is_enabled(level: int) -> bool:
+    """
+    Checks whether messages of a level are written, to guard expensive message preparation.
+    """
+    return level >= _level and (not _quiet or level >= ERROR)
+
+def set_quiet(quiet: bool = True) -> None:
+    """
+    Enables quiet mode: only errors and the progress bar are shown.
+    """
+    global _quiet
+    _quiet = quiet
+    if not quiet:
+        _progress.clear()
+
+# --- Buffered Writer ---
+class _BufferedWriter:
+    """
+    Collects output lines and writes them to a stream in batches.
+
+    Lines go to the stream that was current (e.g. sys.stdout) when they were logged, so
+    redirections such as contextlib.redirect_stdout keep working.
+    """
+
+    def __init__(self, stream_name: str):
+        self.stream_name = stream_name
+        self.stream = None
+        self.lock = threading.Lock()
+        self.parts = []
+        self.size = 0
+        self.thread = None
+
+    def write(self, text: str) -> None:
+        stream = getattr(sys, self.stream_name)
+        with self.lock:
+            if stream is not self.stream:
+                self._flush_locked()
+                self.stream = stream
+            self.parts.append(text)
+            self.size += len(text)
+            if self.size >= FLUSH_SIZE:
+                self._flush_locked()
+            elif self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="printer-flush", daemon=True)
+                self.thread.start()
+
+    def _flush_locked(self) -> None:
+        if not self.parts:
+            return
+        text = "".join(self.parts)
+        self.parts = []
+        self.size = 0
+        try:
+            self.stream.write(text)
+            self.stream.flush()
+        except (OSError, ValueError):
+            # Closed or broken stream (e.g. piped into head), the output has nowhere to go
+            pass
+
+    def flush(self) -> None:
+        with self.lock:
+            self._flush_locked()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            self.flush()
+
+    def reset_after_fork(self) -> None:
+        # A forked worker must not write what its parent had buffered
+        self.lock = threading.Lock()
+        self.parts = []
+        self.size = 0
+        self.thread = None
+
+_stdout = _BufferedWriter("stdout")
+
+def flush() -> None:
+    """
+    Writes all buffered output now.
+    """
+    _progress.clear()
+    _stdout.flush()
+
+atexit.register(flush)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_stdout.reset_after_fork)
+
+def _format(message, args: tuple) -> str:
+    if callable(message):
+        message = message()
+    if args:
+        message = message % args
+    return message
+
+# --- Progress ---
+class _Progress:
+    """
+    The single-line progress bar shown on stderr in quiet mode.
+    """
+
+    def __init__(self):
+        self.shown = False
+        self.last = 0.0
+
+    def update(self, label: str, done: int, total: int) -> None:
+        now = time.perf_counter()
+        if done < total and now - self.last < PROGRESS_INTERVAL:
+            return
+        self.last = now
+        fraction = done / total if total else 1.0
+        filled = int(PROGRESS_WIDTH * fraction)
+        bar = "#" * filled + "-" * (PROGRESS_WIDTH - filled)
+        sys.stderr.write(f"\r{label} [{bar}] {done}/{total} {fraction * 100:5.1f}%")
+        if done >= total:
+            sys.stderr.write("\n")
+            self.shown = False
+        else:
+            self.shown = True
+        sys.stderr.flush()
+
+    def clear(self) -> None:
+        if self.shown:
+            sys.stderr.write("\n")
+            sys.stderr.flush()
+            self.shown = False
+
+_progress = _Progress()
+
+def progress(label: str, done: int, total: int) -> None:
+    """
+    Reports the progress of a long loop, drawn as a progress bar in quiet mode only.
+
+    :param label: What is being processed, e.g. "Flattening".
+    :param done: The number of items finished.
+    :param total: The number of items.
+    """
+    if _quiet:
+        _progress.update(label, done, total)
+
 # --- Logging Functions ---
-def print(colour: str, message: str) -> None:  # Removed default colour
+def print(colour: str, message, *args) -> None:  # Removed default colour
     """
     Logs a message to the standard output stream with the specified colour.
 
     :param colour: The ANSI colour code to format the message.
-    :param message: The message to log.
+    :param message: The message to log, a '%' format string when args are given, or a callable returning it.
+    :param args: Arguments formatted into the message, only when it is written.
     """
-    builtins.print(f"{colour}{message}{colours.RESET}", file=sys.stdout)
+    if _quiet or _level > INFO:
+        return
+    _stdout.write(f"{colour}{_format(message, args)}{colours.RESET}\n")
 
-def print_error(message: str) -> None:
+def print_error(message, *args) -> None:
     """
     Logs an error message to the standard error stream.
 
-    :param message: The error message to log.
+    :param message: The error message to log, formatted like print().
+    :param args: Arguments formatted into the message.
     """
-    builtins.print(f"{colours.RED}{message}{colours.RESET}", file=sys.stderr)
+    # Written unbuffered, after everything logged before it
+    flush()
+    builtins.print(f"{colours.RED}{_format(message, args)}{colours.RESET}", file=sys.stderr)
 
-def print_verbose(message: str) -> None:
+def print_verbose(message, *args) -> None:
     """
     Logs a verbose message if verbose logging is enabled.
 
-    :param message: The verbose message to log.
+    :param message: The verbose message to log, formatted like print().
+    :param args: Arguments formatted into the message.
     """
-    if "VERBOSE" in os.environ and os.environ["VERBOSE"].lower() == "true":
-        print(colours.GRAY, f"VERBOSE: {message}")
+    if _level > VERBOSE or _quiet:
+        return
+    _stdout.write(f"{colours.GRAY}VERBOSE: {_format(message, args)}{colours.RESET}\n")
 
-def print_debug(message: str) -> None:
+def print_debug(message, *args) -> None:
     """
     Logs a debug message if debugging is enabled.
 
-    :param message: The debug message to log.
+    :param message: The debug message to log, formatted like print().
+    :param args: Arguments formatted into the message.
     """
-    if "DEBUG" in os.environ and os.environ["DEBUG"].lower() == "true":
-        print(colours.MAGENTA, f"DEBUG: {message}")
+    if _level > DEBUG or _quiet:
+        return
+    _stdout.write(f"{colours.MAGENTA}DEBUG: {_format(message, args)}{colours.RESET}\n")
@@ -1,100 +1,171 @@
+import argparse
+import hashlib
+import json
 import sys
 import os
 import time
+from contextlib import nullcontext
 from pathlib import Path
+from typing import Optional
 
 try:
     from .printer import print, print_error, print_verbose, print_debug, colours
+    from . import printer
     from . import conf
+    from . import instrument
+    from .scan import SCANS
+    from .scheduler import Stage, StageScheduler, fingerprint_paths
     from .Tools.process.Rename import RenameFolders
     from .Tools.process.QuickBMS import QBMS_MAIN
     from .Tools.process.Flat import flat
 except ImportError:
     from printer import print, print_error, print_verbose, print_debug, colours
+    import printer
     import conf
+    import instrument
+    from scan import SCANS
+    from scheduler import Stage, StageScheduler, fingerprint_paths
     from Tools.process.Rename import RenameFolders
     from Tools.process.QuickBMS import QBMS_MAIN
     from Tools.process.Flat import flat
 
-def initialize_configuration(module_dir: Path) -> Path:
+def initialize_configuration(module_dir: Path, project_dir: Optional[Path] = None) -> "conf.ExtractConfig":
     """
-    Initializes the configuration and returns the project directory.
+    Initializes the configuration and returns the validated Extract configuration.
     """
     print(colours.CYAN, "Running init.")
     # time.sleep(5) # test delay
-    project_dir = conf.main(module_dir)
+    config = conf.main(module_dir, project_dir)
     print(colours.GREEN, "Completed init.")
-    return project_dir
+    return config
 
-def run_rename(project_dir: Path, module_dir: Path) -> None:
+def run_rename(config: "conf.ExtractConfig") -> None:
     """
     Runs the folder renaming step.
     """
     # --- Rename Folders Step ---
     print(colours.CYAN, "Running rename folders.")
     # time.sleep(5) # test delay
-    RenameFolders.main(project_dir, module_dir)
+    RenameFolders.main(config.project_dir, config.module_dir, config=config)
     print(colours.GREEN, "Completed rename folders.")
 
-def run_quickbms(project_dir: Path, module_dir: Path) -> None:
+def run_quickbms(config: "conf.ExtractConfig", max_workers: Optional[int] = None, force: bool = False) -> None:
     """
     Runs the QuickBMS extraction step.
     """
     # --- QuickBMS Extraction Step ---
     print(colours.CYAN, "Running QuickBMS.")
     # time.sleep(5) # test delay
-    QBMS_MAIN.main(project_dir, module_dir)
+    QBMS_MAIN.main(config.project_dir, config.module_dir, max_workers=max_workers, force=force, config=config)
     print(colours.GREEN, "Completed QuickBMS.")
 
-def run_flatten_output(project_dir: Path, module_dir: Path) -> None:
+def run_flatten_output(config: "conf.ExtractConfig", max_workers: Optional[int] = None) -> None:
     """
     Runs the final step to flatten the extracted output directory structure.
     """
     print(colours.CYAN, "Running flattener.")
     # time.sleep(5) # test delay
-    flat.main(project_dir, module_dir)
+    flat.main(config.project_dir, config.module_dir, max_workers=max_workers, config=config)
     print(colours.GREEN, "Completed flattener.")
 
-def main() -> None:
-    """Main function to determine and execute the program mode."""
+STAGES = ("rename", "extract", "flatten")
 
+def parse_args(argv: Optional[list] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the rename, extract and flatten stages, skipping unchanged ones")
+    parser.add_argument("--project", type=Path, metavar="DIR", help="Directory containing project.json (default: searched from the module directory)")
+    parser.add_argument("--only", nargs="+", choices=STAGES, help="Run only these stages")
+    parser.add_argument("--force", action="store_true", help="Run the selected stages even if their inputs are unchanged")
+    parser.add_argument("--from", dest="start_from", choices=STAGES, help="Start at this stage, forcing it and every later stage")
+    parser.add_argument("--jobs", type=int, metavar="N", help="Worker count for extraction and flattening, overrides Settings.max_workers")
+    parser.add_argument("--trace", metavar="PATH", help="Write a Chrome trace-event JSON of stage, phase and archive timings")
+    parser.add_argument("--profile", choices=STAGES, metavar="STAGE", help="Profile one stage (in this process only)")
+    parser.add_argument("--quiet", action="store_true", help="Only print errors, with a progress bar for extraction and flattening")
+    parser.add_argument("--profile-mode", choices=instrument.PROFILE_MODES, default="cprofile", help="Profiler used by --profile (default: cprofile)")
+    return parser.parse_args(argv)
+
+def instrumented(name: str, run, args: argparse.Namespace, profile_directory: Path):
+    """
+    Wraps a stage so it is recorded in the trace, and profiled when selected with --profile.
+    """
+    def run_stage() -> None:
+        profiler = instrument.profile(name, args.profile_mode, profile_directory) if args.profile == name else nullcontext()
+        with profiler, instrument.TRACER.span(name, "stage"):
+            run()
+    return run_stage
+
+def build_stages(config: "conf.ExtractConfig", args: argparse.Namespace) -> list:
+    """
+    Builds the pipeline stages from the Extract configuration.
+    """
+    str_directory = config.str_directory
+    out_directory = config.out_directory
+    flat_directory = config.flat_directory
+    fused = config.fused
+
+    # Any change to the Extract configuration (script, engine, settings, rules) re-runs extraction
+    config_hash = hashlib.sha256(json.dumps(config.raw, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def extract_inputs() -> str:
+        return config_hash + fingerprint_paths([str_directory], suffix=".str") + fingerprint_paths([config.bms_script])
+
+    def flatten_inputs() -> str:
+        return config_hash + fingerprint_paths([out_directory])
+
+    # The extract stage manifest skips unchanged archives on its own; only --force bypasses it too
+    force_extract = args.force or args.start_from is not None
+    profile_directory = config.module_dir / "GameFiles" / "profiles"
+    return [
+        Stage("rename",
+              instrumented("rename", lambda: run_rename(config), args, profile_directory),
+              inputs=lambda: fingerprint_paths([str_directory], recursive=False),
+              outputs=[str_directory]),
+        Stage("extract",
+              instrumented("extract", lambda: run_quickbms(config, max_workers=args.jobs, force=force_extract), args, profile_directory),
+              inputs=extract_inputs,
+              outputs=[flat_directory if fused else out_directory]),
+        Stage("flatten",
+              instrumented("flatten", lambda: run_flatten_output(config, max_workers=args.jobs), args, profile_directory),
+              inputs=flatten_inputs,
+              outputs=[flat_directory],
+              enabled=not fused),
+    ]
+
+def print_report(report: dict) -> None:
+    print(colours.CYAN, "Run report:")
+    for entry in report["stages"]:
+        colour = colours.GREEN if entry["status"] == "ran" else colours.RED if entry["status"] == "failed" else colours.YELLOW
+        print(colour, f"  {entry['name']:<8} {entry['status']:<8} {entry['seconds']:>9.2f}s  {entry['reason']}")
+    print(colours.CYAN, f"  total {report['seconds']:.2f}s")
+
+def main(argv: Optional[list] = None) -> None:
+    """Main function: runs every stage whose inputs changed since its last successful run."""
+
+    args = parse_args([] if argv is None else argv)
     module_dir = Path(__file__).resolve().parent
+    # Listings cached by an earlier run in this process may be stale
+    SCANS.clear()
+    printer.set_quiet(args.quiet)
+    if args.trace:
+        instrument.TRACER.enable(args.trace)
+
+    # Read and validated once, every stage gets the same configuration object
+    try:
+        config = initialize_configuration(module_dir, args.project)
+    except ValueError as e:
+        print_error(f"Invalid Extract configuration: {e}")
+        sys.exit(1)
 
-    project_dir = initialize_configuration(module_dir)
-
-    if not (module_dir / "GameFiles" / "QbmsOut").exists():
-        run_rename(project_dir, module_dir)
-        run_quickbms(project_dir, module_dir)
-    else:
-        print(colours.YELLOW, "QbmsOut exists.")
-
-        if __name__ == "__main__":
-            # ask user if they want to run rename anyway
-            user_input = input("Do you want to run rename anyway? (y/n): ").strip().lower()
-            if user_input == 'y':
-                run_rename(project_dir, module_dir)
-            elif user_input == 'n':
-                print(colours.YELLOW, "Skipping rename.")
-
-            # ask user if they want to run quickbms anyway
-            user_input = input("Do you want to run quickbms anyway? (y/n): ").strip().lower()
-            if user_input == 'y':
-                run_quickbms(project_dir, module_dir)
-            elif user_input == 'n':
-                print(colours.YELLOW, "Skipping quickbms.")
-
-    if not (module_dir / "GameFiles" / "quickbms_out").exists():
-        run_flatten_output(project_dir, module_dir)
-    else:
-        print(colours.YELLOW, "quickbms_out exists.")
-        if __name__ == "__main__":
-            # ask user if they want to run flattener anyway
-            user_input = input("Do you want to run flattener anyway? (y/n): ").strip().lower()
-            if user_input == 'y':
-                run_flatten_output(project_dir, module_dir)
-            elif user_input == 'n':
-                print(colours.YELLOW, "Skipping flattener.")
+    scheduler = StageScheduler(
+        build_stages(config, args),
+        state_path=config.state_path,
+        report_path=config.report_path,
+    )
+    try:
+        report = scheduler.run(only=args.only, force=args.force, start_from=args.start_from)
+    finally:
+        instrument.TRACER.save()
+    print_report(report)
 
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
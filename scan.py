@@ -0,0 +1,137 @@
+"""
+This module provides the directory scan cache shared by the pipeline stages.
+
+Directories are listed once with os.scandir and their DirEntry objects are kept, so the
+file type comes from the listing itself and each entry is stat'ed at most once (on Windows
+the listing already carries size and mtime, no per-file call is made at all). The stage
+scheduler's fingerprints, rename, extraction and flattening all read StrDirectory and
+OutDirectory through the same snapshot instead of walking them again.
+
+Listings are cached until invalidated: a stage that writes to a tree calls invalidate()
+on it once it is done, so later stages and fingerprints see the new contents.
+"""
+
+import os
+import threading
+
+
+class DirectoryListing:
+    """
+    The entries of one directory, split into directories and files, by name in scandir order.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.directories = {}
+        self.files = {}
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        self.directories[entry.name] = entry
+                    elif entry.is_file():
+                        self.files[entry.name] = entry
+                except OSError:
+                    # Vanished or unreadable while listing, like os.path.isdir/isfile returning False
+                    continue
+
+
+class ScanCache:
+    """
+    A process-wide cache of directory listings, filled lazily one directory at a time.
+
+    Paths are cached by their absolute, case-normalized form; results use the caller's spelling.
+    """
+
+    def __init__(self):
+        self._listings = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    def listing(self, path: str) -> DirectoryListing:
+        """
+        Returns the listing of a directory, scanning it on first use.
+
+        Returns:
+            DirectoryListing: The listing, or None when path is not a readable directory.
+        """
+        key = self._key(path)
+        listing = self._listings.get(key)
+        if listing is None:
+            try:
+                listing = DirectoryListing(path)
+            except OSError:
+                return None
+            with self._lock:
+                listing = self._listings.setdefault(key, listing)
+        return listing
+
+    def children(self, path: str) -> tuple:
+        """
+        Lists the direct child directories and files of a directory, the shape flat.list_directory returns.
+
+        Returns:
+            tuple[list[str], list[str]]: The child directory paths and the child file paths.
+        """
+        listing = self.listing(path)
+        if listing is None:
+            raise NotADirectoryError(f"Not a directory: '{path}'")
+        return ([os.path.join(path, name) for name in listing.directories],
+                [os.path.join(path, name) for name in listing.files])
+
+    def walk(self, top: str):
+        """
+        Walks a tree top-down like os.walk, yielding (directory, dir_names, file_names).
+
+        Symbolic links to directories are listed but not descended into, like os.walk.
+        Removing names from dir_names prunes the walk.
+        """
+        listing = self.listing(top)
+        if listing is None:
+            return
+        dir_names = list(listing.directories)
+        yield top, dir_names, list(listing.files)
+        for name in dir_names:
+            entry = listing.directories.get(name)
+            if entry is not None and entry.is_symlink():
+                continue
+            yield from self.walk(os.path.join(top, name))
+
+    def stat(self, path: str) -> os.stat_result:
+        """
+        Returns the stat result of a file from its directory's listing, stat'ing it at most once.
+
+        Raises:
+            FileNotFoundError: If the listing holds no such file.
+        """
+        directory, name = os.path.split(os.path.abspath(path))
+        listing = self.listing(directory)
+        entry = listing.files.get(name) if listing is not None else None
+        if entry is None:
+            raise FileNotFoundError(f"No such file: '{path}'")
+        return entry.stat()
+
+    def invalidate(self, path: str) -> None:
+        """
+        Drops the cached listings of a tree that was written to, and of its parent directory.
+        """
+        key = self._key(path)
+        prefix = key.rstrip(os.sep) + os.sep
+        parent = os.path.dirname(key)
+        with self._lock:
+            for cached in [cached for cached in self._listings if cached == key or cached == parent or cached.startswith(prefix)]:
+                del self._listings[cached]
+
+    def clear(self) -> None:
+        """
+        Drops every cached listing, e.g. before running another project.
+        """
+        with self._lock:
+            self._listings.clear()
+
+
+# The process-wide scan cache used by the scheduler and the stages
+SCANS = ScanCache()
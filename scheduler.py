@@ -0,0 +1,193 @@
+"""
+This module provides a small, non-interactive stage scheduler for the extraction pipeline.
+Each stage declares the paths it reads and writes. A stage is skipped when its outputs exist
+and the fingerprint of its inputs matches the one recorded after its last successful run.
+"""
+try:
+    from .printer import print, print_error, print_verbose, print_debug, colours
+except ImportError:
+    from printer import print, print_error, print_verbose, print_debug, colours
+try:
+    from .scan import SCANS
+except ImportError:
+    from scan import SCANS
+
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+
+def fingerprint_paths(paths: list, recursive: bool = True, suffix: str = "") -> str:
+    """
+    Fingerprints files and directories by path, size and mtime, without reading contents.
+    Directories are read through the shared scan cache, so the stages reuse the listings.
+
+    Args:
+        paths (list): Files or directories to include. Missing paths are recorded as missing.
+        recursive (bool): Walk directories recursively, otherwise only their direct entries count.
+        suffix (str): Only include files ending with this suffix (directories always count).
+
+    Returns:
+        str: A SHA256 hex digest.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        path = str(path)
+        digest.update(f"\0{path}\0".encode("utf-8", "surrogateescape"))
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+            continue
+        if not os.path.isdir(path):
+            digest.update(b"missing")
+            continue
+
+        if recursive:
+            walker = SCANS.walk(path)
+        else:
+            listing = SCANS.listing(path)
+            walker = [(path, list(listing.directories), list(listing.files))]
+        for root, dir_names, file_names in walker:
+            dir_names.sort()
+            relative = os.path.relpath(root, path)
+            for name in dir_names:
+                digest.update(f"d {relative}/{name}\n".encode("utf-8", "surrogateescape"))
+            for name in sorted(file_names):
+                if suffix and not name.endswith(suffix):
+                    continue
+                stat = SCANS.stat(os.path.join(root, name))
+                digest.update(f"f {relative}/{name} {stat.st_size} {stat.st_mtime_ns}\n".encode("utf-8", "surrogateescape"))
+    return digest.hexdigest()
+
+
+class Stage:
+    """
+    A pipeline stage.
+
+    Args:
+        name (str): The stage name used by --only/--from.
+        run (callable): Runs the stage, called without arguments.
+        inputs (callable): Returns the fingerprint of everything the stage reads.
+        outputs (list): Paths the stage produces, the stage always runs if one is missing.
+        enabled (bool): Disabled stages are never run (e.g. flatten in fused mode).
+    """
+
+    def __init__(self, name: str, run: Callable[[], None], inputs: Callable[[], str], outputs: list, enabled: bool = True):
+        self.name = name
+        self.run = run
+        self.inputs = inputs
+        self.outputs = [str(path) for path in outputs]
+        self.enabled = enabled
+
+
+class StageScheduler:
+    """
+    Runs stages in order, skipping unchanged ones, and writes a run report with per-stage timings.
+
+    Args:
+        stages (list[Stage]): The stages in dependency order.
+        state_path (str): JSON file recording the input fingerprint of each stage's last successful run.
+        report_path (str): JSON file the run report is written to.
+    """
+
+    def __init__(self, stages: list, state_path: str, report_path: str):
+        self.stages = stages
+        self.state_path = str(state_path)
+        self.report_path = str(report_path)
+        self.state = {}
+        if os.path.isfile(self.state_path):
+            try:
+                with open(self.state_path, "r") as f:
+                    self.state = json.load(f)
+            except (OSError, ValueError):
+                self.state = {}
+
+    @property
+    def names(self) -> list:
+        return [stage.name for stage in self.stages]
+
+    def _save_state(self) -> None:
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.state_path, "w") as f:
+            json.dump(self.state, f, indent=4, sort_keys=True)
+
+    def _write_report(self, report: dict) -> None:
+        directory = os.path.dirname(self.report_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.report_path, "w") as f:
+            json.dump(report, f, indent=4)
+
+    def run(self, only: Optional[list] = None, force: bool = False, start_from: Optional[str] = None) -> dict:
+        """
+        Runs the pipeline.
+
+        Args:
+            only (list): Run only these stages.
+            force (bool): Run the selected stages even if their inputs are unchanged.
+            start_from (str): Skip the stages before this one and force it and every later stage.
+
+        Returns:
+            dict: The run report, also written to report_path.
+        """
+        for name in (only or []) + ([start_from] if start_from else []):
+            if name not in self.names:
+                raise ValueError(f"Unknown stage '{name}', expected one of {', '.join(self.names)}.")
+
+        report = {"started": datetime.now().isoformat(timespec="seconds"), "stages": []}
+        run_start = time.perf_counter()
+        reached_start = start_from is None
+
+        try:
+            for stage in self.stages:
+                if stage.name == start_from:
+                    reached_start = True
+                entry = {"name": stage.name, "status": "skipped", "reason": "", "seconds": 0.0}
+                report["stages"].append(entry)
+
+                if not stage.enabled:
+                    entry["reason"] = "disabled by configuration"
+                elif only is not None and stage.name not in only:
+                    entry["reason"] = "not selected (--only)"
+                elif not reached_start:
+                    entry["reason"] = f"before --from {start_from}"
+                else:
+                    stage_force = force or start_from is not None
+                    fingerprint = stage.inputs()
+                    missing = [path for path in stage.outputs if not os.path.exists(path)]
+                    recorded = self.state.get(stage.name, {}).get("inputs")
+                    if not stage_force and not missing and recorded == fingerprint:
+                        entry["reason"] = "inputs unchanged"
+                    else:
+                        entry["reason"] = ("forced" if stage_force else
+                                           f"missing output {missing[0]}" if missing else
+                                           "inputs changed" if recorded else "no previous run")
+                        print(colours.CYAN, f"Running stage '{stage.name}' ({entry['reason']}).")
+                        start = time.perf_counter()
+                        try:
+                            stage.run()
+                        except BaseException as e:
+                            # Stages report fatal errors with sys.exit, record them before propagating
+                            entry["status"] = "failed"
+                            entry["seconds"] = round(time.perf_counter() - start, 3)
+                            entry["reason"] = f"exited with {e.code}" if isinstance(e, SystemExit) else f"{type(e).__name__}: {e}"
+                            raise
+                        entry["status"] = "ran"
+                        entry["seconds"] = round(time.perf_counter() - start, 3)
+                        # Fingerprint after running: stages such as rename change their own inputs
+                        self.state[stage.name] = {"inputs": stage.inputs(), "finished": datetime.now().isoformat(timespec="seconds")}
+                        self._save_state()
+                        print(colours.GREEN, f"Completed stage '{stage.name}' in {entry['seconds']:.2f}s.")
+                        continue
+
+                print(colours.YELLOW, f"Skipping stage '{stage.name}': {entry['reason']}.")
+        finally:
+            report["seconds"] = round(time.perf_counter() - run_start, 3)
+            self._write_report(report)
+
+        return report